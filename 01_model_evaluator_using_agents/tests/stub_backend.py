@@ -0,0 +1,144 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Stand-in for the DeepRacer and S3 calls of the agent tools, for tests and benchmarks.
+
+Example:
+    >>> from stub_backend import stub_backend
+    >>> with stub_backend("../../deepracer_models", latency_s=0.1):
+    ...     with executor.question("compare"):
+    ...         react_agent(question)
+"""
+import glob
+import os
+import time
+from contextlib import contextmanager
+
+import yaml
+
+import deepracer
+import s3
+import track_catalog
+
+
+def _track_ids(models_root):
+    """The WORLD_NAME of every training and evaluation of the local models."""
+    track_ids = set()
+    for fname in glob.glob(os.path.join(models_root, "*", "*_params*.yaml")):
+        with open(fname, "r") as f:
+            world_name = yaml.safe_load(f).get("WORLD_NAME")
+        if world_name:
+            track_ids.add(world_name)
+    return sorted(track_ids)
+
+
+def _track(track_id):
+    # the fields of a GetTrack/ListTracks response kept by the real functions
+    return {
+        "TrackArn": track_catalog.track_arn(track_id),
+        "TrackName": track_id,
+        "TrackDescription": f"Stand-in for {track_id}",
+        "TrackDifficulty": "MEDIUM",
+    }
+
+
+@contextmanager
+def stub_backend(models_root, latency_s=0.05):
+    """
+    Serve the DeepRacer and S3 calls of the tools from local model folders.
+
+    Every call sleeps `latency_s` to stand in for the round trip to the service. S3 keys
+    are paths relative to `models_root`, so the model prefix is the model folder name.
+    The tracks are the WORLD_NAMEs of the models' parameter files, each with a leaderboard
+    of one submission, so the track catalog and the fastest lap lookups take their real path.
+    """
+    models_root = os.path.abspath(models_root)
+    track_ids = _track_ids(models_root)
+
+    def delayed(func):
+        def wrapper(*args, **kwargs):
+            time.sleep(latency_s)
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    def list_files(bucket, prefix=""):
+        # S3 lists every key under the prefix, dot files like .coach_checkpoint included
+        keys = []
+        for directory, _, file_names in os.walk(models_root):
+            for file_name in file_names:
+                key = os.path.relpath(os.path.join(directory, file_name), models_root).replace(os.sep, "/")
+                if key.startswith(prefix):
+                    keys.append({"Key": key})
+        return sorted(keys, key=lambda file: file["Key"])
+
+    def get_file_content(bucket, file_key):
+        with open(os.path.join(models_root, file_key), "r") as f:
+            return f.read()
+
+    def get_file_bytes(bucket, file_key):
+        with open(os.path.join(models_root, file_key), "rb") as f:
+            return f.read()
+
+    def list_models(max_results=100):
+        return [
+            {"ModelName": name, "ModelArn": f"arn:aws:deepracer:us-east-1::model/{name}", "CreatedByAlias": "stub"}
+            for name in sorted(os.listdir(models_root))
+            if os.path.isdir(os.path.join(models_root, name))
+        ]
+
+    def copy_model_to_s3_if_model_does_not_exist(model_name, target_s3_bucket, role_arn):
+        if not os.path.isdir(os.path.join(models_root, model_name)):
+            raise FileNotFoundError(f"could not find model file with name {model_name}")
+        return model_name
+
+    def get_track_name_and_description_from_arn(track_arn):
+        track = _track(track_catalog.track_id_from_arn(track_arn))
+        return {key: track[key] for key in track_catalog.TRACK_FIELDS}
+
+    def list_tracks(max_results=100, next_token=None, region="us-east-1"):
+        return {"Tracks": [_track(track_id) for track_id in track_ids]}
+
+    def list_leaderboards(max_results, next_token=None):
+        return {
+            "Leaderboards": [
+                {"Arn": f"arn:aws:deepracer:us-east-1::leaderboard/{track_id}", "TrackArn": track_catalog.track_arn(track_id)}
+                for track_id in track_ids
+            ]
+        }
+
+    def list_leaderboard_submissions(leaderboard_arn):
+        return {"LeaderboardSubmissions": [{"BestLapTime": 7500, "AvgLapTime": 8000, "AvgResets": 0}]}
+
+    replacements = {
+        s3: {
+            "list_files": list_files,
+            "get_file_content": get_file_content,
+            "get_file_bytes": get_file_bytes,
+        },
+        deepracer: {
+            "list_models": list_models,
+            "copy_model_to_s3_if_model_does_not_exist": copy_model_to_s3_if_model_does_not_exist,
+            "get_track_name_and_description_from_arn": get_track_name_and_description_from_arn,
+            "list_tracks": list_tracks,
+            "list_leaderboards": list_leaderboards,
+            "list_leaderboard_submissions": list_leaderboard_submissions,
+        },
+    }
+    originals = []
+    for module, functions in replacements.items():
+        for name, func in functions.items():
+            originals.append((module, name, getattr(module, name)))
+            setattr(module, name, delayed(func))
+    # an in-memory catalog, so the stub tracks are not saved to the catalog file
+    catalogs = {}
+    originals.append((track_catalog, "get_catalog", track_catalog.get_catalog))
+    track_catalog.get_catalog = lambda region="us-east-1": catalogs.setdefault(
+        region, track_catalog.TrackCatalog(path=None, region=region)
+    )
+    try:
+        yield
+    finally:
+        for module, name, func in originals:
+            setattr(module, name, func)
@@ -0,0 +1,53 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import glob
+import os
+import shutil
+
+import checkpoint_reader
+import deepracer_model
+from stub_backend import stub_backend
+
+MODELS_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, "deepracer_models")
+MODEL_NAME = "AtoZ-CCW-Centerline"
+
+
+def test_bundled_index_files_parse():
+    index_paths = glob.glob(os.path.join(MODELS_ROOT, "*", "model", "*.ckpt.index"))
+    assert index_paths
+    for index_path in index_paths:
+        with open(index_path, "rb") as f:
+            _, entries = checkpoint_reader.parse_index(f.read())
+        summary = checkpoint_reader.summarize_variables(entries)
+        assert summary["variables"] == 22
+        assert summary["parameters"] > 0 and summary["bytes"] == 4 * summary["parameters"]
+
+
+def test_list_checkpoints_of_a_bundled_model():
+    result = checkpoint_reader.list_checkpoints(os.path.join(MODELS_ROOT, MODEL_NAME, "model"), variables_of="30_Step-163797.ckpt")
+
+    assert [checkpoint["iteration"] for checkpoint in result["checkpoints"]] == [28, 29, 30, 31]
+    assert result["best_checkpoint"]["name"] == result["coach_checkpoint"] == "30_Step-163797.ckpt"
+    assert len(result["variables"]) == 22
+
+
+def test_parse_checkpoint_state():
+    state = 'model_checkpoint_path: "/opt/ml/model/30_Step-163797.ckpt"\nall_model_checkpoint_paths: "29_Step-157222.ckpt"\n'
+    assert checkpoint_reader.parse_checkpoint_state(state) == "30_Step-163797.ckpt"
+    assert checkpoint_reader.parse_checkpoint_state("30_Step-163797.ckpt\n") == "30_Step-163797.ckpt"
+    assert checkpoint_reader.parse_checkpoint_state("\n") is None
+
+
+def test_checkpoint_info_falls_back_to_the_checkpoint_state(tmp_path):
+    # a model without deepracer_checkpoints.json, whose state file is in the TensorFlow format
+    model_dir = tmp_path / MODEL_NAME / "model"
+    shutil.copytree(os.path.join(MODELS_ROOT, MODEL_NAME, "model"), model_dir)
+    os.remove(model_dir / "deepracer_checkpoints.json")
+    (model_dir / ".coach_checkpoint").write_text('model_checkpoint_path: "29_Step-157222.ckpt"\n')
+
+    with stub_backend(str(tmp_path), latency_s=0):
+        info = deepracer_model.DeepRacerModel("bucket", MODEL_NAME).get_checkpoint_info()
+
+    assert info["coach_checkpoint"] == "29_Step-157222.ckpt"
+    assert len(info["variables"]) == 22
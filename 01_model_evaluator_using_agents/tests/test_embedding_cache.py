@@ -0,0 +1,48 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from concurrent.futures import ThreadPoolExecutor
+
+from embedding_cache import CachedEmbeddings, HashEmbeddings
+
+TEXTS = [f"AWS DeepRacer model number {number} on the reInvent2019_wide track" for number in range(40)]
+
+
+def cached_embeddings(tmp_path, **kwargs):
+    return CachedEmbeddings(HashEmbeddings(dimensions=64), path=str(tmp_path / "cache.sqlite3"), **kwargs)
+
+
+def test_second_embed_documents_does_not_call_the_model(tmp_path):
+    embeddings = cached_embeddings(tmp_path, batch_size=16)
+    first = embeddings.embed_documents(TEXTS + TEXTS[:5])
+    assert embeddings.stats() == {"hits": 5, "misses": 40, "model_calls": 3, "entries": 40}
+
+    # a new wrapper reads the same cache file
+    embeddings = cached_embeddings(tmp_path, batch_size=16)
+    assert embeddings.embed_documents(TEXTS + TEXTS[:5]) == first
+    assert embeddings.stats() == {"hits": 45, "misses": 0, "model_calls": 0, "entries": 40}
+
+
+def test_second_embed_query_does_not_call_the_model(tmp_path):
+    embeddings = cached_embeddings(tmp_path)
+    vector = embeddings.embed_query("fastest lap")
+    embeddings.embed_documents(["fastest lap"])
+    assert embeddings.stats()["model_calls"] == 2
+
+    embeddings = cached_embeddings(tmp_path)
+    assert embeddings.embed_query("fastest lap") == vector
+    assert embeddings.stats() == {"hits": 1, "misses": 0, "model_calls": 0, "entries": 2}
+
+
+def test_counters_add_up_across_threads(tmp_path):
+    embeddings = cached_embeddings(tmp_path, batch_size=1, max_workers=4)
+    slices = [TEXTS[start : start + 10] for start in range(0, 40, 2)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(embeddings.embed_query, TEXTS * 5))
+        list(pool.map(embeddings.embed_documents, slices))
+
+    stats = embeddings.stats()
+    assert stats["hits"] + stats["misses"] == len(TEXTS) * 5 + sum(map(len, slices))
+    # every miss is one model call with a batch size of 1
+    assert stats["model_calls"] == stats["misses"]
+    assert stats["entries"] == 80
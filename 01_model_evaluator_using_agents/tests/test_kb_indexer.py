@@ -0,0 +1,68 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import chromadb
+from embedding_cache import HashEmbeddings
+from kb_indexer import index_documents
+
+PARAGRAPH = "The reward function returns a number for every step of the car on the track. "
+
+
+class CountingEmbeddings(HashEmbeddings):
+    """HashEmbeddings counting the embed_documents calls"""
+
+    def __init__(self):
+        super().__init__(dimensions=64)
+        self.model_calls = 0
+
+    def embed_documents(self, texts):
+        self.model_calls += 1
+        return super().embed_documents(texts)
+
+
+def documents():
+    return [
+        (f"guide/{name}.md", "\n\n".join(f"{name} section {number}. {PARAGRAPH * 4}" for number in range(6)))
+        for name in ("reward", "actions", "training")
+    ]
+
+
+def sources(collection):
+    return sorted(metadata["source"] for metadata in collection.get(include=["metadatas"])["metadatas"])
+
+
+def test_reindexing_only_touches_changed_documents(tmp_path):
+    collection = chromadb.PersistentClient(path=str(tmp_path / "chroma_db")).get_or_create_collection("langchain")
+    embeddings = CountingEmbeddings()
+
+    report = index_documents(documents(), collection, embeddings, chunk_size=400, chunk_overlap=50, batch_size=4)
+    chunks = report["chunks"]
+    assert report["added"] == chunks == collection.count() > len(documents())
+    assert report["deleted"] == 0
+    assert embeddings.model_calls > 0
+
+    embeddings.model_calls = 0
+    report = index_documents(documents(), collection, embeddings, chunk_size=400, chunk_overlap=50, batch_size=4)
+    assert report["added"] == report["deleted"] == 0
+    assert report["unchanged"] == chunks
+    assert embeddings.model_calls == 0
+
+    # edit the last section of one document
+    edited = documents()
+    source, text = edited[0]
+    edited[0] = (source, text.replace("reward section 5.", "reward section five."))
+    report = index_documents(edited, collection, embeddings, chunk_size=400, chunk_overlap=50, batch_size=4)
+    assert report["added"] == report["deleted"] >= 1
+    assert collection.count() == chunks
+    texts = collection.get(where={"source": source})["documents"]
+    assert any("reward section five." in text for text in texts)
+    assert not any("reward section 5." in text for text in texts)
+
+    # remove a document, its chunks are only deleted when pruning
+    remaining = edited[1:]
+    report = index_documents(remaining, collection, embeddings, chunk_size=400, chunk_overlap=50)
+    assert report["deleted"] == 0
+    report = index_documents(remaining, collection, embeddings, prune=True, chunk_size=400, chunk_overlap=50)
+    assert report["added"] == 0 and report["deleted"] > 0
+    assert source not in sources(collection)
+    assert collection.count() == report["chunks"]
@@ -0,0 +1,75 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import os
+import time
+
+import deepracer_model
+import s3
+from stub_backend import stub_backend
+from tool_executor import ToolExecutor, is_complete_result
+
+MODELS_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, "deepracer_models")
+MODEL_NAME = "AtoZ-CCW-Centerline"
+
+
+def model_details(executor, model_name):
+    """The getters of the notebook's model details tool, run through the executor."""
+    model = deepracer_model.DeepRacerModel("bucket", model_name)
+    getters = {
+        "hyper_parameters_used_for_training": model.get_hyper_parameters,
+        "evaluation_results": lambda: model.get_evaluation_metrics_summary(max_tokens=200),
+        "training_results": lambda: model.get_training_metrics_summary(max_tokens=200),
+    }
+    results = executor.run_concurrently([(f"{key}:{model_name}", getter, ()) for key, getter in getters.items()])
+    return dict(zip(getters, results))
+
+
+def test_model_details_are_memoized_with_the_real_track_shape():
+    executor = ToolExecutor()
+    with stub_backend(MODELS_ROOT, latency_s=0):
+        details = executor.call("model details", model_details, executor, MODEL_NAME)
+
+        assert is_complete_result(details)
+        evaluation = details["evaluation_results"]
+        assert evaluation["track"]["TrackName"] == "reInvent2019_wide"
+        assert evaluation["fastest_lap_time_by_others_in_milliseconds"]["BestLapTime"] == 7500
+        assert details["training_results"]["track"]["TrackName"] == "reInvent2019_wide"
+
+        executor.call("model details", model_details, executor, MODEL_NAME)
+    assert executor.stats()["model details"]["hits"] == 1
+
+
+def test_nested_unknown_results_are_not_memoized():
+    executor = ToolExecutor()
+    with stub_backend(MODELS_ROOT, latency_s=0):
+        get_file_content = s3.get_file_content
+
+        def without_evaluation_metrics(bucket, file_key):
+            if "metrics/evaluation" in file_key:
+                raise ConnectionError(file_key)
+            return get_file_content(bucket, file_key)
+
+        # get_evaluation_metrics catches the error and returns "unknown" placeholders
+        s3.get_file_content = without_evaluation_metrics
+        try:
+            details = executor.call("model details", model_details, executor, MODEL_NAME)
+        finally:
+            s3.get_file_content = get_file_content
+        assert details["evaluation_results"]["summary"] == "unknown"
+
+        details = executor.call("model details", model_details, executor, MODEL_NAME)
+        assert is_complete_result(details)
+    stats = executor.stats()["model details"]
+    assert stats["hits"] == 0 and stats["executed"] == 2
+
+
+def test_expired_and_surplus_results_are_evicted():
+    executor = ToolExecutor(ttl=0.05, max_entries=2)
+    for value in range(4):
+        executor.call("tool", lambda value: value, value)
+    assert len(executor._results) == 2
+
+    time.sleep(0.1)
+    executor.call("tool", lambda value: value, "new")
+    assert len(executor._results) == 1
@@ -0,0 +1,384 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Reading the DeepRacer checkpoint files without TensorFlow.
+
+A TensorFlow checkpoint `<prefix>.index` is a TensorBundle: a LevelDB-style table,
+sorted by variable name, whose values are small protobuf messages giving the dtype,
+shape, data shard and byte range of every variable. The tensors themselves are
+stored in the `<prefix>.data-NNNNN-of-NNNNN` shards, so a single tensor can be read
+with a memory map. The table, the protobuf messages and the checkpoint JSON and
+text files are parsed here in pure Python, which takes milliseconds where importing
+TensorFlow takes seconds.
+
+Only uncompressed tables are supported, which is what TensorFlow writes.
+"""
+import glob
+import json
+import os
+import re
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+TABLE_MAGIC = 0xDB4775248B80FB57
+FOOTER_SIZE = 48
+BLOCK_TRAILER_SIZE = 5
+
+# tensorflow DataType enum values and their numpy type, None when numpy has no equivalent
+DTYPES = {
+    1: ("float32", np.float32),
+    2: ("float64", np.float64),
+    3: ("int32", np.int32),
+    4: ("uint8", np.uint8),
+    5: ("int16", np.int16),
+    6: ("int8", np.int8),
+    7: ("string", None),
+    8: ("complex64", np.complex64),
+    9: ("int64", np.int64),
+    10: ("bool", np.bool_),
+    14: ("bfloat16", None),
+    17: ("uint16", np.uint16),
+    18: ("complex128", np.complex128),
+    19: ("float16", np.float16),
+    22: ("uint32", np.uint32),
+    23: ("uint64", np.uint64),
+}
+NUMPY_TYPES = dict(DTYPES.values())
+
+CHECKPOINT_NAME = re.compile(r"^(\d+)_Step-(\d+)\.ckpt$")
+
+BundleHeader = namedtuple("BundleHeader", ["num_shards", "endianness", "version"])
+TensorEntry = namedtuple("TensorEntry", ["name", "dtype", "shape", "shard_id", "offset", "size", "crc32c", "slices"])
+
+
+def _varint(data, position):
+    """Decode a base 128 varint, returns the value and the position after it."""
+    result = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, position
+        shift += 7
+
+
+def _protobuf_fields(data):
+    """The (field number, value) pairs of a protobuf message, length-delimited values as bytes."""
+    position = 0
+    while position < len(data):
+        key, position = _varint(data, position)
+        field, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, position = _varint(data, position)
+        elif wire_type == 1:
+            value = struct.unpack_from("<Q", data, position)[0]
+            position += 8
+        elif wire_type == 2:
+            length, position = _varint(data, position)
+            value = bytes(data[position : position + length])
+            position += length
+        elif wire_type == 5:
+            value = struct.unpack_from("<I", data, position)[0]
+            position += 4
+        else:
+            raise ValueError(f"unsupported protobuf wire type {wire_type}")
+        yield field, value
+
+
+def _parse_shape(data):
+    """A TensorShapeProto as a tuple, None when the rank is unknown."""
+    dims = []
+    for field, value in _protobuf_fields(data):
+        if field == 2:
+            size = dict(_protobuf_fields(value)).get(1, 0)
+            # sizes are int64, -1 for unknown dimensions
+            dims.append(size - (1 << 64) if size >= 1 << 63 else size)
+        elif field == 3 and value:
+            return None
+    return tuple(dims)
+
+
+def _parse_header(data):
+    fields = dict(_protobuf_fields(data))
+    version = dict(_protobuf_fields(fields.get(3, b""))).get(1, 0)
+    return BundleHeader(fields.get(1, 0), fields.get(2, 0), version)
+
+
+def _parse_entry(name, data):
+    dtype, shape, shard_id, offset, size, crc32c, slices = 0, (), 0, 0, 0, None, 0
+    for field, value in _protobuf_fields(data):
+        if field == 1:
+            dtype = value
+        elif field == 2:
+            shape = _parse_shape(value)
+        elif field == 3:
+            shard_id = value
+        elif field == 4:
+            offset = value
+        elif field == 5:
+            size = value
+        elif field == 6:
+            crc32c = value
+        elif field == 7:
+            slices += 1
+    return TensorEntry(name, DTYPES.get(dtype, (f"dtype_{dtype}", None))[0], shape, shard_id, offset, size, crc32c, slices)
+
+
+def _block(data, handle):
+    """The contents of the block at a (offset, size) handle, without its trailer."""
+    offset, size = handle
+    if offset + size + BLOCK_TRAILER_SIZE > len(data):
+        raise ValueError("truncated checkpoint index")
+    compression = data[offset + size]
+    if compression != 0:
+        raise ValueError(f"compressed checkpoint index blocks are not supported (type {compression})")
+    return data[offset : offset + size]
+
+
+def _block_entries(block):
+    """The (key, value) pairs of a table block, keys are prefix-compressed."""
+    num_restarts = struct.unpack_from("<I", block, len(block) - 4)[0]
+    end = len(block) - 4 - 4 * num_restarts
+    position, key = 0, b""
+    while position < end:
+        shared, position = _varint(block, position)
+        non_shared, position = _varint(block, position)
+        value_length, position = _varint(block, position)
+        key = key[:shared] + bytes(block[position : position + non_shared])
+        position += non_shared
+        yield key, block[position : position + value_length]
+        position += value_length
+
+
+def _block_handle(data):
+    offset, position = _varint(data, 0)
+    size, _ = _varint(data, position)
+    return offset, size
+
+
+def parse_index(data):
+    """
+    Parse the contents of a checkpoint `.index` file.
+
+    Args:
+        data (bytes): The file contents.
+
+    Returns:
+        tuple: The BundleHeader and a dict of TensorEntry by variable name, in name order.
+    """
+    data = memoryview(data)
+    if len(data) < FOOTER_SIZE or struct.unpack_from("<Q", data, len(data) - 8)[0] != TABLE_MAGIC:
+        raise ValueError("not a checkpoint index, the table magic number is missing")
+    footer = data[len(data) - FOOTER_SIZE :]
+    _, position = _varint(footer, 0)
+    _, position = _varint(footer, position)
+    index_handle = _block_handle(footer[position:])
+
+    header, entries = BundleHeader(1, 0, 0), {}
+    for _, handle in _block_entries(_block(data, index_handle)):
+        for key, value in _block_entries(_block(data, _block_handle(handle))):
+            if key == b"":
+                header = _parse_header(value)
+            else:
+                name = key.decode("utf-8")
+                entries[name] = _parse_entry(name, value)
+    return header, entries
+
+
+def data_shard_path(prefix, shard_id, num_shards):
+    """Path of a data shard of the checkpoint `prefix`"""
+    return f"{prefix}.data-{shard_id:05d}-of-{num_shards:05d}"
+
+
+class CheckpointReader:
+    """
+    Variables of a local checkpoint and memory-mapped reads of their values.
+
+    Args:
+        prefix (string): The checkpoint path without extension, e.g. "model/30_Step-163797.ckpt".
+
+    Example:
+        >>> reader = CheckpointReader("model/30_Step-163797.ckpt")
+        >>> reader.variables()[:2]
+        >>> kernel = reader.tensor("main_level/agent/main/online/network_1/ppo_head_0/policy_fc/kernel")
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix[: -len(".index")] if prefix.endswith(".index") else prefix
+        with open(self.prefix + ".index", "rb") as f:
+            self.header, self.entries = parse_index(f.read())
+
+    def variables(self):
+        """
+        Returns:
+            list: Dicts with the name, dtype, shape, shard, byte offset and size of every variable.
+        """
+        return [
+            {
+                "name": entry.name,
+                "dtype": entry.dtype,
+                "shape": list(entry.shape) if entry.shape is not None else None,
+                "shard": entry.shard_id,
+                "offset": entry.offset,
+                "bytes": entry.size,
+            }
+            for entry in self.entries.values()
+        ]
+
+    def tensor(self, name, mmap=True):
+        """
+        The value of a variable, read from its data shard.
+
+        Args:
+            name (string): The variable name.
+            mmap (bool): Map the bytes of the shard instead of reading them into memory.
+
+        Returns:
+            ndarray: The value, a read-only memory map when `mmap` is True.
+        """
+        entry = self.entries[name]
+        numpy_type = NUMPY_TYPES.get(entry.dtype)
+        if numpy_type is None or entry.slices or entry.shape is None:
+            raise ValueError(f"reading {entry.dtype} or partitioned variables is not supported: {name}")
+        dtype = np.dtype(numpy_type).newbyteorder("<" if self.header.endianness == 0 else ">")
+        count = int(np.prod(entry.shape, dtype=np.int64))
+        if count * dtype.itemsize != entry.size:
+            raise ValueError(f"{name} has {entry.size} bytes, expected {count * dtype.itemsize}")
+        path = data_shard_path(self.prefix, entry.shard_id, self.header.num_shards)
+        if not count:
+            return np.zeros(entry.shape, dtype=dtype)
+        if mmap:
+            return np.memmap(path, dtype=dtype, mode="r", offset=entry.offset, shape=(count,)).reshape(entry.shape)
+        with open(path, "rb") as f:
+            f.seek(entry.offset)
+            return np.frombuffer(f.read(entry.size), dtype=dtype).reshape(entry.shape)
+
+
+def summarize_variables(entries):
+    """
+    Totals of the variables of a checkpoint.
+
+    Args:
+        entries (dict): TensorEntry by name, as returned by `parse_index`.
+
+    Returns:
+        dict: Number of variables, parameters and bytes.
+    """
+    shapes = [entry.shape for entry in entries.values() if entry.shape is not None]
+    return {
+        "variables": len(entries),
+        "parameters": int(sum(np.prod(shape, dtype=np.int64) for shape in shapes)),
+        "bytes": sum(entry.size for entry in entries.values()),
+    }
+
+
+def parse_checkpoint_name(name):
+    """
+    The iteration and step of a DeepRacer checkpoint name like "30_Step-163797.ckpt".
+
+    Returns:
+        dict: The name, iteration and step, None values when the name does not match.
+    """
+    match = CHECKPOINT_NAME.match(os.path.basename(name))
+    if match is None:
+        return {"name": name, "iteration": None, "step": None}
+    return {"name": name, "iteration": int(match.group(1)), "step": int(match.group(2))}
+
+
+def parse_deepracer_checkpoints(text):
+    """
+    Parse `deepracer_checkpoints.json`.
+
+    Returns:
+        dict: The best and last checkpoints with their name, iteration, step,
+            average evaluation metric and time stamp.
+    """
+    checkpoints = json.loads(text)
+    result = {}
+    for kind in ["best_checkpoint", "last_checkpoint"]:
+        if checkpoints.get(kind):
+            result[kind] = dict(parse_checkpoint_name(checkpoints[kind]["name"]), **checkpoints[kind])
+    return result
+
+
+def parse_checkpoint_state(text):
+    """
+    The checkpoint named by a `.coach_checkpoint` file or a TensorFlow `checkpoint` state file.
+
+    Returns:
+        string: The checkpoint name, None when the file names none.
+    """
+    match = re.search(r'^model_checkpoint_path:\s*"([^"]*)"', text, re.M)
+    if match:
+        return os.path.basename(match.group(1))
+    name = text.strip()
+    return name or None
+
+
+def describe_checkpoints(indexes, checkpoints_json=None, state=None, variables_of=None):
+    """
+    Describe the checkpoints of a model from the contents of its checkpoint files.
+
+    Args:
+        indexes (dict): The `.index` file contents by checkpoint name, e.g. "30_Step-163797.ckpt".
+        checkpoints_json (string, optional): The contents of `deepracer_checkpoints.json`.
+        state (string, optional): The contents of `.coach_checkpoint`.
+        variables_of (string, optional): Also list the variables of this checkpoint.
+
+    Returns:
+        dict: The checkpoints ordered by iteration with their variable totals, the best,
+            last and coach checkpoints, and the variables when asked for.
+    """
+    result = {"checkpoints": []}
+    for name, data in indexes.items():
+        header, entries = parse_index(data)
+        checkpoint = dict(parse_checkpoint_name(name), shards=header.num_shards, **summarize_variables(entries))
+        result["checkpoints"].append(checkpoint)
+        if name == variables_of:
+            result["variables"] = [
+                {"name": entry.name, "dtype": entry.dtype, "shape": list(entry.shape) if entry.shape is not None else None}
+                for entry in entries.values()
+            ]
+    result["checkpoints"].sort(key=lambda checkpoint: (checkpoint["iteration"] is None, checkpoint["iteration"] or 0, checkpoint["name"]))
+    if checkpoints_json:
+        result.update(parse_deepracer_checkpoints(checkpoints_json))
+    if state:
+        result["coach_checkpoint"] = parse_checkpoint_state(state)
+    return result
+
+
+def list_checkpoints(model_dir, variables_of=None):
+    """
+    The checkpoints of a local model folder, see `describe_checkpoints`.
+
+    Args:
+        model_dir (string): The "model" folder of a DeepRacer model.
+        variables_of (string, optional): Also list the variables of this checkpoint.
+
+    Example:
+        >>> list_checkpoints("../../deepracer_models/AtoZ-CCW-Centerline/model", variables_of="30_Step-163797.ckpt")
+    """
+    indexes = {}
+    for index_path in glob.glob(os.path.join(model_dir, "*.ckpt.index")):
+        with open(index_path, "rb") as f:
+            indexes[os.path.basename(index_path)[: -len(".index")]] = f.read()
+
+    contents = {}
+    for file_name in ["deepracer_checkpoints.json", ".coach_checkpoint", "checkpoint"]:
+        path = os.path.join(model_dir, file_name)
+        if os.path.isfile(path):
+            with open(path, "r") as f:
+                contents[file_name] = f.read()
+    result = describe_checkpoints(
+        indexes,
+        contents.get("deepracer_checkpoints.json"),
+        contents.get(".coach_checkpoint", contents.get("checkpoint")),
+        variables_of,
+    )
+    for checkpoint in result["checkpoints"]:
+        checkpoint["has_data"] = bool(glob.glob(os.path.join(model_dir, checkpoint["name"] + ".data-*")))
+    return result
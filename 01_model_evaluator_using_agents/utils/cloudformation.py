@@ -1,14 +1,32 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: MIT-0
 
-import boto3
+import functools
 
-cloudformation_client = boto3.client("cloudformation")
+
+@functools.lru_cache(maxsize=None)
+def get_client():
+    """
+    The CloudFormation client, created on first use so that importing this module does not load boto3.
+
+    Returns:
+        botocore.client.CloudFormation: The client.
+    """
+    import boto3
+
+    return boto3.client("cloudformation")
+
+
+def __getattr__(name):
+    # cloudformation.cloudformation_client keeps working, the client is created when it is first accessed
+    if name == "cloudformation_client":
+        return get_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def get_stack_outputs(stack_name):
     try:
-        response = cloudformation_client.describe_stacks(StackName=stack_name)
+        response = get_client().describe_stacks(StackName=stack_name)
         stack_outputs = response["Stacks"][0]["Outputs"]
         return_values = {}
         for output in stack_outputs:
@@ -5,16 +5,30 @@ import json
 import time
 from urllib.parse import urlparse
 
-import requests
+import profiling
 import s3
-from boto3.session import Session
-from botocore.auth import SigV4Auth
-from botocore.awsrequest import AWSRequest
 
 
-def deepracer(
-    method_name, params, region="us-east-1", credentials=Session().get_credentials()
-):
+_credentials = None
+
+
+def get_credentials():
+    """
+    The credentials of the default boto3 session, resolved on first use instead of at import.
+
+    Returns:
+        botocore.credentials.Credentials: The credentials, refreshed by botocore when they expire.
+    """
+    global _credentials
+    # not kept while none are found, so credentials configured later are picked up
+    if _credentials is None:
+        from boto3.session import Session
+
+        _credentials = Session().get_credentials()
+    return _credentials
+
+
+def deepracer(method_name, params, region="us-east-1", credentials=None):
     """
     Call the Deepracer service API.
 
@@ -23,6 +37,7 @@ def deepracer(
         params (dict): The parameters to pass to the method.
         region (string): The region to call the Deepracer API in.
         credentials (boto3.credentials.Credentials): The credentials to use to authenticate with the Deepracer API.
+            Defaults to the credentials of the default boto3 session.
 
     Returns:
         dict: The response from the Deepracer API.
@@ -31,6 +46,14 @@ def deepracer(
         >>> deepracer('ListModels', {'MaxResults': 100, 'ModelType': 'REINFORCEMENT_LEARNING'})
     """
 
+    # botocore and requests are only loaded when the API is first called
+    import requests
+    from botocore.auth import SigV4Auth
+    from botocore.awsrequest import AWSRequest
+
+    if credentials is None:
+        credentials = get_credentials()
+
     endpoint = f"https://deepracer-prod.{region}.amazonaws.com/"
 
     headers = {
@@ -39,17 +62,19 @@ def deepracer(
         "host": urlparse(endpoint).hostname,
     }
 
-    data = json.dumps(params)
-    request = AWSRequest(method="POST", url=endpoint, data=data, headers=headers)
+    with profiling.timed(f"deepracer.{method_name}"):
+        data = json.dumps(params)
+        request = AWSRequest(method="POST", url=endpoint, data=data, headers=headers)
 
-    sigv4 = SigV4Auth(credentials, "deepracer", region)
-    sigv4.add_auth(request)
+        sigv4 = SigV4Auth(credentials, "deepracer", region)
+        sigv4.add_auth(request)
 
-    prepped = request.prepare()
+        prepped = request.prepare()
 
-    response = requests.post(prepped.url, headers=prepped.headers, data=data)
+        response = requests.post(prepped.url, headers=prepped.headers, data=data)
+        profiling.add_bytes(len(data) + len(response.content))
 
-    return response.json()
+        return response.json()
 
 
 def list_models(max_results=100) -> list:
@@ -162,11 +187,15 @@ def get_track_name_and_description_from_arn(track_arn):
 
     Example:
         >>> get_track_name_and_description_from_arn('arn:aws:deepracer:us-east-1:123456789012:track/my-track')
-        {'Name': 'my-track', 'Description': 'My Track', 'Difficulty': 'MEDIUM', 'DifficultyRange': '100>x>1'}
+        {'TrackName': 'my-track', 'TrackDescription': 'My Track', 'TrackDifficulty': 'MEDIUM'}
     """
+    # arn:aws:deepracer:<region>::track/<track id>
+    arn_parts = track_arn.split(":")
+    region = arn_parts[3] if len(arn_parts) > 3 and arn_parts[3] else "us-east-1"
     response = deepracer(
         "GetTrack",
         {"TrackArn": track_arn},
+        region=region,
     )
     if "Track" in response:
         track = response["Track"]
@@ -184,26 +213,30 @@ def get_track_name_and_description_from_arn(track_arn):
     return "unknown"
 
 
-def list_tracks(max_results=100):
+def list_tracks(max_results=100, next_token=None, region="us-east-1"):
     """
     Lists the tracks in the Deepracer account.
 
     Args:
         max_results (int): The maximum number of tracks to return.
+        next_token (string): The token to use for the next page of results.
+        region (string): The region to list the tracks of.
 
     Returns:
-        list: A list of tracks.
+        dict: The response with the tracks and the NextToken of the next page, if any.
 
     Example:
         >>> list_tracks()
-        [{'TrackArn': 'arn:aws:deepracer:us-east-1:123456789012:track/my-track', 'TrackName': 'my-track'}]
+        {'Tracks': [{'TrackArn': 'arn:aws:deepracer:us-east-1::track/my-track', 'TrackName': 'my-track'}], 'NextToken': '...'}
     """
-    return deepracer(
-        "ListTracks",
-        {
-            "MaxResults": max_results,
-        },
-    )
+    params = {
+        "MaxResults": max_results,
+    }
+
+    if next_token != None:
+        params["NextToken"] = next_token
+
+    return deepracer("ListTracks", params, region=region)
 
 
 def list_leaderboards(max_results, next_token=None):
@@ -3,15 +3,20 @@
 
 import json
 
+import checkpoint_reader
 import deepracer
+import metrics_summary
+import profiling
 import s3
+import track_catalog
 import yaml
 
 
 class DeepRacerModel:
-    def __init__(self, bucket: str, model_key: str):
+    def __init__(self, bucket: str, model_key: str, region: str = "us-east-1"):
         self.bucket = bucket
         self.model_key = model_key
+        self.region = region
 
     def __get_track_used_for_training(self, training_metrics_file_key):
         """
@@ -37,10 +42,7 @@ class DeepRacerModel:
                     training_settings = s3.get_file_content(self.bucket, file_key)
                     if training_metrics_file_name in training_settings:
                         track_id = yaml.safe_load(training_settings)["WORLD_NAME"]
-                        track_arn = f"arn:aws:deepracer:us-east-1::track/{track_id}"
-                        return deepracer.get_track_name_and_description_from_arn(
-                            track_arn
-                        )
+                        return track_catalog.get_catalog(self.region).get(track_id)
         except Exception as e:
             print("Could not obtain the track used for training", e)
         return "unknown"
@@ -56,6 +58,7 @@ class DeepRacerModel:
             The track used for evaluation. If the track is not found, "unknown" is returned.
 
         """
+        track_id = None
         try:
             eval_parmas_directory_key = self.model_key
             files = s3.list_files(self.bucket, eval_parmas_directory_key)
@@ -69,11 +72,8 @@ class DeepRacerModel:
                     evaluation_settings = s3.get_file_content(self.bucket, file_key)
                     if evaluation_metrics_file_name in evaluation_settings:
                         track_id = yaml.safe_load(evaluation_settings)["WORLD_NAME"]
-                        track_arn = f"arn:aws:deepracer:us-east-1::track/{track_id}"
                         return (
-                            deepracer.get_track_name_and_description_from_arn(
-                                track_arn
-                            ),
+                            track_catalog.get_catalog(self.region).get(track_id),
                             track_id,
                         )
         except Exception as e:
@@ -141,6 +141,7 @@ class DeepRacerModel:
             )
         return response["Entry"]
 
+    @profiling.profiled
     def get_reward_function(self) -> str:
         """
         Get the reward function from the extracted model file.
@@ -158,6 +159,7 @@ class DeepRacerModel:
             print("Could not obtain the reward function", e)
         return "unknown"
 
+    @profiling.profiled
     def get_hyper_parameters(self):
         """
         Get the hyperparameters used for training the model.
@@ -174,6 +176,7 @@ class DeepRacerModel:
             print("Could not obtain the hyperparameters", e)
         return "unknown"
 
+    @profiling.profiled
     def get_model_meta_data(self):
         """
         Get the meta data used for training the model.
@@ -195,6 +198,33 @@ class DeepRacerModel:
             print("Could not obtain the hyperparameters", e)
         return "unknown"
 
+    def _load_training_metrics(self):
+        """
+        Load the training metrics file of the model and the track used for training.
+
+        Returns:
+            The metrics of the first training metrics JSON file and the track, or None
+            and "unknown" when the model has no training metrics file.
+        """
+        training_metrics_file_path = "metrics/training"
+        file_key = f"{self.model_key}/{training_metrics_file_path}"
+        training_metric_files = s3.list_files(self.bucket, file_key)
+        for training_metric_file in training_metric_files:
+            training_metric_file_key = training_metric_file["Key"]
+            if training_metric_file_key.endswith(".json"):
+                training_metrics = json.loads(
+                    s3.get_file_content(self.bucket, training_metric_file_key)
+                )["metrics"]
+
+                track = "unknown"
+                try:
+                    track = self.__get_track_used_for_training(training_metric_file_key)
+                except Exception as e:
+                    print(f"Could not get track for training: {e}")
+                return training_metrics, track
+        return None, "unknown"
+
+    @profiling.profiled
     def get_training_metrics(self):
         """
         Get the training metrics used for training the model.
@@ -203,45 +233,31 @@ class DeepRacerModel:
             The training metrics used for training the model.
         """
         try:
-            training_metrics_file_path = "metrics/training"
-            file_key = f"{self.model_key}/{training_metrics_file_path}"
-            training_metric_files = s3.list_files(self.bucket, file_key)
-            for training_metric_file in training_metric_files:
-                training_metric_file_key = training_metric_file["Key"]
-                if training_metric_file_key.endswith(".json"):
-                    training_metrics = json.loads(
-                        s3.get_file_content(self.bucket, training_metric_file_key)
-                    )["metrics"]
-                    last_evaluation_result_per_iteration = {}
-                    for section in training_metrics:
-                        if section["phase"] == "evaluation":
-                            last_evaluation_result_per_iteration[section["episode"]] = {
-                                key: section[key]
-                                for key in section.keys()
-                                & {
-                                    "elapsed_time_in_milliseconds",
-                                    "completion_percentage",
-                                    "reward_score",
-                                    "episode",
-                                    "episode_status",
-                                }
+            training_metrics, track = self._load_training_metrics()
+            if training_metrics is not None:
+                last_evaluation_result_per_iteration = {}
+                for section in training_metrics:
+                    if section["phase"] == "evaluation":
+                        last_evaluation_result_per_iteration[section["episode"]] = {
+                            key: section[key]
+                            for key in section.keys()
+                            & {
+                                "elapsed_time_in_milliseconds",
+                                "completion_percentage",
+                                "reward_score",
+                                "episode",
+                                "episode_status",
                             }
-                    track = "unknown"
-                    try:
-                        track = self.__get_track_used_for_training(
-                            training_metrics_file_path
-                        )
-                    except Exception as e:
-                        print(f"Could not get track for training: {e}")
-
-                    return {
-                        "metrics": list(last_evaluation_result_per_iteration.values()),
-                        "track": track,
-                    }
+                        }
+                return {
+                    "metrics": list(last_evaluation_result_per_iteration.values()),
+                    "track": track,
+                }
         except Exception as e:
             print("Could not obtain training metrics", e)
         return {"metrics": "unknown", "track": "unknown"}
 
+    @profiling.profiled
     def get_evaluation_metrics(self):
         """
         Get the evaluation metrics used for training the model.
@@ -286,7 +302,6 @@ class DeepRacerModel:
 
                     fastest_lap_time = "unknown"
                     try:
-                        track_name = track["Name"]
                         fastest_lap_time = self.__get_fastest_lap_time_by_track_name(
                             track_id
                         )
@@ -306,5 +321,105 @@ class DeepRacerModel:
             "fastest_lap_time_by_others_in_milliseconds": "unknown",
         }
 
+    @profiling.profiled
+    def get_training_metrics_summary(self, max_chars=None, max_tokens=None):
+        """
+        Get a summary of the training metrics that fits a character or token budget.
+
+        Unlike `get_training_metrics` the size does not grow with the length of the training.
+
+        Args:
+            max_chars (int, optional): Budget of the summary as JSON. Defaults to metrics_summary.DEFAULT_MAX_CHARS.
+            max_tokens (int, optional): Budget in tokens, used instead of max_chars when given.
+
+        Returns:
+            The summary of the training and evaluation phases and the track used for training.
+        """
+        try:
+            training_metrics, track = self._load_training_metrics()
+            if training_metrics is not None:
+                episodes_per_iteration = metrics_summary.EPISODES_PER_ITERATION
+                hyper_parameters = self.get_hyper_parameters()
+                if isinstance(hyper_parameters, dict):
+                    episodes_per_iteration = hyper_parameters.get(
+                        "num_episodes_between_training", episodes_per_iteration
+                    )
+
+                return {
+                    "summary": metrics_summary.summarize_training_metrics(
+                        training_metrics,
+                        max_chars=max_chars,
+                        max_tokens=max_tokens,
+                        episodes_per_iteration=episodes_per_iteration,
+                    ),
+                    "track": track,
+                }
+        except Exception as e:
+            print("Could not obtain training metrics summary", e)
+        return {"summary": "unknown", "track": "unknown"}
+
+    @profiling.profiled
+    def get_evaluation_metrics_summary(self, max_chars=None, max_tokens=None):
+        """
+        Get a summary of the evaluation metrics that fits a character or token budget.
+
+        Args:
+            max_chars (int, optional): Budget of the summary as JSON. Defaults to metrics_summary.DEFAULT_MAX_CHARS.
+            max_tokens (int, optional): Budget in tokens, used instead of max_chars when given.
+
+        Returns:
+            The summary of the evaluation trials, the track used and the fastest lap time by others.
+        """
+        evaluation_metrics = self.get_evaluation_metrics()
+        metrics = evaluation_metrics.pop("metrics")
+        if isinstance(metrics, list):
+            evaluation_metrics["summary"] = metrics_summary.summarize_evaluation_metrics(
+                metrics, max_chars=max_chars, max_tokens=max_tokens
+            )
+        else:
+            evaluation_metrics["summary"] = metrics
+        return evaluation_metrics
+
+    @profiling.profiled
+    def get_checkpoint_info(self):
+        """
+        Get the checkpoints of the model without loading TensorFlow.
+
+        The small `.ckpt.index` files are read from S3 and parsed with checkpoint_reader,
+        the checkpoint data is not downloaded.
+
+        Returns:
+            The checkpoints with their iteration, step, number of variables, parameters and bytes,
+            the best, last and coach checkpoints, and the variables of the best checkpoint.
+        """
+        try:
+            model_directory_key = f"{self.model_key}/model/"
+            indexes = {}
+            contents = {}
+            for file in s3.list_files(self.bucket, model_directory_key):
+                file_key = file["Key"]
+                file_name = file_key.split("/")[-1]
+                if file_name.endswith(".ckpt.index"):
+                    indexes[file_name[: -len(".index")]] = s3.get_file_bytes(self.bucket, file_key)
+                elif file_name in ["deepracer_checkpoints.json", ".coach_checkpoint"]:
+                    contents[file_name] = s3.get_file_content(self.bucket, file_key)
+
+            best_checkpoint = None
+            if "deepracer_checkpoints.json" in contents:
+                best_checkpoint = json.loads(contents["deepracer_checkpoints.json"]).get("best_checkpoint", {}).get("name")
+            state = contents.get(".coach_checkpoint")
+            if best_checkpoint is None and state:
+                best_checkpoint = checkpoint_reader.parse_checkpoint_state(state)
+            return checkpoint_reader.describe_checkpoints(
+                indexes,
+                contents.get("deepracer_checkpoints.json"),
+                state,
+                variables_of=best_checkpoint,
+            )
+        except Exception as e:
+            print("Could not obtain the checkpoint info", e)
+        return "unknown"
+
+    @profiling.profiled
     def get_track_meta_data(self):
         return "Track difficulty is an integer ranging from 100 to 1, where 1 is the hardest"
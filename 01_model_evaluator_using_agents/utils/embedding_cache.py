@@ -0,0 +1,224 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Persistent cache in front of an embeddings model.
+
+Embeddings are stored in a SQLite file keyed by a hash of the model id, the kind of
+embedding (document or query) and the text, so a text is sent to the model once. The
+least recently used entries are evicted above a maximum number of entries. Texts not
+in the cache are split into batches that are embedded concurrently.
+
+The wrapper implements `embed_documents` and `embed_query` like the LangChain
+embeddings, so it can be passed to the Chroma vector store in place of the model.
+"""
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import profiling
+
+DEFAULT_CACHE_PATH = "./persistent/embedding_cache.sqlite3"
+DEFAULT_MAX_ENTRIES = 100_000
+DEFAULT_BATCH_SIZE = 16
+DEFAULT_MAX_WORKERS = 8
+
+
+def cache_key(model_id, kind, text):
+    """Hash identifying the embedding of a text by a model"""
+    return hashlib.sha256(f"{model_id}\0{kind}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    SQLite table of embeddings with least-recently-used eviction.
+
+    Vectors are stored as float32 bytes. One connection is shared by all threads,
+    guarded by a lock.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+
+    def get_many(self, keys):
+        """
+        The stored vectors of the keys, marking them as used.
+
+        Returns:
+            dict: Maps the keys found to their vector as a list of floats.
+        """
+        found = {}
+        keys = list(dict.fromkeys(keys))
+        with self._lock, self._connection:
+            # stay below the SQLite limit of query parameters
+            for start in range(0, len(keys), 500):
+                batch = keys[start : start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._connection.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32).tolist()
+                self._connection.execute(
+                    f"UPDATE embeddings SET last_used = ? WHERE key IN ({placeholders})", [time.time()] + batch
+                )
+        return found
+
+    def put_many(self, items):
+        """Store (key, vector) pairs, then evict the least recently used entries above the maximum."""
+        now = time.time()
+        rows = [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items]
+        with self._lock, self._connection:
+            self._connection.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+            excess = self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._connection.execute(
+                    "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM embeddings")
+
+    def close(self):
+        self._connection.close()
+
+
+class CachedEmbeddings:
+    """
+    Embeddings served from an EmbeddingStore, the model is only called for texts not in it.
+
+    Args:
+        embeddings: The model, anything with `embed_documents(texts)` and `embed_query(text)`.
+        model_id (string, optional): Identifies the model in the cache keys. Defaults to the
+            `model_id` attribute of the model.
+        path (string): The SQLite cache file.
+        max_entries (int): Entries kept before the least recently used ones are evicted.
+        batch_size (int): Texts per `embed_documents` call.
+        max_workers (int): Batches embedded at the same time.
+
+    Example:
+        >>> bedrock_embeddings = CachedEmbeddings(BedrockEmbeddings(client=bedrock_client, model_id="amazon.titan-embed-text-v1"))
+        >>> vectorstore_chromadb = Chroma(persist_directory="./persistent/chroma_db", embedding_function=bedrock_embeddings)
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        model_id=None,
+        path=DEFAULT_CACHE_PATH,
+        max_entries=DEFAULT_MAX_ENTRIES,
+        batch_size=DEFAULT_BATCH_SIZE,
+        max_workers=DEFAULT_MAX_WORKERS,
+    ):
+        self.embeddings = embeddings
+        self.model_id = model_id or getattr(embeddings, "model_id", None) or type(embeddings).__name__
+        self.store = EmbeddingStore(path, max_entries)
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        # the vector store may embed from several threads at once
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.model_calls = 0
+
+    def _count(self, hits=0, misses=0, model_calls=0):
+        with self._stats_lock:
+            self.hits += hits
+            self.misses += misses
+            self.model_calls += model_calls
+
+    def _embed_batch(self, texts):
+        with profiling.timed(f"embeddings.{self.model_id}"):
+            return self.embeddings.embed_documents(texts)
+
+    @profiling.profiled
+    def embed_documents(self, texts):
+        """
+        Embeddings of the texts, from the cache where possible.
+
+        Repeated texts are embedded once, and the missing texts are embedded in batches
+        running concurrently.
+        """
+        keys = [cache_key(self.model_id, "document", text) for text in texts]
+        found = self.store.get_many(keys)
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        self._count(hits=len(texts) - len(missing), misses=len(missing))
+
+        if missing:
+            missing_keys = list(missing)
+            batches = [missing_keys[start : start + self.batch_size] for start in range(0, len(missing_keys), self.batch_size)]
+            self._count(model_calls=len(batches))
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as pool:
+                results = pool.map(lambda batch: self._embed_batch([missing[key] for key in batch]), batches)
+                embedded = [(key, vector) for batch, vectors in zip(batches, results) for key, vector in zip(batch, vectors)]
+            self.store.put_many(embedded)
+            found.update((key, list(vector)) for key, vector in embedded)
+
+        return [found[key] for key in keys]
+
+    @profiling.profiled
+    def embed_query(self, text):
+        """Embedding of a query, from the cache when the same query was embedded before."""
+        key = cache_key(self.model_id, "query", text)
+        found = self.store.get_many([key])
+        if key in found:
+            self._count(hits=1)
+            return found[key]
+        self._count(misses=1, model_calls=1)
+        with profiling.timed(f"embeddings.{self.model_id}"):
+            vector = self.embeddings.embed_query(text)
+        self.store.put_many([(key, vector)])
+        return list(vector)
+
+    def stats(self):
+        with self._stats_lock:
+            stats = {"hits": self.hits, "misses": self.misses, "model_calls": self.model_calls}
+        return {**stats, "entries": len(self.store)}
+
+
+class HashEmbeddings:
+    """
+    Deterministic local embeddings for tests and offline runs, no model is called.
+
+    Every word is hashed to a dimension and a sign, the counts are normalized to unit
+    length, so texts sharing words get similar vectors.
+    """
+
+    model_id = "local-hash"
+
+    def __init__(self, dimensions=1536):
+        self.dimensions = dimensions
+
+    def _embed(self, text):
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            digest = hashlib.md5(word.encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
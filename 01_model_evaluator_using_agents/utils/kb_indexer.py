@@ -0,0 +1,194 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Incremental indexing of documentation into the knowledge base vector store.
+
+Documents are split into overlapping chunks, and every chunk gets an id hashed from
+its source and text. Comparing these ids with the ids already in the collection tells
+which chunks are new and which are stale, so only new chunks are embedded (in
+concurrent batches) and upserted, and stale chunks are deleted. Re-indexing unchanged
+documentation makes no embedding calls.
+
+The collection is the one the LangChain Chroma store reads, "langchain" by default,
+with the chunk text as document and its source in the metadata.
+"""
+import glob
+import hashlib
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import chromadb
+import profiling
+
+DEFAULT_COLLECTION = "langchain"
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_CHUNK_OVERLAP = 100
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_MAX_WORKERS = 8
+DOCUMENT_EXTENSIONS = (".txt", ".md", ".html", ".htm")
+
+
+def open_collection(persist_directory="./persistent/chroma_db", name=DEFAULT_COLLECTION):
+    """The persisted Chroma collection, created when it does not exist."""
+    client = chromadb.PersistentClient(path=persist_directory)
+    return client.get_or_create_collection(name)
+
+
+def load_documents(path, extensions=DOCUMENT_EXTENSIONS):
+    """
+    Read the documents of a folder.
+
+    Returns:
+        list: (source, text) pairs, the source being the path relative to `path`. HTML tags are removed.
+    """
+    documents = []
+    for file_path in sorted(glob.glob(os.path.join(path, "**", "*"), recursive=True)):
+        if not file_path.lower().endswith(extensions) or not os.path.isfile(file_path):
+            continue
+        with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+            text = f.read()
+        if file_path.lower().endswith((".html", ".htm")):
+            text = re.sub(r"<(script|style)\b.*?</\1>", " ", text, flags=re.S | re.I)
+            text = re.sub(r"<[^>]+>", " ", text)
+        documents.append((os.path.relpath(file_path, path).replace(os.sep, "/"), text))
+    return documents
+
+
+def split_text(text, chunk_size=DEFAULT_CHUNK_SIZE, chunk_overlap=DEFAULT_CHUNK_OVERLAP):
+    """
+    Split a text into chunks of at most `chunk_size` characters.
+
+    Paragraphs are packed into a chunk while they fit, longer paragraphs are cut at
+    whitespace. Every chunk starts with the last `chunk_overlap` characters of the
+    previous one.
+    """
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = " ".join(paragraph.split())
+        while len(paragraph) > chunk_size:
+            cut = paragraph.rfind(" ", 0, chunk_size)
+            cut = cut if cut > 0 else chunk_size
+            pieces.append(paragraph[:cut])
+            paragraph = paragraph[cut:].strip()
+        if paragraph:
+            pieces.append(paragraph)
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + 1 + len(piece) > chunk_size:
+            chunks.append(current)
+            overlap = current[-chunk_overlap:] if chunk_overlap else ""
+            # start the overlap at a word boundary
+            overlap = overlap[overlap.find(" ") + 1 :] if " " in overlap else overlap
+            current = f"{overlap} {piece}".strip() if len(overlap) + 1 + len(piece) <= chunk_size else piece
+        else:
+            current = f"{current}\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def chunk_id(source, text):
+    """Content hash id of a chunk"""
+    return hashlib.sha256(f"{source}\0{text}".encode("utf-8")).hexdigest()[:32]
+
+
+def chunk_documents(documents, chunk_size=DEFAULT_CHUNK_SIZE, chunk_overlap=DEFAULT_CHUNK_OVERLAP):
+    """
+    Chunks of all documents keyed by id.
+
+    Returns:
+        dict: Maps the chunk id to (source, chunk number, text), identical chunks of a source are kept once.
+    """
+    chunks = {}
+    for source, text in documents:
+        for number, chunk in enumerate(split_text(text, chunk_size, chunk_overlap)):
+            chunks.setdefault(chunk_id(source, chunk), (source, number, chunk))
+    return chunks
+
+
+def _existing_ids(collection, page_size=10000):
+    """The ids and sources of the chunks in the collection"""
+    existing = {}
+    offset = 0
+    while True:
+        page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+        for id, metadata in zip(page["ids"], page["metadatas"]):
+            existing[id] = (metadata or {}).get("source")
+        if len(page["ids"]) < page_size:
+            return existing
+        offset += page_size
+
+
+@profiling.profiled
+def index_documents(
+    documents,
+    collection,
+    embeddings,
+    prune=False,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    chunk_overlap=DEFAULT_CHUNK_OVERLAP,
+    batch_size=DEFAULT_BATCH_SIZE,
+    max_workers=DEFAULT_MAX_WORKERS,
+):
+    """
+    Bring the collection up to date with the documents.
+
+    Args:
+        documents (list): (source, text) pairs, see `load_documents`.
+        collection (chromadb.Collection): The collection, see `open_collection`.
+        embeddings: Anything with `embed_documents(texts)`, the Bedrock embeddings or
+            `embedding_cache.HashEmbeddings` for offline runs.
+        prune (bool): Also delete the chunks of sources that are not in `documents`.
+            Otherwise only the chunks of the given sources are replaced.
+        batch_size (int): Chunks per embedding call and upsert.
+        max_workers (int): Batches embedded at the same time.
+
+    Example:
+        >>> collection = open_collection("./persistent/chroma_db")
+        >>> report = index_documents(load_documents("./docs"), collection, bedrock_embeddings_client)
+
+    Returns:
+        dict: Numbers of documents and chunks, chunks added, deleted and unchanged,
+            seconds, and documents and chunks per second.
+    """
+    start_time = time.perf_counter()
+    chunks = chunk_documents(documents, chunk_size, chunk_overlap)
+    sources = {source for source, _ in documents}
+    existing = _existing_ids(collection)
+
+    new_ids = [id for id in chunks if id not in existing]
+    stale_ids = [id for id, source in existing.items() if id not in chunks and (prune or source in sources)]
+
+    def embed(batch):
+        return embeddings.embed_documents([chunks[id][2] for id in batch])
+
+    batches = [new_ids[start : start + batch_size] for start in range(0, len(new_ids), batch_size)]
+    if batches:
+        # batches are embedded concurrently and upserted from this thread as they complete
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as pool:
+            for batch, vectors in zip(batches, pool.map(embed, batches)):
+                collection.upsert(
+                    ids=batch,
+                    embeddings=[list(vector) for vector in vectors],
+                    documents=[chunks[id][2] for id in batch],
+                    metadatas=[{"source": chunks[id][0], "chunk": chunks[id][1]} for id in batch],
+                )
+    for start in range(0, len(stale_ids), batch_size):
+        collection.delete(ids=stale_ids[start : start + batch_size])
+
+    seconds = time.perf_counter() - start_time
+    return {
+        "documents": len(documents),
+        "chunks": len(chunks),
+        "added": len(new_ids),
+        "deleted": len(stale_ids),
+        "unchanged": len(chunks) - len(new_ids),
+        "seconds": seconds,
+        "documents_per_s": len(documents) / seconds if seconds else float("inf"),
+        "chunks_per_s": len(chunks) / seconds if seconds else float("inf"),
+    }
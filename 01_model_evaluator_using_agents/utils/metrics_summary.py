@@ -0,0 +1,288 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Compact statistical summaries of the DeepRacer training and evaluation metrics.
+
+The raw metrics hold one dict per episode, so passing them to the agent makes the
+prompt grow with the length of the training run. A summary holds overall percentiles,
+completion rates, trend slopes, the best and worst episodes and a per-iteration table.
+All statistics are computed with numpy on the whole metric list at once, and the
+amount of detail is reduced until the summary fits a character (or token) budget.
+"""
+import json
+
+import numpy as np
+
+# rough size of a token of JSON for the Anthropic models
+CHARS_PER_TOKEN = 4
+DEFAULT_MAX_CHARS = 3000
+PERCENTILES = [10, 50, 90]
+EPISODES_PER_ITERATION = 20
+
+# (rows of the per-iteration table, best and worst episodes listed) from most to least detail,
+# None rows keeps one row per iteration, 0 rows drops the table
+DETAIL_LEVELS = [(None, 3), (20, 3), (10, 2), (5, 1), (0, 1), (0, 0)]
+
+
+def budget_chars(max_chars=None, max_tokens=None):
+    """The character budget, from a token budget when one is given."""
+    if max_tokens is not None:
+        return max_tokens * CHARS_PER_TOKEN
+    return DEFAULT_MAX_CHARS if max_chars is None else max_chars
+
+
+def summary_size(summary):
+    """Length of the summary as compact JSON, the form it takes in the prompt."""
+    return len(json.dumps(summary, separators=(",", ":"), default=str))
+
+
+def _round(values, digits=1):
+    """Rounded JSON-friendly values, NaN becomes None."""
+    values = np.round(np.asarray(values, dtype=np.float64), digits)
+    if values.ndim == 0:
+        return None if np.isnan(values) else values.item() + 0.0
+    return [None if np.isnan(value) else value.item() + 0.0 for value in values]
+
+
+def _column(metrics, key, dtype=np.float64):
+    return np.array([metric.get(key, np.nan) for metric in metrics], dtype=dtype)
+
+
+def group_percentiles(groups, values, ids, percentiles=PERCENTILES):
+    """
+    Percentiles of the values of every group, with numpy's linear interpolation.
+
+    All groups are handled at once: the values are sorted by group and value, and the
+    percentile positions of every group are computed from its start and count.
+
+    Args:
+        groups (ndarray): Group id of every value.
+        values (ndarray): The values, NaN values are ignored.
+        ids (ndarray): Sorted ids of the groups to return, groups without values are NaN.
+
+    Returns:
+        ndarray: One row per id and one column per percentile.
+    """
+    result = np.full((len(ids), len(percentiles)), np.nan)
+    valid = ~np.isnan(values)
+    groups, values = groups[valid], values[valid]
+    if not len(values):
+        return result
+    order = np.lexsort((values, groups))
+    groups, values = groups[order], values[order]
+    present, starts, counts = np.unique(groups, return_index=True, return_counts=True)
+    positions = starts[:, None] + (counts[:, None] - 1) * (np.asarray(percentiles) / 100)[None, :]
+    lower = np.floor(positions).astype(np.int64)
+    upper = np.ceil(positions).astype(np.int64)
+    fraction = positions - lower
+    result[np.searchsorted(ids, present)] = values[lower] * (1 - fraction) + values[upper] * fraction
+    return result
+
+
+def group_means(groups, values, ids):
+    """Mean of the non-NaN values of every group, NaN for groups without values."""
+    valid = ~np.isnan(values)
+    index = np.searchsorted(ids, groups[valid])
+    totals = np.bincount(index, weights=values[valid], minlength=len(ids))
+    counts = np.bincount(index, minlength=len(ids))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return totals / counts
+
+
+def trend_slope(x, y):
+    """Least-squares slope of y over x, None with fewer than two points."""
+    valid = ~np.isnan(y)
+    if np.count_nonzero(valid) < 2 or np.ptp(x[valid]) == 0:
+        return None
+    return np.polyfit(x[valid], y[valid], 1)[0].item()
+
+
+def _episode_table(metrics, episodes_per_iteration):
+    """Column arrays of the metrics with completion, lap time and iteration"""
+    completion = _column(metrics, "completion_percentage")
+    elapsed = _column(metrics, "elapsed_time_in_milliseconds")
+    completed = np.array([metric.get("episode_status") == "Lap complete" for metric in metrics], dtype=bool)
+    completed |= completion >= 100
+    if all("episode" in metric for metric in metrics):
+        episode = _column(metrics, "episode", np.int64)
+        iteration = (episode - 1) // episodes_per_iteration + 1
+    else:
+        # evaluation trials have no episode number, every trial is its own group
+        episode = np.arange(1, len(metrics) + 1)
+        iteration = episode
+    return {
+        "episode": episode,
+        "iteration": iteration,
+        "completion": completion,
+        "completed": completed,
+        "lap_time": np.where(completed, elapsed, np.nan),
+        "elapsed": elapsed,
+        "reward": _column(metrics, "reward_score"),
+        "status": np.array([metric.get("episode_status", "") for metric in metrics]),
+    }
+
+
+def _extremes(table, count):
+    """The best and worst episodes, ranked by completion and then time."""
+    if count == 0:
+        return [], []
+    order = np.lexsort((table["elapsed"], -table["completion"]))
+
+    def describe(index):
+        episode = {
+            "episode": table["episode"][index].item(),
+            "completion": _round(table["completion"][index]),
+            "time_ms": _round(table["elapsed"][index], 0),
+            "status": str(table["status"][index]),
+        }
+        if not np.isnan(table["reward"][index]):
+            episode["reward"] = _round(table["reward"][index])
+        return episode
+
+    return [describe(i) for i in order[:count]], [describe(i) for i in order[::-1][:count]]
+
+
+def _iteration_table(table, ids, rows, group_name):
+    """Columnar per-iteration statistics, iterations merged into at most `rows` ranges."""
+    iteration = table["iteration"]
+    if rows is not None and len(ids) > rows:
+        bucket_of = np.searchsorted(ids, iteration) * rows // len(ids)
+        buckets = np.arange(rows)
+        firsts = np.full(rows, np.iinfo(np.int64).max)
+        lasts = np.zeros(rows, dtype=np.int64)
+        np.minimum.at(firsts, bucket_of, iteration)
+        np.maximum.at(lasts, bucket_of, iteration)
+        labels = [f"{first}-{last}" if first != last else f"{first}" for first, last in zip(firsts, lasts)]
+        groups, ids = bucket_of, buckets
+    else:
+        labels = ids.tolist()
+        groups = iteration
+
+    progress = group_percentiles(groups, table["completion"], ids, [50])[:, 0]
+    lap_time = group_percentiles(groups, table["lap_time"], ids, [0, 50])
+    columns = {
+        group_name: labels,
+        "episodes": np.bincount(np.searchsorted(ids, groups), minlength=len(ids)).tolist(),
+        "completion_rate": _round(group_means(groups, table["completed"].astype(np.float64), ids), 2),
+        "progress_p50": _round(progress),
+        "best_time_ms": _round(lap_time[:, 0], 0),
+        "time_p50_ms": _round(lap_time[:, 1], 0),
+    }
+    if not np.isnan(table["reward"]).all():
+        columns["reward_mean"] = _round(group_means(groups, table["reward"], ids))
+    return columns
+
+
+def summarize_episodes(
+    metrics, detail=DETAIL_LEVELS[0], episodes_per_iteration=EPISODES_PER_ITERATION, group_name="iteration"
+):
+    """
+    Statistical summary of a list of episode metrics at one level of detail.
+
+    Args:
+        metrics (list): Episode dicts as found in the metrics JSON files.
+        detail (tuple): Rows of the per-iteration table and number of best and worst episodes,
+            see DETAIL_LEVELS.
+        episodes_per_iteration (int): Training episodes between policy updates.
+        group_name (string): Name of the groups in the output, "trial" for evaluations.
+
+    Returns:
+        dict: Episode and lap counts, completion rate, percentiles of progress, lap time and
+            reward, per-iteration trend slopes, the best and worst episodes and the
+            per-iteration table.
+    """
+    if not metrics:
+        return {"episodes": 0}
+    rows, extremes = detail
+    table = _episode_table(metrics, episodes_per_iteration)
+    ids = np.unique(table["iteration"])
+
+    summary = {
+        "episodes": len(metrics),
+        f"{group_name}s": len(ids),
+        "laps_completed": int(table["completed"].sum()),
+        "completion_rate": _round(table["completed"].mean(), 2),
+        "progress_percentiles": dict(zip(map(str, PERCENTILES), _round(np.nanpercentile(table["completion"], PERCENTILES)))),
+    }
+    if table["completed"].any():
+        summary["lap_time_ms_percentiles"] = dict(
+            zip(map(str, [0] + PERCENTILES), _round(np.nanpercentile(table["lap_time"], [0] + PERCENTILES), 0))
+        )
+    has_reward = not np.isnan(table["reward"]).all()
+    if has_reward:
+        summary["reward_percentiles"] = dict(zip(map(str, PERCENTILES), _round(np.nanpercentile(table["reward"], PERCENTILES))))
+
+    # slopes of the per-group means, change per iteration (or trial)
+    trend = {
+        "completion_rate": trend_slope(ids, group_means(table["iteration"], table["completed"].astype(np.float64), ids)),
+        "progress": trend_slope(ids, group_means(table["iteration"], table["completion"], ids)),
+        "lap_time_ms": trend_slope(ids, group_means(table["iteration"], table["lap_time"], ids)),
+    }
+    if has_reward:
+        trend["reward"] = trend_slope(ids, group_means(table["iteration"], table["reward"], ids))
+    summary[f"trend_per_{group_name}"] = {key: _round(value, 3) if value is not None else None for key, value in trend.items()}
+
+    best, worst = _extremes(table, extremes)
+    if extremes:
+        summary["best_episodes"] = best
+        summary["worst_episodes"] = worst
+    if rows != 0 and len(ids) > 1:
+        summary[f"per_{group_name}"] = _iteration_table(table, ids, rows, group_name)
+    return summary
+
+
+def fit_to_budget(build, max_chars=None, max_tokens=None):
+    """
+    The most detailed summary that fits the budget.
+
+    Args:
+        build (function): Called with a DETAIL_LEVELS entry, returns the summary at that detail.
+        max_chars (int): Character budget of the summary as JSON.
+        max_tokens (int): Token budget, used instead of max_chars when given.
+
+    Returns:
+        dict: The summary, the least detailed one when even that exceeds the budget.
+    """
+    limit = budget_chars(max_chars, max_tokens)
+    for detail in DETAIL_LEVELS:
+        summary = build(detail)
+        if summary_size(summary) <= limit:
+            return summary
+    return summary
+
+
+def summarize_training_metrics(metrics, max_chars=None, max_tokens=None, episodes_per_iteration=EPISODES_PER_ITERATION):
+    """
+    Budgeted summary of the training metrics, training and evaluation phases apart.
+
+    Example:
+        >>> metrics = json.load(open("metrics/training/training-20230325194552.json"))["metrics"]
+        >>> summarize_training_metrics(metrics, max_tokens=500)
+
+    Returns:
+        dict: The summary of each phase, see `summarize_episodes`.
+    """
+    phases = {}
+    for metric in metrics:
+        phases.setdefault(metric.get("phase", "training"), []).append(metric)
+    return fit_to_budget(
+        lambda detail: {phase: summarize_episodes(episodes, detail, episodes_per_iteration) for phase, episodes in phases.items()},
+        max_chars,
+        max_tokens,
+    )
+
+
+def summarize_evaluation_metrics(metrics, max_chars=None, max_tokens=None):
+    """
+    Budgeted summary of the trials of an evaluation, adding the crash, reset and off-track totals.
+
+    Returns:
+        dict: The summary, see `summarize_episodes`.
+    """
+    totals = {
+        key: int(np.nansum(_column(metrics, key)))
+        for key in ["crash_count", "reset_count", "off_track_count"]
+        if any(key in metric for metric in metrics)
+    }
+    return fit_to_budget(lambda detail: dict(summarize_episodes(metrics, detail, group_name="trial"), **totals), max_chars, max_tokens)
@@ -0,0 +1,236 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Opt-in timing of API calls, S3 transfers, parsing and plotting.
+
+Profiling is off unless the DEEPRACER_PROFILE environment variable is set to 1/true
+or `enable()` is called. While it is off a decorated function costs one flag check.
+
+The same file is shipped in 01_model_evaluator_using_agents/utils and 02_stabledifussion,
+so each workshop folder also works when copied on its own. Change both copies together,
+02_stabledifussion/tests/test_profiling.py checks that they match.
+"""
+import functools
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# upper bounds of the latency histogram buckets, in milliseconds
+BUCKETS_MS = [1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float("inf")]
+
+_enabled = os.environ.get("DEEPRACER_PROFILE", "").lower() in ("1", "true", "yes")
+_lock = threading.Lock()
+_stats = {}
+_session_start = time.time()
+# byte counters of the profiled calls running on this thread, innermost last
+_local = threading.local()
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    """Forget everything recorded so far and start a new session."""
+    global _session_start
+    with _lock:
+        _stats.clear()
+        _session_start = time.time()
+
+
+def record(name, seconds, nbytes=0, error=False):
+    """Add one call of `name` to the statistics."""
+    with _lock:
+        stat = _stats.get(name)
+        if stat is None:
+            stat = _stats[name] = {
+                "calls": 0,
+                "errors": 0,
+                "total_s": 0.0,
+                "min_s": float("inf"),
+                "max_s": 0.0,
+                "bytes": 0,
+                "histogram": [0] * len(BUCKETS_MS),
+            }
+        stat["calls"] += 1
+        stat["errors"] += int(error)
+        stat["total_s"] += seconds
+        stat["min_s"] = min(stat["min_s"], seconds)
+        stat["max_s"] = max(stat["max_s"], seconds)
+        stat["bytes"] += nbytes
+        stat["histogram"][bisect_left(BUCKETS_MS, seconds * 1000)] += 1
+
+
+def add_bytes(nbytes):
+    """Count bytes transferred by the innermost profiled call running on this thread."""
+    if not _enabled:
+        return
+    counters = getattr(_local, "counters", None)
+    if counters:
+        counters[-1] += nbytes
+
+
+@contextmanager
+def timed(name):
+    """
+    Time a block of code as a call of `name`.
+
+    Example:
+        >>> with timed("notebook.plot_tracks"):
+        ...     plot_tracks()
+    """
+    if not _enabled:
+        yield
+        return
+    counters = _local.__dict__.setdefault("counters", [])
+    counters.append(0)
+    start_time = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        record(name, time.perf_counter() - start_time, counters.pop(), error)
+
+
+def profiled(func=None, name=None):
+    """
+    Decorator timing every call of a function while profiling is enabled.
+
+    Example:
+        >>> @profiled
+        ... def get_file_content(bucket_name, file_key): ...
+        >>> @profiled(name="deepracer.ListModels")
+        ... def list_models(): ...
+    """
+    if func is None:
+        return functools.partial(profiled, name=name)
+    name = name or f"{func.__module__}.{func.__qualname__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return func(*args, **kwargs)
+        with timed(name):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def _percentile(histogram, fraction):
+    """Upper bound (ms) of the histogram bucket holding the given fraction of the calls."""
+    target = fraction * sum(histogram)
+    seen = 0
+    for bound, count in zip(BUCKETS_MS, histogram):
+        seen += count
+        if seen >= target:
+            return bound
+    return BUCKETS_MS[-1]
+
+
+def summary():
+    """
+    The statistics of this session.
+
+    Returns:
+        dict: Session start and duration, and per call name: calls, errors, total/mean/min/max
+            seconds, bytes, p50/p95 latency bucket bounds and the histogram counts.
+    """
+    with _lock:
+        stats = {name: dict(stat, histogram=list(stat["histogram"])) for name, stat in _stats.items()}
+    calls = {}
+    for name, stat in sorted(stats.items(), key=lambda item: item[1]["total_s"], reverse=True):
+        calls[name] = {
+            "calls": stat["calls"],
+            "errors": stat["errors"],
+            "total_s": stat["total_s"],
+            "mean_s": stat["total_s"] / stat["calls"],
+            "min_s": stat["min_s"],
+            "max_s": stat["max_s"],
+            "bytes": stat["bytes"],
+            "p50_ms": _percentile(stat["histogram"], 0.5),
+            "p95_ms": _percentile(stat["histogram"], 0.95),
+            "histogram": dict(zip([str(bound) for bound in BUCKETS_MS], stat["histogram"])),
+        }
+    return {"session_start": _session_start, "session_s": time.time() - _session_start, "calls": calls}
+
+
+def report(format="text", path=None):
+    """
+    Render the session statistics as text or JSON, optionally writing them to `path`.
+
+    Returns:
+        string: The report.
+    """
+    data = summary()
+    if format == "json":
+        output = json.dumps(data, indent=2)
+    else:
+        lines = [
+            f"Profile of the last {data['session_s']:.1f}s",
+            f"{'call':<60} {'calls':>7} {'errors':>6} {'total s':>9} {'mean ms':>9} {'p95 ms':>8} {'bytes':>12}",
+        ]
+        for name, stat in data["calls"].items():
+            lines.append(
+                f"{name:<60} {stat['calls']:>7} {stat['errors']:>6} {stat['total_s']:>9.3f} "
+                f"{stat['mean_s'] * 1000:>9.1f} {stat['p95_ms']:>8} {stat['bytes']:>12}"
+            )
+        output = "\n".join(lines)
+
+    if path is not None:
+        with open(path, "w") as f:
+            f.write(output)
+    return output
+
+
+def import_times(module, path=None, top=10):
+    """
+    Cold import time of a module, measured with `python -X importtime` in a new interpreter.
+
+    Args:
+        module (string): The module to import, e.g. "log_analysis".
+        path (string): Folder added to the module search path, the current folder by default.
+        top (int): Number of slowest imports to return.
+
+    Example:
+        >>> import_times("log_analysis")["total_ms"]
+
+    Returns:
+        dict: The total import time in milliseconds and the slowest imports as
+            (module, cumulative ms, self ms) tuples.
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [path or os.getcwd(), env.get("PYTHONPATH")]))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True, env=env
+    )
+    if result.returncode != 0:
+        errors = [line for line in result.stderr.splitlines() if not line.startswith("import time:")]
+        raise ImportError(f"Could not import {module}: {errors[-1] if errors else result.returncode}")
+
+    imports = []
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|\s*(\S+)", line)
+        if match:
+            imports.append((match.group(3), int(match.group(2)) / 1000, int(match.group(1)) / 1000))
+    total_ms = next((cumulative for name, cumulative, _ in reversed(imports) if name == module), 0.0)
+    return {"total_ms": total_ms, "slowest": sorted(imports, key=lambda item: item[1], reverse=True)[:top]}
@@ -1,11 +1,32 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: MIT-0
 
-import boto3
+import functools
 
-s3_client = boto3.client("s3")
+import profiling
 
 
+@functools.lru_cache(maxsize=None)
+def get_client():
+    """
+    The S3 client, created on first use so that importing this module does not load boto3.
+
+    Returns:
+        botocore.client.S3: The client.
+    """
+    import boto3
+
+    return boto3.client("s3")
+
+
+def __getattr__(name):
+    # s3.s3_client keeps working, the client is created when it is first accessed
+    if name == "s3_client":
+        return get_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@profiling.profiled
 def get_file_content(bucket_name, file_key):
     """
     Gets the content of a file from a S3 bucket.
@@ -17,12 +38,33 @@ def get_file_content(bucket_name, file_key):
     Returns:
         The content of the file.
     """
-    response = s3_client.get_object(Bucket=bucket_name, Key=file_key)
-    object_content = response["Body"].read().decode("utf-8")
+    response = get_client().get_object(Bucket=bucket_name, Key=file_key)
+    body = response["Body"].read()
+    profiling.add_bytes(len(body))
+    object_content = body.decode("utf-8")
 
     return object_content
 
 
+@profiling.profiled
+def get_file_bytes(bucket_name, file_key):
+    """
+    Gets the content of a binary file from a S3 bucket.
+
+    Args:
+        bucket_name (string): The S3 bucket name.
+        file_key (string): The S3 file key.
+
+    Returns:
+        bytes: The content of the file.
+    """
+    response = get_client().get_object(Bucket=bucket_name, Key=file_key)
+    body = response["Body"].read()
+    profiling.add_bytes(len(body))
+    return body
+
+
+@profiling.profiled
 def list_files(bucket, prefix=""):
     """
     Lists all files in a S3 bucket with a given prefix.
@@ -34,10 +76,11 @@ def list_files(bucket, prefix=""):
     Returns:
         A list of files.
     """
-    response = s3_client.list_objects_v2(Bucket=bucket, Prefix=prefix)
+    response = get_client().list_objects_v2(Bucket=bucket, Prefix=prefix)
     return response["Contents"]
 
 
+@profiling.profiled
 def list_sub_folders(bucket, prefix=""):
     """
     Lists all sub folders in a S3 bucket with a given prefix.
@@ -49,13 +92,14 @@ def list_sub_folders(bucket, prefix=""):
     Returns:
         A list of subfolders.
     """
-    response = s3_client.list_objects_v2(Bucket=bucket, Prefix=prefix, Delimiter="/")
+    response = get_client().list_objects_v2(Bucket=bucket, Prefix=prefix, Delimiter="/")
 
     if "CommonPrefixes" in response:
         return [d["Prefix"] for d in response["CommonPrefixes"]]
     return []
 
 
+@profiling.profiled
 def delete_s3_prefix(bucket, prefix):
     """
     Deletes all objects in a S3 bucket with a given prefix.
@@ -69,9 +113,9 @@ def delete_s3_prefix(bucket, prefix):
     """
     try:
         print(f"Deleting all objects with prefix '{prefix}' in bucket '{bucket}'...")
-        objects_to_delete = s3_client.list_objects_v2(Bucket=bucket, Prefix=prefix)
+        objects_to_delete = get_client().list_objects_v2(Bucket=bucket, Prefix=prefix)
         for obj in objects_to_delete.get("Contents", []):
-            s3_client.delete_object(Bucket=bucket, Key=obj["Key"])
+            get_client().delete_object(Bucket=bucket, Key=obj["Key"])
         print(
             f"All objects with prefix '{prefix}' in bucket '{bucket}' has been deleted."
         )
@@ -0,0 +1,216 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Concurrent, memoized execution of the agent tools.
+
+A tool call is identified by the tool name and its input. The result of a call is
+kept for the rest of the session until its time to live expires, and a call made
+while the same call is still running waits for that result instead of repeating the
+DeepRacer and S3 requests. Independent calls, like the getters of a model or the
+details of two models, run in threads.
+"""
+import functools
+import json
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+
+import profiling
+
+DEFAULT_TTL_S = 60 * 60
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_MAX_ENTRIES = 1024
+
+# returned by the DeepRacerModel getters in place of what could not be read
+UNKNOWN = "unknown"
+
+
+def _call_key(tool, args, kwargs):
+    """Hashable key of a tool call"""
+    try:
+        key = (tool, args, tuple(sorted(kwargs.items())))
+        hash(key)
+        return key
+    except TypeError:
+        return (tool, json.dumps([args, kwargs], sort_keys=True, default=str))
+
+
+def is_complete_result(result):
+    """
+    False when the result holds, at any depth, the "unknown" placeholder the DeepRacerModel
+    getters return after a failed request. Such results are not memoized, so the next call
+    tries again, also when a tool returns the results of several getters.
+    """
+    if isinstance(result, str):
+        return result != UNKNOWN
+    if isinstance(result, dict):
+        return all(is_complete_result(value) for value in result.values())
+    if isinstance(result, (list, tuple)):
+        return all(is_complete_result(value) for value in result)
+    return True
+
+
+class ToolExecutor:
+    """
+    Run tool calls with a session memo, in-flight deduplication and timing.
+
+    Args:
+        ttl (int): Seconds a result is reused.
+        max_workers (int): Threads of a `run_concurrently` batch.
+        max_entries (int): Results kept at most, the oldest are dropped first.
+        cacheable (function): Whether a result is memoized, by default all but the "unknown" placeholders.
+
+    Example:
+        >>> executor = ToolExecutor(ttl=600)
+        >>> with executor.question("compare models"):
+        ...     details = executor.run_concurrently(
+        ...         [("model_details", get_model_details, (name,)) for name in [MODEL_NAME, COMPARE_MODEL_NAME]]
+        ...     )
+        >>> print(executor.report())
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL_S, max_workers=DEFAULT_MAX_WORKERS, max_entries=DEFAULT_MAX_ENTRIES,
+                 cacheable=is_complete_result):
+        self.ttl = ttl
+        self.max_workers = max_workers
+        self.max_entries = max_entries
+        self.cacheable = cacheable
+        self._lock = threading.Lock()
+        # in expiry order, every entry has the same time to live
+        self._results = {}
+        self._in_flight = {}
+        self._stats = {}
+        self.questions = []
+
+    def _stat(self, tool):
+        return self._stats.setdefault(
+            tool, {"calls": 0, "hits": 0, "deduplicated": 0, "executed": 0, "errors": 0, "total_s": 0.0}
+        )
+
+    def _evict(self, now):
+        """Drop the expired results and the oldest ones above max_entries. Call with `self._lock` held."""
+        while self._results:
+            oldest_key = next(iter(self._results))
+            if self._results[oldest_key][0] > now and len(self._results) <= self.max_entries:
+                break
+            del self._results[oldest_key]
+
+    def call(self, tool, func, *args, **kwargs):
+        """
+        The result of `func(*args, **kwargs)`, memoized under the tool name and input.
+
+        Failed calls are not memoized, their exception is raised to every caller waiting on them.
+        Neither are results rejected by `cacheable`, like the "unknown" placeholders of the getters.
+        """
+        key = _call_key(tool, args, kwargs)
+        with self._lock:
+            stat = self._stat(tool)
+            stat["calls"] += 1
+            cached = self._results.get(key)
+            if cached is not None:
+                if cached[0] > time.monotonic():
+                    stat["hits"] += 1
+                    return cached[1]
+                del self._results[key]
+            running = self._in_flight.get(key)
+            if running is None:
+                future = self._in_flight[key] = Future()
+            else:
+                stat["deduplicated"] += 1
+        if running is not None:
+            return running.result()
+
+        start_time = time.perf_counter()
+        try:
+            with profiling.timed(f"tool.{tool}"):
+                result = func(*args, **kwargs)
+        except BaseException as e:
+            with self._lock:
+                stat["errors"] += 1
+                stat["total_s"] += time.perf_counter() - start_time
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            stat["executed"] += 1
+            stat["total_s"] += time.perf_counter() - start_time
+            if self.cacheable(result):
+                now = time.monotonic()
+                self._results[key] = (now + self.ttl, result)
+                self._evict(now)
+            del self._in_flight[key]
+        future.set_result(result)
+        return result
+
+    def run_concurrently(self, calls):
+        """
+        Run independent tool calls in threads.
+
+        Args:
+            calls (list): (tool, func, args) or (tool, func, args, kwargs) tuples.
+
+        Returns:
+            list: The results in the order of the calls.
+        """
+        calls = [tuple(call) + ({},) * (4 - len(call)) for call in calls]
+        if len(calls) <= 1:
+            return [self.call(tool, func, *args, **kwargs) for tool, func, args, kwargs in calls]
+        # a pool per batch, so tools running their own batches never wait on a full pool
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(calls))) as pool:
+            futures = [pool.submit(self.call, tool, func, *args, **kwargs) for tool, func, args, kwargs in calls]
+            return [future.result() for future in futures]
+
+    def memoized(self, tool):
+        """
+        Decorator running every call of a function through the executor.
+
+        Example:
+            >>> @executor.memoized("list_models")
+            ... def list_models(): ...
+        """
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                return self.call(tool, func, *args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def invalidate(self, tool=None):
+        """Forget the memoized results of one tool, or of all tools."""
+        with self._lock:
+            for key in [key for key in self._results if tool is None or key[0] == tool]:
+                del self._results[key]
+
+    @contextmanager
+    def question(self, label):
+        """Measure the wall-clock time of answering one question."""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.questions.append((label, time.perf_counter() - start_time))
+
+    def stats(self):
+        """
+        Per tool: calls, memo hits, deduplicated in-flight calls, executed calls, errors and
+        the seconds spent executing.
+        """
+        with self._lock:
+            return {tool: dict(stat) for tool, stat in self._stats.items()}
+
+    def report(self):
+        lines = [f"{'tool':<40} {'calls':>6} {'hits':>6} {'dedup':>6} {'runs':>6} {'errors':>6} {'total s':>9}"]
+        for tool, stat in self.stats().items():
+            lines.append(
+                f"{tool:<40} {stat['calls']:>6} {stat['hits']:>6} {stat['deduplicated']:>6} "
+                f"{stat['executed']:>6} {stat['errors']:>6} {stat['total_s']:>9.3f}"
+            )
+        for label, seconds in self.questions:
+            lines.append(f"question {label!r}: {seconds:.3f}s")
+        return "\n".join(lines)
+
@@ -0,0 +1,180 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Local catalog of the DeepRacer tracks.
+
+All tracks of a region are loaded with paginated ListTracks calls in one pass and
+saved to a JSON file, which is used until its time to live expires. Tracks are then
+looked up by id in a dict, and only a track missing from the catalog is fetched
+with GetTrack (and added to it).
+"""
+import functools
+import json
+import os
+import threading
+import time
+
+import deepracer
+import profiling
+
+DEFAULT_CATALOG_PATH = "./persistent/track_catalog.json"
+DEFAULT_TTL_S = 24 * 60 * 60
+DEFAULT_REGION = "us-east-1"
+
+# the track fields returned by the lookups, as returned by deepracer.get_track_name_and_description_from_arn
+TRACK_FIELDS = ["TrackName", "TrackDescription", "TrackDifficulty"]
+
+
+def track_arn(track_id, region=DEFAULT_REGION):
+    """The ARN of a track, e.g. the WORLD_NAME of the training parameters."""
+    return f"arn:aws:deepracer:{region}::track/{track_id}"
+
+
+def track_id_from_arn(arn):
+    return arn.split("/")[-1]
+
+
+class TrackCatalog:
+    """
+    Track lookups by id from a catalog file, refreshed with ListTracks when it expires.
+
+    Args:
+        path (string, optional): The JSON catalog file. None keeps the catalog in memory only.
+        ttl (int): Seconds the catalog is used before it is loaded again.
+        region (string): The region of the tracks.
+
+    Example:
+        >>> catalog = TrackCatalog()
+        >>> catalog.get("reInvent2019_track")
+        {'TrackName': 'The 2019 DeepRacer Championship Cup', 'TrackDescription': '...', 'TrackDifficulty': '...'}
+    """
+
+    def __init__(self, path=DEFAULT_CATALOG_PATH, ttl=DEFAULT_TTL_S, region=DEFAULT_REGION):
+        self.path = path
+        self.ttl = ttl
+        self.region = region
+        self._lock = threading.Lock()
+        # held while the catalog is loaded, so concurrent lookups wait for one ListTracks pass
+        self._load_lock = threading.Lock()
+        self._tracks = None
+        self._loaded_at = 0.0
+        self._missing = set()
+
+    def _read(self):
+        """The load time and tracks of the catalog file, None when it is missing, expired or of another region."""
+        if self.path is None or not os.path.isfile(self.path):
+            return None
+        try:
+            with open(self.path, "r") as f:
+                catalog = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not read the track catalog {self.path}: {e}")
+            return None
+        if catalog.get("region") != self.region or catalog.get("loaded_at", 0) + self.ttl < time.time():
+            return None
+        return catalog["loaded_at"], catalog["tracks"]
+
+    def _write(self):
+        if self.path is None:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temporary_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w") as f:
+            json.dump({"region": self.region, "loaded_at": self._loaded_at, "tracks": self._tracks}, f)
+        # replaced at once, so a concurrent reader never sees a partial file
+        os.replace(temporary_path, self.path)
+
+    @profiling.profiled
+    def refresh(self, page_size=100):
+        """
+        Load all tracks with paginated ListTracks calls and save the catalog.
+
+        Returns:
+            int: The number of tracks.
+        """
+        tracks = {}
+        next_token = None
+        while True:
+            response = deepracer.list_tracks(max_results=page_size, next_token=next_token, region=self.region)
+            for track in response.get("Tracks", []):
+                tracks[track_id_from_arn(track["TrackArn"])] = {key: track[key] for key in TRACK_FIELDS if key in track}
+            next_token = response.get("NextToken")
+            if not next_token:
+                break
+        with self._lock:
+            self._tracks = tracks
+            self._loaded_at = time.time()
+            self._missing.clear()
+            self._write()
+        return len(tracks)
+
+    def _is_fresh(self):
+        return self._tracks is not None and self._loaded_at + self.ttl >= time.time()
+
+    def _ensure_loaded(self):
+        if self._is_fresh():
+            return
+        with self._load_lock:
+            if self._is_fresh():
+                return
+            catalog = self._read()
+            if catalog is not None:
+                with self._lock:
+                    self._loaded_at, self._tracks = catalog
+                return
+            try:
+                self.refresh()
+            except Exception as e:
+                print("Could not list the tracks", e)
+                with self._lock:
+                    # look the tracks up one by one until the next refresh
+                    self._tracks = self._tracks or {}
+                    self._loaded_at = time.time()
+
+    def get(self, track_id):
+        """
+        The name, description and difficulty of a track.
+
+        Args:
+            track_id (string): The track id, the last part of the track ARN.
+
+        Returns:
+            dict: The track fields, "unknown" when the track cannot be found.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            track = self._tracks.get(track_id)
+            if track is not None:
+                return track
+            if track_id in self._missing:
+                return "unknown"
+
+        # not in ListTracks, e.g. a track that is no longer listed
+        track = deepracer.get_track_name_and_description_from_arn(track_arn(track_id, self.region))
+        with self._lock:
+            if isinstance(track, dict):
+                self._tracks[track_id] = track
+                self._write()
+            else:
+                self._missing.add(track_id)
+        return track
+
+    def get_by_arn(self, arn):
+        return self.get(track_id_from_arn(arn))
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self._tracks)
+
+
+@functools.lru_cache(maxsize=None)
+def get_catalog(region=DEFAULT_REGION):
+    """
+    The shared catalog of a region, stored in DEFAULT_CATALOG_PATH for us-east-1 and
+    next to it for other regions.
+    """
+    path = DEFAULT_CATALOG_PATH
+    if region != DEFAULT_REGION:
+        path = DEFAULT_CATALOG_PATH.replace(".json", f".{region}.json")
+    return TrackCatalog(path, region=region)
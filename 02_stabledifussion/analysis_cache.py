@@ -0,0 +1,82 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Pickle cache for results computed from log and sim-trace files.
+
+Results are stored per source file next to the source data and recomputed only when
+the size or modification time of that file changes.
+"""
+import os
+import pickle
+
+CACHE_VERSION = 1
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def load_cache(cache_path):
+    """The cached entries, empty when the cache is missing or cannot be read in any way."""
+    try:
+        with open(cache_path, "rb") as f:
+            cache = pickle.load(f)
+    # unpickling a truncated or foreign file can raise almost anything, e.g. AttributeError or ImportError
+    except Exception:
+        return {}
+    if not isinstance(cache, dict) or cache.get("version") != CACHE_VERSION or not isinstance(cache.get("entries"), dict):
+        return {}
+    return cache["entries"]
+
+
+def save_cache(cache_path, entries):
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump({"version": CACHE_VERSION, "entries": entries}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+
+
+def cached_per_file(paths, cache_path, compute, key=""):
+    """
+    Compute a result for every file, reusing the cached results of unchanged files.
+
+    Args:
+        paths (list): The source files.
+        cache_path (string): The pickle file holding the cached results.
+        compute (function): Called with a path, returns the result for that file.
+        key (string): Identifies the computation, cached results of another key are recomputed.
+
+    Returns:
+        dict: Maps every path to its result, in the order of `paths`.
+
+    Example:
+        >>> cached_per_file(glob.glob("sim-trace/*.csv"), "sim-trace/.analysis_cache.pkl", summarize_file)
+    """
+    entries = load_cache(cache_path)
+    results = {}
+    changed = False
+    for path in paths:
+        name = os.path.basename(path)
+        signature = (key, *file_signature(path))
+        entry = entries.get(name)
+        if entry is None or entry["signature"] != signature:
+            entry = {"signature": signature, "result": compute(path)}
+            entries[name] = entry
+            changed = True
+        results[path] = entry["result"]
+
+    # forget files that were removed
+    names = {os.path.basename(path) for path in paths}
+    for name in list(entries):
+        if name not in names:
+            del entries[name]
+            changed = True
+
+    if changed:
+        try:
+            save_cache(cache_path, entries)
+        except OSError as e:
+            print(f"Could not write the analysis cache {cache_path}: {e}")
+    return results
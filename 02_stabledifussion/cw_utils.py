@@ -8,16 +8,24 @@ Get a particular log given stream ID
 
 #https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/logs.html#CloudWatchLogs.Client.filter_log_events
 """
+import functools
 import sys
 
-import boto3
-import dateutil.parser
+from profiling import add_bytes, profiled
+
+
+@functools.lru_cache(maxsize=None)
+def get_logs_client():
+    """The CloudWatch Logs client, created on first use so that importing this module does not load boto3."""
+    import boto3
+
+    return boto3.client("logs")
 
 
 def get_log_events(
     log_group, stream_name=None, stream_prefix=None, start_time=None, end_time=None
 ):
-    client = boto3.client("logs")
+    client = get_logs_client()
     if stream_name is None and stream_prefix is None:
         print("both stream name and prefix can't be None")
         return
@@ -47,6 +55,7 @@ def get_log_events(
             break
 
 
+@profiled
 def download_log(
     fname,
     stream_name=None,
@@ -70,13 +79,17 @@ def download_log(
             start_time=start_time,
             end_time=end_time,
         )
+        nbytes = 0
         for event in logs:
             f.write(event["message"].rstrip())
             f.write("\n")
+            nbytes += len(event["message"])
+        add_bytes(nbytes)
 
 
+@profiled
 def download_all_logs(pathprefix, log_group, not_older_than=None, older_than=None):
-    client = boto3.client("logs")
+    client = get_logs_client()
 
     lower_timestamp = iso_to_timestamp(not_older_than)
     upper_timestamp = iso_to_timestamp(older_than)
@@ -109,6 +122,7 @@ def download_all_logs(pathprefix, log_group, not_older_than=None, older_than=Non
     return fetched_files
 
 
+@profiled
 def describe_log_streams(client, log_group, next_token):
     if next_token:
         streams = client.describe_log_streams(
@@ -125,4 +139,6 @@ def describe_log_streams(client, log_group, next_token):
 
 
 def iso_to_timestamp(iso_date):
+    import dateutil.parser
+
     return dateutil.parser.parse(iso_date).timestamp() * 1000 if iso_date else None
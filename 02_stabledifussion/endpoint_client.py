@@ -0,0 +1,430 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Pipelined client for the Stable Diffusion models of the multi-model endpoint.
+
+Every image goes through a chain of stages (by default `sd_upscale` then `sd_depth`,
+the order used in the notebook). Images are loaded, resized and encoded on a thread
+pool just ahead of their requests, and up to `max_in_flight` images are in their chain at once, each passing its
+result straight to its next stage without waiting for the rest of the batch. Outputs
+are written as soon as an image has gone through all stages, and failed requests are
+retried with exponential backoff. `iter_images` yields the outputs in memory instead,
+for evaluating them with the policies without writing them to disk.
+
+The endpoint is called through an invoker: `SageMakerInvoker` for the real endpoint,
+`HttpInvoker` for the local stand-in started with `serve_stand_in`.
+"""
+import base64
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+from PIL import Image
+
+from profiling import timed
+from utils import decode_image, encode_image
+
+Stage = namedtuple("Stage", ["target_model", "prompt", "gen_args"])
+
+UPSCALE_STAGE = Stage(
+    "sd_upscale.tar.gz",
+    "Image of a racing track with border of the track as white, center line of the track as yellow, "
+    "the region out of the track in green color, and outside walls are black",
+    None,
+)
+DEPTH_STAGE = Stage(
+    "sd_depth.tar.gz",
+    "Real world racing track with flood lights, the track should have dashed yellow center line, "
+    "white track borders. White light reflections visible on the track ",
+    {"num_inference_steps": 100, "strength": 0.70},
+)
+DEFAULT_STAGES = [UPSCALE_STAGE, DEPTH_STAGE]
+
+# depth2img followed by the x4 upscaler in one request, see compare_depth_upscale
+COMBINED_TARGET_MODEL = "sd_depth_upscale.tar.gz"
+
+# error codes of the SageMaker runtime and HTTP statuses worth another attempt
+RETRYABLE_ERROR_CODES = {"ThrottlingException", "ServiceUnavailable", "InternalFailure", "ModelNotReadyException"}
+RETRYABLE_HTTP_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _triton_request(inputs):
+    return json.dumps(
+        {
+            "inputs": [
+                {"name": name, "shape": [1, 1], "datatype": "BYTES", "data": [data]}
+                for name, data in inputs.items()
+            ]
+        }
+    )
+
+
+def build_payload(image, stage):
+    """The Triton JSON request of a stage for a base64 encoded image."""
+    inputs = {"prompt": stage.prompt, "image": image}
+    if stage.gen_args:
+        inputs["gen_args"] = json.dumps(stage.gen_args)
+    return _triton_request(inputs)
+
+
+def build_combined_payload(image, depth_stage=DEPTH_STAGE, upscale_stage=UPSCALE_STAGE):
+    """The sd_depth_upscale request running the two stages on a base64 encoded image."""
+    inputs = {"prompt": depth_stage.prompt, "image": image, "upscale_prompt": upscale_stage.prompt}
+    if depth_stage.gen_args:
+        inputs["gen_args"] = json.dumps(depth_stage.gen_args)
+    if upscale_stage.gen_args:
+        inputs["upscale_gen_args"] = json.dumps(upscale_stage.gen_args)
+    return _triton_request(inputs)
+
+
+def _output(body, name):
+    outputs = json.loads(body.decode("utf8"))["outputs"]
+    return next((output["data"][0] for output in outputs if output["name"] == name), None)
+
+
+def parse_response(body):
+    """The base64 encoded image of a Triton JSON response."""
+    return _output(body, "generated_image")
+
+
+def parse_stats(body):
+    """The latency and peak memory a diffusion model reports with its image, None if it does not."""
+    stats = _output(body, "stats")
+    return json.loads(stats) if stats is not None else None
+
+
+class SageMakerInvoker:
+    """Invoke a model of the SageMaker multi-model endpoint."""
+
+    def __init__(self, runtime_client, endpoint_name):
+        self.runtime_client = runtime_client
+        self.endpoint_name = endpoint_name
+
+    def __call__(self, target_model, body):
+        response = self.runtime_client.invoke_endpoint(
+            EndpointName=self.endpoint_name,
+            ContentType="application/octet-stream",
+            Body=body,
+            TargetModel=target_model,
+        )
+        return response["Body"].read()
+
+
+class HttpInvoker:
+    """Invoke a model of an HTTP endpoint taking the same requests, like the local stand-in."""
+
+    def __init__(self, url, timeout=600):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def __call__(self, target_model, body):
+        request = urllib.request.Request(
+            f"{self.url}/models/{target_model}",
+            data=body.encode("utf8"),
+            headers={"Content-Type": "application/octet-stream"},
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return response.read()
+
+
+def is_retryable(error):
+    """Whether a failed request may succeed when sent again."""
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code in RETRYABLE_HTTP_STATUSES
+    response = getattr(error, "response", None)
+    if isinstance(response, dict):
+        code = response.get("Error", {}).get("Code")
+        status = response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+        return code in RETRYABLE_ERROR_CODES or status in RETRYABLE_HTTP_STATUSES
+    # connection resets and timeouts
+    return isinstance(error, (ConnectionError, TimeoutError, urllib.error.URLError))
+
+
+def invoke_with_retry(invoker, target_model, body, retries=4, backoff_s=1.0, max_backoff_s=30.0):
+    """
+    Invoke a model, retrying retryable errors with exponential backoff and full jitter.
+
+    Returns:
+        bytes: The response body.
+    """
+    for attempt in range(retries + 1):
+        try:
+            with timed(f"endpoint.{target_model}"):
+                return invoker(target_model, body)
+        except Exception as e:
+            if attempt == retries or not is_retryable(e):
+                raise
+            time.sleep(random.uniform(0, min(max_backoff_s, backoff_s * 2**attempt)))
+
+
+class EndpointPipeline:
+    """
+    Send images through the stages with several images in flight.
+
+    Args:
+        invoker: A SageMakerInvoker, HttpInvoker or any callable (target_model, body) -> bytes.
+        stages (list): The Stage chain every image goes through.
+        max_in_flight (int): Images in their chain at the same time, match it to the endpoint concurrency.
+        encode_workers (int): Threads loading, resizing and encoding the input images.
+        input_size (tuple): Size the input images are resized to.
+        output_size (tuple): Size the outputs are saved at, (160, 120) is the DeepRacer camera size.
+
+    Example:
+        >>> pipeline = EndpointPipeline(SageMakerInvoker(runtime_sm_client, endpoint_name), max_in_flight=4)
+        >>> report = pipeline.run(sorted(glob.glob("sample_images/*.png")), "output_images/")
+    """
+
+    def __init__(
+        self,
+        invoker,
+        stages=DEFAULT_STAGES,
+        max_in_flight=4,
+        encode_workers=2,
+        input_size=(128, 128),
+        output_size=(160, 120),
+        retries=4,
+        backoff_s=1.0,
+    ):
+        self.invoker = invoker
+        self.stages = list(stages)
+        self.max_in_flight = max_in_flight
+        self.encode_workers = encode_workers
+        self.input_size = input_size
+        self.output_size = output_size
+        self.retries = retries
+        self.backoff_s = backoff_s
+
+    def encode(self, path):
+        with Image.open(path) as image:
+            return encode_image(image.convert("RGB").resize(self.input_size)).decode("utf8")
+
+    def process(self, encoded):
+        """Run one encoded image through all stages, returns the final image."""
+        image = encoded
+        for stage in self.stages:
+            body = invoke_with_retry(self.invoker, stage.target_model, build_payload(image, stage), self.retries, self.backoff_s)
+            # the base64 output is the next stage's input as is
+            image = parse_response(body)
+        return decode_image(image)
+
+    def iter_images(self, files, output_path=None, output_prefix="SD_", errors=None):
+        """
+        Process the image files, yielding every output as soon as it is done.
+
+        The outputs stay in memory, so they can go straight to `policy_inference.stream_inference`.
+
+        Args:
+            files (list): The input image paths.
+            output_path (string, optional): Also save the outputs as `<output_path>/<output_prefix><file name>`.
+            errors (dict, optional): Collects the errors by input path, failed images are skipped.
+
+        Yields:
+            tuple: The input path and the output image, resized to `output_size`, in completion order.
+        """
+        if output_path is not None:
+            os.makedirs(output_path, exist_ok=True)
+
+        def process_file(path, encoded_future):
+            image = self.process(encoded_future.result()).resize(self.output_size)
+            if output_path is not None:
+                image.save(os.path.join(output_path, output_prefix + os.path.basename(path)))
+            return image
+
+        # images between being read and being yielded, so at most this many encoded
+        # payloads and outputs are held in memory however many files there are
+        window = self.max_in_flight + self.encode_workers
+        remaining = iter(files)
+        futures = {}
+        encode_pool = ThreadPoolExecutor(max_workers=self.encode_workers)
+        request_pool = ThreadPoolExecutor(max_workers=self.max_in_flight)
+
+        def submit_next():
+            path = next(remaining, None)
+            if path is not None:
+                futures[request_pool.submit(process_file, path, encode_pool.submit(self.encode, path))] = path
+
+        try:
+            for _ in range(window):
+                submit_next()
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = futures.pop(future)
+                    submit_next()
+                    try:
+                        image = future.result()
+                    except Exception as e:
+                        print(f"Could not process {path}: {e}")
+                        if errors is not None:
+                            errors[path] = e
+                        continue
+                    yield path, image
+        finally:
+            # a consumer stopping early drops the queued images; the requests already
+            # sent finish on the pool threads, but the generator does not wait for them
+            encode_pool.shutdown(wait=False, cancel_futures=True)
+            request_pool.shutdown(wait=False, cancel_futures=True)
+
+    def run(self, files, output_path, output_prefix="SD_", on_result=None):
+        """
+        Process the image files and save the outputs as `<output_path>/<output_prefix><file name>`.
+
+        Args:
+            files (list): The input image paths.
+            output_path (string): The folder the outputs are written to.
+            on_result (function): Called with (path, image) as soon as an image is done, e.g. `display`.
+
+        Returns:
+            dict: The output paths by input path, the errors by input path, the elapsed
+                seconds and the images per second.
+        """
+        start_time = time.perf_counter()
+        outputs, errors = {}, {}
+        for path, image in self.iter_images(files, output_path, output_prefix, errors):
+            outputs[path] = os.path.join(output_path, output_prefix + os.path.basename(path))
+            if on_result is not None:
+                on_result(path, image)
+
+        seconds = time.perf_counter() - start_time
+        return {
+            "outputs": outputs,
+            "errors": errors,
+            "seconds": seconds,
+            "images_per_second": len(outputs) / seconds if seconds else float("inf"),
+        }
+
+
+def compare_depth_upscale(invoker, files, input_size=(128, 128), depth_stage=DEPTH_STAGE, upscale_stage=UPSCALE_STAGE,
+                          retries=4, backoff_s=1.0):
+    """
+    Time the combined sd_depth_upscale model against the two-hop sd_depth -> sd_upscale path.
+
+    Every image is sent through both paths, one request at a time, after a first untimed
+    request per path that loads the models. The latency is measured by the client and
+    includes the second round trip of the two-hop path. The peak memory is the one the
+    models report: sd_depth and sd_upscale run in separate processes with both pipelines
+    loaded on the GPU, so the two-hop peak is the sum of theirs.
+
+    Args:
+        invoker: A SageMakerInvoker, HttpInvoker or any callable (target_model, body) -> bytes.
+        files (list): The input image paths, the same for both paths.
+        input_size (tuple): Size the input images are resized to.
+
+    Returns:
+        dict: Per path, the latencies in seconds by input path and the peak memory in MiB
+            (None when the models run without CUDA or report no stats).
+    """
+    def invoke(target_model, body):
+        return invoke_with_retry(invoker, target_model, body, retries, backoff_s)
+
+    def two_hop(image):
+        depth_body = invoke(depth_stage.target_model, build_payload(image, depth_stage))
+        upscale_body = invoke(upscale_stage.target_model, build_payload(parse_response(depth_body), upscale_stage))
+        return [parse_stats(depth_body), parse_stats(upscale_body)]
+
+    def combined(image):
+        body = invoke(COMBINED_TARGET_MODEL, build_combined_payload(image, depth_stage, upscale_stage))
+        return [parse_stats(body)]
+
+    def encode(path):
+        with Image.open(path) as image:
+            return encode_image(image.convert("RGB").resize(input_size)).decode("utf8")
+
+    encoded = {path: encode(path) for path in files}
+    results = {}
+    for name, run in [("two-hop", two_hop), ("combined", combined)]:
+        if encoded:
+            run(next(iter(encoded.values())))
+        latencies, peaks = {}, []
+        for path, image in encoded.items():
+            start_time = time.perf_counter()
+            stats = run(image)
+            latencies[path] = time.perf_counter() - start_time
+            if all(stat is not None and stat.get("peak_memory_mb") is not None for stat in stats):
+                peaks.append(sum(stat["peak_memory_mb"] for stat in stats))
+        results[name] = {"latency_s": latencies, "peak_memory_mb": max(peaks) if len(peaks) == len(encoded) else None}
+
+    def column(value, format_spec):
+        return format(value, format_spec) if value is not None else "n/a"
+
+    print(f"{'image':<40} {'two-hop s':>10} {'combined s':>11}")
+    for path in encoded:
+        print(
+            f"{os.path.basename(path):<40} {results['two-hop']['latency_s'][path]:>10.2f} "
+            f"{results['combined']['latency_s'][path]:>11.2f}"
+        )
+    if encoded:
+        means = {name: sum(result["latency_s"].values()) / len(encoded) for name, result in results.items()}
+        print(f"{'mean':<40} {means['two-hop']:>10.2f} {means['combined']:>11.2f}")
+    print(
+        f"{'peak GPU memory MiB':<40} {column(results['two-hop']['peak_memory_mb'], '.0f'):>10} "
+        f"{column(results['combined']['peak_memory_mb'], '.0f'):>11}"
+    )
+    return results
+
+
+def serve_stand_in(port=0, latency_s=1.0, max_concurrency=4, failure_rate=0.0, seed=None):
+    """
+    Start a local HTTP stand-in of the endpoint, for testing the pipeline without SageMaker.
+
+    Requests are answered after `latency_s` seconds with the input image, upscaled 4x by
+    the "sd_upscale" and "sd_depth_upscale" models. At most `max_concurrency` requests are served at once, the
+    others wait like on a busy endpoint, and `failure_rate` of the requests fail with
+    HTTP 503.
+
+    Example:
+        >>> server = serve_stand_in(latency_s=0.5, max_concurrency=4)
+        >>> EndpointPipeline(HttpInvoker(server.url), max_in_flight=4).run(files, "/tmp/out")
+        >>> server.shutdown()
+
+    Returns:
+        ThreadingHTTPServer: The running server, with its address in `url`.
+    """
+    slots = threading.BoundedSemaphore(max_concurrency)
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            target_model = self.path.rsplit("/", 1)[-1]
+            with rng_lock:
+                fail = rng.random() < failure_rate
+            if fail:
+                self.send_error(503, "Service Unavailable")
+                return
+            with slots:
+                time.sleep(latency_s)
+                inputs = {item["name"]: item["data"][0] for item in json.loads(body)["inputs"]}
+                image = decode_image(inputs["image"])
+                if target_model.startswith(("sd_upscale", "sd_depth_upscale")):
+                    image = image.resize((image.width * 4, image.height * 4))
+                buffer = BytesIO()
+                image.convert("RGB").save(buffer, format="JPEG")
+                output = base64.b64encode(buffer.getvalue()).decode("utf8")
+            response = json.dumps(
+                {"outputs": [{"name": "generated_image", "datatype": "BYTES", "shape": [1], "data": [output]}]}
+            ).encode("utf8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(response)))
+            self.end_headers()
+            self.wfile.write(response)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,129 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Batched Grad-CAM heatmaps for DeepRacer policies.
+
+The gradient subgraph is built once per policy for all actions, so a single
+session run returns the heatmaps of every action for a whole batch of images.
+"""
+import time
+
+import numpy as np
+import tensorflow.compat.v1 as tf
+from matplotlib import cm
+
+from policy_inference import OBSERVATION_SIZE, load_image, preprocess_images
+
+CONV_TENSOR = "main_level/agent/main/online/network_1/{sensor}/Conv2d_4/Conv2D:0"
+
+# RGB lookup table of the JET colormap
+JET_LUT = np.uint8(cm.jet(np.arange(256))[:, :3] * 255)
+
+
+def resize_bilinear(arrays, height, width):
+    """Bilinear resize of the last two axes, with the same pixel-center convention as cv2.resize."""
+    in_height, in_width = arrays.shape[-2:]
+
+    def axis_weights(out_size, in_size):
+        coords = np.clip((np.arange(out_size) + 0.5) * in_size / out_size - 0.5, 0, in_size - 1)
+        low = np.floor(coords).astype(int)
+        high = np.minimum(low + 1, in_size - 1)
+        return low, high, coords - low
+
+    y0, y1, wy = axis_weights(height, in_height)
+    x0, x1, wx = axis_weights(width, in_width)
+    rows = arrays[..., y0, :] * (1 - wy)[:, np.newaxis] + arrays[..., y1, :] * wy[:, np.newaxis]
+    return rows[..., x0] * (1 - wx) + rows[..., x1] * wx
+
+
+def overlay_heatmaps(cams, images):
+    """
+    Colorize class activation maps and blend them onto their images.
+
+    Args:
+        cams (np.ndarray): Activation maps of shape (actions, images, h, w).
+        images (np.ndarray): RGB images of shape (images, height, width, 3), uint8.
+
+    Returns:
+        np.ndarray: uint8 overlays of shape (actions, images, height, width, 3).
+    """
+    height, width = images.shape[1:3]
+    cams = np.maximum(resize_bilinear(cams, height, width), 0)  # relu clip
+    heatmaps = cams / (cams.max(axis=(-2, -1), keepdims=True) + 1e-5)
+    colored = JET_LUT[np.uint8(255 * heatmaps)].astype(np.float32)
+
+    overlays = colored + images[np.newaxis].astype(np.float32)
+    overlays = 255 * overlays / (overlays.max(axis=(-3, -2, -1), keepdims=True) + 1e-5)
+    return np.uint8(overlays)
+
+
+class GradCam:
+    """Grad-CAM for every action of a PolicyModel, the gradient ops are created once."""
+
+    def __init__(self, policy, num_actions=None):
+        self.policy = policy
+        graph = policy.graph
+        with graph.as_default():
+            self.conv_output = graph.get_tensor_by_name(CONV_TENSOR.format(sensor=policy.sensor))
+            self.num_actions = num_actions or int(policy.policy.shape[-1])
+            # images in a batch do not interact, so the gradient of the summed action
+            # probability holds the per-image gradients
+            self.gradients = tf.stack(
+                [
+                    tf.gradients(tf.reduce_sum(policy.policy[:, action]), self.conv_output)[0]
+                    for action in range(self.num_actions)
+                ]
+            )
+
+    def cams(self, observations):
+        """
+        Class activation maps for every action.
+
+        Args:
+            observations (np.ndarray): Array of shape (images, 120, 160, 1) from `preprocess_images`.
+
+        Returns:
+            np.ndarray: Maps of shape (actions, images, h, w) at the conv layer resolution.
+        """
+        conv_output, gradients = self.policy.session.run(
+            [self.conv_output, self.gradients], feed_dict={self.policy.observation: observations}
+        )
+        weights = gradients.mean(axis=(2, 3))
+        return np.einsum("anc,nhwc->anhw", weights, conv_output)
+
+    def heatmaps(self, images, batch_size=32, size=OBSERVATION_SIZE):
+        """
+        Grad-CAM overlays of every action for every image.
+
+        Args:
+            images (list): Image paths, PIL images or RGB arrays.
+            batch_size (int): The number of images per session run.
+            size (tuple): The (width, height) of the returned overlays.
+
+        Returns:
+            np.ndarray: uint8 overlays of shape (actions, images, height, width, 3).
+        """
+        rgb_images = np.stack([np.asarray(load_image(image).convert("RGB").resize(size)) for image in images])
+        observations = preprocess_images(rgb_images)
+        cams = np.concatenate(
+            [self.cams(observations[i : i + batch_size]) for i in range(0, len(observations), batch_size)],
+            axis=1,
+        )
+        return overlay_heatmaps(cams, rgb_images)
+
+
+def benchmark(gradcam, images, batch_size=32, repeats=3):
+    """
+    Measure Grad-CAM throughput, every image gets the heatmaps of all actions.
+
+    Returns:
+        float: images/second.
+    """
+    rgb_images = [np.asarray(load_image(image).convert("RGB")) for image in images]
+    gradcam.heatmaps(rgb_images, batch_size)  # warm up
+
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        gradcam.heatmaps(rgb_images, batch_size)
+    return len(rgb_images) * repeats / (time.perf_counter() - start_time)
@@ -0,0 +1,156 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Lap and sector analytics of sim-trace trajectories.
+
+All episodes are processed at once: step features are computed with shifted arrays
+masked at episode boundaries, and per-episode or per-sector results with one groupby.
+"""
+import numpy as np
+import pandas as pd
+
+
+def step_features(df, track=None, n_sectors=10):
+    """
+    Per-step distance, time, speed, curvature and sector of every episode.
+
+    Args:
+        df (DataFrame): Sim-trace steps from `log_analysis.load_simtrace` (x and y in centimeters).
+        track (track.Track): Optional track, adds the signed deviation from the center line.
+        n_sectors (int): The number of equal waypoint ranges the track is split into.
+
+    Returns:
+        DataFrame: The steps sorted by episode and step, with distance (meters from the
+            previous step), dt (seconds), speed (m/s), curvature (1/m of the driven line),
+            sector and, with a track, deviation (meters, positive left of the center line).
+    """
+    df = df.sort_values(["episode", "steps"], kind="stable").reset_index(drop=True)
+    episode = df["episode"].to_numpy()
+    x = df["x"].to_numpy(dtype=np.float64) / 100
+    y = df["y"].to_numpy(dtype=np.float64) / 100
+    timestamp = df["timestamp"].to_numpy(dtype=np.float64)
+
+    same_as_previous = np.zeros(len(df), dtype=bool)
+    same_as_previous[1:] = episode[1:] == episode[:-1]
+
+    distance = np.zeros(len(df))
+    distance[1:] = np.hypot(np.diff(x), np.diff(y))
+    distance[~same_as_previous] = 0
+    dt = np.zeros(len(df))
+    dt[1:] = np.diff(timestamp)
+    dt[~same_as_previous] = 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        speed = np.where(dt > 0, distance / dt, np.nan)
+
+    # Menger curvature of every step with its neighbours: 4 * triangle area / product of the sides
+    curvature = np.full(len(df), np.nan)
+    if len(df) >= 3:
+        ax, ay = x[:-2], y[:-2]
+        bx, by = x[1:-1], y[1:-1]
+        cx, cy = x[2:], y[2:]
+        area2 = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+        sides = np.hypot(bx - ax, by - ay) * np.hypot(cx - bx, cy - by) * np.hypot(cx - ax, cy - ay)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            menger = np.where(sides > 0, 2 * area2 / sides, 0.0)
+        valid = same_as_previous[1:-1] & same_as_previous[2:]
+        curvature[1:-1] = np.where(valid, menger, np.nan)
+
+    closest_waypoint = df["closest_waypoint"].to_numpy()
+    n_waypoints = len(track.center) if track is not None else int(closest_waypoint.max()) + 1
+
+    features = df.assign(
+        distance=distance,
+        dt=dt,
+        speed=speed,
+        curvature=curvature,
+        sector=(closest_waypoint % n_waypoints) * n_sectors // n_waypoints,
+    )
+    if track is not None:
+        located = track.locate(x, y, closest_waypoint)
+        features["deviation"] = np.where(
+            located["is_left_of_center"], located["distance_from_center"], -located["distance_from_center"]
+        )
+    return features
+
+
+def episode_laps(features):
+    """
+    One row per episode from `step_features`.
+
+    Returns:
+        DataFrame: Indexed by episode, with iteration, status, completed, progress,
+            distance, lap_time, mean and max speed, mean absolute curvature and, with a
+            track, mean absolute deviation.
+    """
+    features = features.assign(abs_curvature=features["curvature"].abs())
+    aggregations = {
+        "iteration": ("iteration", "first"),
+        "progress": ("progress", "last"),
+        "distance": ("distance", "sum"),
+        "start_time": ("timestamp", "first"),
+        "end_time": ("timestamp", "last"),
+        "mean_speed": ("speed", "mean"),
+        "max_speed": ("speed", "max"),
+        "mean_abs_curvature": ("abs_curvature", "mean"),
+    }
+    if "episode_status" in features:
+        aggregations["status"] = ("episode_status", "last")
+    if "deviation" in features:
+        features = features.assign(abs_deviation=features["deviation"].abs())
+        aggregations["mean_abs_deviation"] = ("abs_deviation", "mean")
+
+    laps = features.groupby("episode", sort=True).agg(**aggregations)
+    laps["lap_time"] = laps["end_time"] - laps["start_time"]
+    if "status" in laps:
+        laps["completed"] = laps["status"] == "lap_complete"
+    else:
+        laps["completed"] = laps["progress"] >= 100
+    return laps.drop(columns=["start_time", "end_time"])
+
+
+def sector_times(features):
+    """
+    Time spent in every sector, one row per episode and one column per sector.
+
+    A sector an episode did not reach is NaN.
+    """
+    times = features.groupby(["episode", "sector"], sort=True)["dt"].sum()
+    return times.unstack("sector")
+
+
+def best_laps(laps, sectors=None):
+    """
+    The fastest completed lap of every iteration.
+
+    Args:
+        laps (DataFrame): From `episode_laps`.
+        sectors (DataFrame): Optional `sector_times`, joined to the best laps.
+
+    Returns:
+        DataFrame: Indexed by iteration, the episode and its lap statistics.
+    """
+    completed = laps[laps["completed"]]
+    best = completed.loc[completed.groupby("iteration")["lap_time"].idxmin()]
+    best = best.reset_index().set_index("iteration")
+    if sectors is not None:
+        best = best.join(sectors.add_prefix("sector_"), on="episode")
+    return best
+
+
+def analyze_laps(df, track=None, n_sectors=10):
+    """
+    Step features, episode laps, sector times and best laps of a sim-trace in one call.
+
+    Example:
+        >>> df = load_simtrace(f"{model_path}/sim-trace/training/training-simtrace")
+        >>> features, laps, sectors, best = analyze_laps(df, n_sectors=8)
+        >>> best[["episode", "lap_time", "mean_speed"]]
+
+    Returns:
+        tuple: The step features, episode laps, sector times and best laps per iteration.
+    """
+    features = step_features(df, track, n_sectors)
+    laps = episode_laps(features)
+    sectors = sector_times(features)
+    return features, laps, sectors, best_laps(laps, sectors)
@@ -0,0 +1,283 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Follow a running training job and keep its episode and iteration statistics up to date.
+
+A source returns the lines appended since its last read, either from a growing local
+file (RoboMaker log or sim-trace CSV) or from the newest CloudWatch log stream. Only
+those lines are parsed, and every row updates the running statistics of its episode
+and iteration in constant time.
+"""
+import time
+
+import pandas as pd
+
+from cw_utils import describe_log_streams, get_logs_client
+from log_analysis import EPISODE_PER_ITER, simtrace_files
+
+# fields of a SIM_TRACE_LOG line, the RoboMaker log format parsed by log_analysis.convert_to_pandas
+SIM_TRACE_LOG_FIELDS = [
+    "episode",
+    "steps",
+    "X",
+    "Y",
+    "yaw",
+    "steer",
+    "throttle",
+    "action",
+    "reward",
+    "done",
+    "all_wheels_on_track",
+    "progress",
+    "closest_waypoint",
+    "track_len",
+    "tstamp",
+]
+
+
+class FileTail:
+    """The lines appended to a local file since the previous read."""
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.partial = b""
+
+    def read_new(self):
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(0, 2)
+                if f.tell() < self.offset:
+                    # the file was truncated or replaced, start over
+                    self.offset, self.partial = 0, b""
+                f.seek(self.offset)
+                data = f.read()
+                self.offset = f.tell()
+        except FileNotFoundError:
+            return []
+
+        data = self.partial + data
+        # keep an unfinished last line for the next read
+        complete, _, self.partial = data.rpartition(b"\n")
+        if not complete:
+            return []
+        return complete.decode("utf-8", errors="replace").split("\n")
+
+
+class DirectoryTail:
+    """The lines appended to the `N-iteration.csv` files of a sim-trace folder, new files included."""
+
+    def __init__(self, path):
+        self.path = path
+        self.files = {}
+
+    def read_new(self):
+        lines = []
+        for fname in simtrace_files(self.path):
+            if fname not in self.files:
+                self.files[fname] = FileTail(fname)
+            lines.extend(self.files[fname].read_new())
+        return lines
+
+
+class CloudWatchTail:
+    """The events appended to a CloudWatch log stream since the previous read."""
+
+    def __init__(self, log_group="/aws/robomaker/SimulationJobs", stream_name=None, client=None):
+        self.client = client or get_logs_client()
+        self.log_group = log_group
+        # the newest stream of the group when no stream is given
+        self.stream_name = stream_name or describe_log_streams(self.client, log_group, None)["logStreams"][0]["logStreamName"]
+        self.next_token = None
+
+    def read_new(self):
+        lines = []
+        while True:
+            kwargs = {"logGroupName": self.log_group, "logStreamName": self.stream_name, "startFromHead": True}
+            if self.next_token:
+                kwargs["nextToken"] = self.next_token
+            resp = self.client.get_log_events(**kwargs)
+            lines.extend(event["message"].rstrip() for event in resp["events"])
+            # the forward token stays the same once the end of the stream is reached
+            if resp["nextForwardToken"] == self.next_token:
+                break
+            self.next_token = resp["nextForwardToken"]
+            if not resp["events"]:
+                break
+        return lines
+
+
+def _to_bool(value):
+    return "True" in value if isinstance(value, str) else bool(value)
+
+
+class LiveTrainingState:
+    """
+    Running per-episode and per-iteration statistics of a training job.
+
+    Rows are given in the order they are written. Every row updates its episode record
+    and applies the change to the totals of its iteration, so an update costs O(new rows).
+    """
+
+    def __init__(self):
+        self.episodes = {}
+        self.iterations = {}
+        self.rows = 0
+        self.header = None
+
+    def parse_line(self, line):
+        """A row dict for a sim-trace CSV line or a SIM_TRACE_LOG line, None for other lines."""
+        if "SIM_TRACE_LOG:" in line:
+            values = line.split("SIM_TRACE_LOG:")[1].split("\t")[0].split(",")
+            return dict(zip(SIM_TRACE_LOG_FIELDS, values))
+        line = line.strip()
+        if line.startswith("episode,"):
+            self.header = line.split(",")
+            return None
+        if self.header is not None and line:
+            values = line.split(",")
+            if len(values) == len(self.header):
+                return dict(zip(self.header, values))
+        return None
+
+    def update(self, lines):
+        """Parse new lines and update the statistics, returns the number of rows added."""
+        added = 0
+        for line in lines:
+            row = self.parse_line(line)
+            if row is not None:
+                self.add_row(row)
+                added += 1
+        self.rows += added
+        return added
+
+    def add_row(self, row):
+        episode = int(row["episode"])
+        reward = float(row["reward"])
+        progress = float(row["progress"])
+        timestamp = float(row["tstamp"])
+        status = row.get("episode_status")
+        if status is None:
+            # SIM_TRACE_LOG lines carry no status, derive it from done and the track flags
+            if progress >= 100:
+                status = "lap_complete"
+            elif not _to_bool(row["all_wheels_on_track"]):
+                status = "off_track"
+            else:
+                status = "in_progress"
+
+        record = self.episodes.get(episode)
+        if record is None:
+            iteration = episode // EPISODE_PER_ITER + 1
+            record = self.episodes[episode] = {
+                "iteration": iteration,
+                "steps": 0,
+                "total_reward": 0.0,
+                "progress": 0.0,
+                "status": status,
+                "off_track": False,
+                "completed": False,
+                "start_time": timestamp,
+                "lap_time": None,
+            }
+            totals = self.iterations.setdefault(
+                iteration,
+                {
+                    "episodes": 0,
+                    "reward_sum": 0.0,
+                    "progress_sum": 0.0,
+                    "steps_sum": 0,
+                    "completed": 0,
+                    "off_track": 0,
+                    "lap_time_sum": 0.0,
+                    "best_lap_time": None,
+                },
+            )
+            totals["episodes"] += 1
+        totals = self.iterations[record["iteration"]]
+
+        steps = int(float(row["steps"]))
+        totals["steps_sum"] += max(steps - record["steps"], 0)
+        record["steps"] = max(steps, record["steps"])
+        record["total_reward"] += reward
+        totals["reward_sum"] += reward
+        totals["progress_sum"] += progress - record["progress"]
+        record["progress"] = progress
+        record["status"] = status
+
+        if status == "off_track" and not record["off_track"]:
+            record["off_track"] = True
+            totals["off_track"] += 1
+        if status == "lap_complete" and not record["completed"]:
+            lap_time = timestamp - record["start_time"]
+            record["completed"] = True
+            record["lap_time"] = lap_time
+            totals["completed"] += 1
+            totals["lap_time_sum"] += lap_time
+            if totals["best_lap_time"] is None or lap_time < totals["best_lap_time"]:
+                totals["best_lap_time"] = lap_time
+
+    def episode_table(self):
+        return pd.DataFrame.from_dict(self.episodes, orient="index").rename_axis("episode")
+
+    def iteration_table(self):
+        """Per-iteration summary in the layout of `simtrace_summary.summarize_iterations`."""
+        rows = {}
+        for iteration, totals in sorted(self.iterations.items()):
+            episodes = totals["episodes"]
+            rows[iteration] = {
+                "episodes": episodes,
+                "completion_rate": totals["completed"] / episodes,
+                "mean_progress": totals["progress_sum"] / episodes,
+                "mean_reward": totals["reward_sum"] / episodes,
+                "mean_steps": totals["steps_sum"] / episodes,
+                "off_track": totals["off_track"],
+                "mean_lap_time": totals["lap_time_sum"] / totals["completed"] if totals["completed"] else None,
+                "best_lap_time": totals["best_lap_time"],
+            }
+        return pd.DataFrame.from_dict(rows, orient="index").rename_axis("iteration")
+
+    def __repr__(self):
+        if not self.iterations:
+            return "LiveTrainingState(no rows yet)"
+        iteration = max(self.iterations)
+        table = self.iteration_table()
+        last = table.loc[iteration]
+        return (
+            f"LiveTrainingState({self.rows} rows, {len(self.episodes)} episodes, iteration {iteration}: "
+            f"completion {last['completion_rate']:.0%}, progress {last['mean_progress']:.1f}%, "
+            f"reward {last['mean_reward']:.1f})"
+        )
+
+    def _repr_html_(self):
+        return f"<p>{self!r}</p>" + self.iteration_table().tail(10).to_html()
+
+
+class LiveTail:
+    """
+    Poll a source and feed the new lines to a LiveTrainingState.
+
+    Example:
+        >>> tail = LiveTail(DirectoryTail(f"{model_path}/sim-trace/training/training-simtrace"))
+        >>> tail.follow(interval=10, callback=lambda state: (clear_output(wait=True), display(state)))
+    """
+
+    def __init__(self, source, state=None):
+        self.source = source
+        self.state = state or LiveTrainingState()
+
+    def poll(self):
+        """Read and parse the appended lines, returns the number of new rows."""
+        return self.state.update(self.source.read_new())
+
+    def follow(self, interval=10, max_polls=None, callback=None):
+        """Poll every `interval` seconds, calling `callback(state)` whenever rows were added."""
+        polls = 0
+        while max_polls is None or polls < max_polls:
+            if self.poll() and callback is not None:
+                callback(self.state)
+            polls += 1
+            if max_polls is None or polls < max_polls:
+                time.sleep(interval)
+        return self.state
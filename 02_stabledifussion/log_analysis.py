@@ -1,18 +1,55 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: MIT-0
 
-import math
+import glob
+import os
+import re
 from datetime import datetime
 
-import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
-from matplotlib.collections import PatchCollection
-from matplotlib.patches import Rectangle
-from shapely.geometry import LineString, Point, Polygon
-from shapely.geometry.polygon import LineString
-
 
+from profiling import profiled
+
+# pandas, matplotlib and shapely (through track) are imported by the functions using them,
+# so parsing logs and the modules importing this one do not pay for loading them
+
+EPISODE_PER_ITER = 20
+
+# sim-trace CSV columns renamed to the names used by convert_to_pandas
+SIMTRACE_COLUMNS = {"X": "x", "Y": "y", "all_wheels_on_track": "on_track", "tstamp": "timestamp"}
+
+# compact column types, a full training run takes a fraction of the float64/object layout
+COMPACT_DTYPES = {
+    "iteration": np.int16,
+    "episode": np.int32,
+    "steps": np.int16,
+    "x": np.float32,
+    "y": np.float32,
+    "yaw": np.float32,
+    "steer": np.float32,
+    "throttle": np.float32,
+    "action": np.int16,
+    "reward": np.float32,
+    "done": bool,
+    "on_track": bool,
+    "progress": np.float32,
+    "closest_waypoint": np.int16,
+    "track_len": np.float32,
+    "timestamp": np.float64,
+    "episode_status": "category",
+    "pause_duration": np.float32,
+}
+# steps are written as floats ("1.0") and converted after reading
+SIMTRACE_CSV_DTYPES = {
+    csv_column: COMPACT_DTYPES[SIMTRACE_COLUMNS.get(csv_column, csv_column)]
+    for csv_column in ["episode", "X", "Y", "yaw", "steer", "throttle", "action", "reward", "done",
+                       "all_wheels_on_track", "progress", "closest_waypoint", "track_len", "tstamp",
+                       "episode_status", "pause_duration"]
+}
+SIMTRACE_CSV_DTYPES["steps"] = np.float32
+
+
+@profiled
 def load_data(fname):
     data = []
     with open(fname, "r") as f:
@@ -23,8 +60,13 @@ def load_data(fname):
     return data
 
 
-def convert_to_pandas(data, wpts=None):
+@profiled
+def convert_to_pandas(data, wpts=None, compact=True):
     """
+    Parse SIM_TRACE_LOG lines into a DataFrame. With `compact` the columns get the
+    COMPACT_DTYPES types (on_track as bool, timestamp as float), otherwise they are
+    float64/int64 with on_track and timestamp left as strings.
+
     stdout_ = 'SIM_TRACE_LOG:%d,%d,%.4f,%.4f,%.4f,%.2f,%.2f,%d,%.4f,%s,%s,%.4f,%d,%.2f,%s\n' % (
             self.episodes, self.steps, model_location[0], model_location[1], model_heading,
             self.steering_angle,
@@ -39,7 +81,6 @@ def convert_to_pandas(data, wpts=None):
             time.time())
         print(stdout_)
     """
-    EPISODE_PER_ITER = 20
     df_list = list()
 
     # ignore the first two dummy values that coach throws at the start.
@@ -106,10 +147,112 @@ def convert_to_pandas(data, wpts=None):
         "timestamp",
     ]
 
-    df = pd.DataFrame(df_list, columns=header)
-    return df
+    import pandas as pd
+
+    if not compact:
+        return pd.DataFrame(df_list, columns=header)
+
+    columns = dict(zip(header, zip(*df_list))) if df_list else {name: () for name in header}
+    columns["on_track"] = ["True" in value for value in columns["on_track"]]
+    columns["timestamp"] = [float(value) for value in columns["timestamp"]]
+    return pd.DataFrame({name: np.array(values, dtype=COMPACT_DTYPES[name]) for name, values in columns.items()})
+
+
+def simtrace_files(simtrace_path):
+    """The `N-iteration.csv` files of a sim-trace folder, ordered by N."""
+    fnames = glob.glob(os.path.join(simtrace_path, "*-iteration.csv"))
+    return sorted(fnames, key=lambda fname: int(re.match(r"(\d+)", os.path.basename(fname)).group(1)))
+
+
+@profiled
+def load_simtrace(path, compact=True, columns=None):
+    """
+    Load sim-trace CSV files (`N-iteration.csv`) into the same layout as `convert_to_pandas`,
+    with the episode_status and pause_duration columns kept.
+
+    Args:
+        path (string): A sim-trace CSV file or a folder of them.
+        compact (bool): Parse straight into the COMPACT_DTYPES column types instead of
+            float64/int64/object columns.
+        columns (list): Only parse these columns (names after renaming), all by default.
+
+    Returns:
+        DataFrame: One row per step, x and y in centimeters.
+    """
+    import pandas as pd
+    from pandas.api.types import union_categoricals
+
+    fnames = simtrace_files(path) if os.path.isdir(path) else [path]
+
+    usecols = None
+    if columns is not None:
+        csv_columns = {column: csv_column for csv_column, column in SIMTRACE_COLUMNS.items()}
+        usecols = {csv_columns.get(column, column) for column in columns}
+        if "iteration" in usecols:
+            usecols.remove("iteration")
+            usecols.add("episode")
+
+    frames = [
+        pd.read_csv(fname, dtype=SIMTRACE_CSV_DTYPES if compact else None, usecols=usecols) for fname in fnames
+    ]
+    if compact and len(frames) > 1 and "episode_status" in frames[0]:
+        # concat falls back to object unless every file has the same categories
+        statuses = union_categoricals([frame["episode_status"] for frame in frames]).categories
+        for frame in frames:
+            frame["episode_status"] = frame["episode_status"].cat.set_categories(statuses)
+
+    df = pd.concat(frames, ignore_index=True)
+    df = df.rename(columns=SIMTRACE_COLUMNS)
+    if "episode" in df:
+        iteration = df["episode"] // EPISODE_PER_ITER + 1
+        df.insert(0, "iteration", iteration.astype(np.int16) if compact else iteration)
+    if "steps" in df:
+        df["steps"] = df["steps"].astype(np.int16 if compact else int)
+    for column in ("x", "y"):
+        if column in df:
+            df[column] = 100 * df[column]
+    if not compact and "done" in df:
+        df["done"] = df["done"].astype(int)
+    return df if columns is None else df[list(columns)]
+
+
+def compare_memory(compact, legacy):
+    """
+    Compare a compact DataFrame with the same data in the float64/object layout.
+
+    Returns:
+        dict: Memory of both (deep, in bytes) and the largest absolute difference per
+            numeric column, to check that the compact types keep the values.
+
+    Example:
+        >>> compare_memory(load_simtrace(simtrace_path), load_simtrace(simtrace_path, compact=False))
+    """
+    import pandas as pd
+
+    def is_numeric(series):
+        return pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series)
+
+    differences = {}
+    for column in compact.columns:
+        if is_numeric(compact[column]):
+            if not is_numeric(legacy[column]):
+                reference = legacy[column].map(lambda value: value == "True" if value in ("True", "False") else float(value))
+            else:
+                reference = legacy[column]
+            differences[column] = float(
+                np.nanmax(np.abs(compact[column].to_numpy(dtype=float) - reference.to_numpy(dtype=float)))
+            )
+        else:
+            differences[column] = 0.0 if compact[column].astype(str).equals(legacy[column].astype(str)) else float("inf")
+
+    return {
+        "compact_bytes": int(compact.memory_usage(deep=True).sum()),
+        "legacy_bytes": int(legacy.memory_usage(deep=True).sum()),
+        "max_abs_difference": differences,
+    }
 
 
+@profiled
 def episode_parser(df, action_map=True, episode_map=True):
     """
     Arrange data per episode
@@ -159,6 +302,9 @@ def episode_parser(df, action_map=True, episode_map=True):
 def make_error_boxes(
     ax, xdata, ydata, xerror, yerror, facecolor="r", edgecolor="r", alpha=0.3
 ):
+    from matplotlib.collections import PatchCollection
+    from matplotlib.patches import Rectangle
+
     # Create list for all the error patches
     errorboxes = []
 
@@ -205,43 +351,48 @@ def plot_line(ax, ob):
     )
 
 
-def print_border(ax, waypoints, inner_border_waypoints, outer_border_waypoints):
-    line = LineString(waypoints)
-    plot_coords(ax, line)
-    plot_line(ax, line)
+@profiled
+def print_border(ax, waypoints, inner_border_waypoints=None, outer_border_waypoints=None):
+    from shapely.geometry import LineString
+    from track import Track
 
-    line = LineString(inner_border_waypoints)
-    plot_coords(ax, line)
-    plot_line(ax, line)
+    if isinstance(waypoints, Track):
+        lines = waypoints.line_strings()
+    else:
+        lines = [LineString(waypoints), LineString(inner_border_waypoints), LineString(outer_border_waypoints)]
 
-    line = LineString(outer_border_waypoints)
-    plot_coords(ax, line)
-    plot_line(ax, line)
+    for line in lines:
+        plot_coords(ax, line)
+        plot_line(ax, line)
 
 
 def get_closest_waypoint(x, y, waypoints):
-    res = 0
-    index = 0
-    min_distance = float("inf")
-    for row in waypoints:
-        distance = math.sqrt((row[0] - x) * (row[0] - x) + (row[1] - y) * (row[1] - y))
-        if distance < min_distance:
-            min_distance = distance
-            res = index
-        index = index + 1
-    return res
+    """
+    Index of the waypoint closest to (x, y). x and y may be arrays, then one index per point is returned.
+    """
+    # a track.Track, checked without importing track and shapely
+    if hasattr(waypoints, "center"):
+        waypoints = waypoints.center
+    waypoints = np.asarray(waypoints, dtype=float)
+    distances = (waypoints[:, 0] - np.asarray(x)[..., np.newaxis]) ** 2 + (
+        waypoints[:, 1] - np.asarray(y)[..., np.newaxis]
+    ) ** 2
+    return distances.argmin(axis=-1)
 
 
+@profiled
 def plot_grid_world(episode_df, inner, outer, scale=1.0, plot=True):
     """
     plot a scaled version of lap, along with throttle taken a each position
     """
+    from shapely.geometry import Point, Polygon
+
     stats = []
-    outer = [(val[0] / scale, val[1] / scale) for val in outer]
-    inner = [(val[0] / scale, val[1] / scale) for val in inner]
+    outer = np.asarray(outer, dtype=float)[:, :2] / scale
+    inner = np.asarray(inner, dtype=float)[:, :2] / scale
 
-    max_x = int(np.max([val[0] for val in outer]))
-    max_y = int(np.max([val[1] for val in outer]))
+    max_x = int(outer[:, 0].max())
+    max_y = int(outer[:, 1].max())
 
     print(max_x, max_y)
     grid = np.zeros((max_x + 1, max_y + 1))
@@ -253,12 +404,7 @@ def plot_grid_world(episode_df, inner, outer, scale=1.0, plot=True):
     print("Outer polygon length = %.2f (meters)" % (outer_polygon.length / scale))
     print("Inner polygon length = %.2f (meters)" % (inner_polygon.length / scale))
 
-    dist = 0.0
-    for ii in range(1, len(episode_df)):
-        dist += math.sqrt(
-            (episode_df["x"].iloc[ii] - episode_df["x"].iloc[ii - 1]) ** 2
-            + (episode_df["y"].iloc[ii] - episode_df["y"].iloc[ii - 1]) ** 2
-        )
+    dist = np.hypot(np.diff(episode_df["x"].to_numpy(dtype=float)), np.diff(episode_df["y"].to_numpy(dtype=float))).sum()
     dist /= 100.0
 
     t0 = datetime.fromtimestamp(float(episode_df["timestamp"].iloc[0]))
@@ -306,6 +452,8 @@ def plot_grid_world(episode_df, inner, outer, scale=1.0, plot=True):
                     # average_throttle = np.nanmean(df_slice['throttle'])
                     grid[x][y] = np.nanmean(df_slice["throttle"])
 
+        import matplotlib.pyplot as plt
+
         fig = plt.figure(figsize=(7, 7))
         imgplot = plt.imshow(grid)
         plt.colorbar(orientation="vertical")
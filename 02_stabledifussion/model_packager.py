@@ -0,0 +1,438 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Stream the Triton model repository to S3 as one model.tar.gz per model.
+
+Each tarball is produced as a stream: tar output is cut into chunks that are gzip
+compressed on a thread pool (every chunk becomes its own gzip member, which `tar -xzf`
+reads as one stream) and the compressed bytes are uploaded as concurrent multipart
+upload parts. No temporary tarball is written to disk.
+
+Python files at the root of the model repository (like `diffusion_lifecycle.py`) are
+shared code: they are added to every model version folder whose model.py imports them.
+"""
+import hashlib
+import json
+import os
+import re
+import tarfile
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from utils import file_sha256
+
+CHUNK_SIZE = 16 * 1024 * 1024
+PART_SIZE = 64 * 1024 * 1024  # S3 needs at least 5 MiB for every part but the last
+CONTENT_HASH_METADATA_KEY = "content-sha256"
+
+# weights in these formats barely compress, models made mostly of them are stored without compression
+COMPRESSED_WEIGHT_SUFFIXES = {".bin", ".safetensors", ".pt", ".pth", ".ckpt", ".onnx", ".gz"}
+
+# bytecode and notebook autosaves left by importing or editing the models, never packaged
+EXCLUDED_NAMES = {"__pycache__", ".ipynb_checkpoints"}
+EXCLUDED_SUFFIXES = {".pyc"}
+
+
+def is_excluded(path):
+    """Whether a path (relative or inside a tarball) is build or editor output rather than model content."""
+    path = Path(path)
+    return path.suffix in EXCLUDED_SUFFIXES or any(part in EXCLUDED_NAMES for part in path.parts)
+
+
+def model_files(model_path):
+    """The files of a model folder that are packaged, by their path inside the folder."""
+    model_path = Path(model_path)
+    return {
+        path.relative_to(model_path).as_posix(): path
+        for path in model_path.rglob("*")
+        if path.is_file() and not is_excluded(path.relative_to(model_path))
+    }
+
+
+def is_model_folder(path):
+    """Triton only loads folders with a config.pbtxt, other folders (like __pycache__) are not models."""
+    return path.is_dir() and (path / "config.pbtxt").is_file()
+
+
+def model_content_hash(model_path, state_path=None, extra_files=None):
+    """
+    Hash the content of every file below `model_path`.
+
+    Args:
+        model_path (string): The model folder, e.g. models/sd_depth.
+        state_path (string): Optional JSON file remembering file digests per (size, mtime) between runs.
+        extra_files (dict): Files added to the tarball, by their path inside the model folder.
+
+    Returns:
+        string: The sha256 hex digest of the model folder.
+    """
+    model_path = Path(model_path)
+    state = {}
+    if state_path is not None and Path(state_path).exists():
+        state = json.loads(Path(state_path).read_text())
+
+    files = model_files(model_path)
+    files.update(extra_files or {})
+    digest = hashlib.sha256()
+    for name, path in sorted(files.items()):
+        stat = path.stat()
+        entry = state.get(str(path))
+        if entry is None or (entry["size"], entry["mtime_ns"]) != (stat.st_size, stat.st_mtime_ns):
+            entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": file_sha256(path)}
+            state[str(path)] = entry
+        digest.update(f"{name}\0{entry['sha256']}\n".encode("utf8"))
+
+    if state_path is not None:
+        Path(state_path).write_text(json.dumps(state))
+    return digest.hexdigest()
+
+
+def shared_module_files(model_path, shared_files):
+    """
+    The shared files a model needs, by their path inside the model folder.
+
+    A shared file goes into every version folder whose model.py imports it.
+    """
+    extra_files = {}
+    for model_file in sorted(Path(model_path).glob("*/model.py")):
+        source = model_file.read_text()
+        for shared_file in shared_files:
+            module = Path(shared_file).stem
+            if re.search(rf"^\s*(from\s+{module}\s+import|import\s+{module}\b)", source, re.M):
+                extra_files[f"{model_file.parent.name}/{Path(shared_file).name}"] = Path(shared_file)
+    return extra_files
+
+
+def choose_compresslevel(model_path, compresslevel=1):
+    """Return 0 (store only) when most of the model's bytes are already-compressed weights."""
+    sizes = [(p.suffix, p.stat().st_size) for p in model_files(model_path).values()]
+    total = sum(size for _, size in sizes)
+    weights = sum(size for suffix, size in sizes if suffix in COMPRESSED_WEIGHT_SUFFIXES)
+    if total and weights / total > 0.5:
+        return 0
+    return compresslevel
+
+
+def gzip_member(data, compresslevel):
+    # zlib releases the GIL while compressing, so members compress in parallel on threads
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+class ParallelGzipWriter:
+    """File-like object that gzip compresses written bytes on a thread pool and passes them on in order."""
+
+    def __init__(self, sink, compresslevel=1, max_workers=None, chunk_size=CHUNK_SIZE):
+        self.sink = sink
+        self.compresslevel = compresslevel
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers or os.cpu_count()
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        self.buffer = bytearray()
+        self.pending = []
+        self.bytes_in = 0
+
+    def write(self, data):
+        self.buffer += data
+        self.bytes_in += len(data)
+        while len(self.buffer) >= self.chunk_size:
+            self._submit(bytes(self.buffer[: self.chunk_size]))
+            del self.buffer[: self.chunk_size]
+        return len(data)
+
+    def _submit(self, chunk):
+        self.pending.append(self.executor.submit(gzip_member, chunk, self.compresslevel))
+        # bound memory: keep at most two compressed chunks per worker in flight
+        while len(self.pending) > 2 * self.max_workers:
+            self.sink.write(self.pending.pop(0).result())
+
+    def close(self):
+        try:
+            if self.buffer or not self.bytes_in:
+                self._submit(bytes(self.buffer))
+                self.buffer.clear()
+            for future in self.pending:
+                self.sink.write(future.result())
+            self.pending = []
+        finally:
+            self.shutdown()
+        self.sink.close()
+
+    def shutdown(self):
+        """Drop the chunks not yet compressed and stop the threads, also after a failure."""
+        for future in self.pending:
+            future.cancel()
+        self.pending = []
+        self.executor.shutdown(wait=True)
+
+
+class MultipartUploadWriter:
+    """File-like object that uploads written bytes to S3 as concurrent multipart upload parts."""
+
+    def __init__(self, s3_client, bucket, key, metadata=None, part_size=PART_SIZE, max_concurrency=4):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        # max_concurrency parts uploading and as many waiting for a thread, so the parts
+        # held in memory stay below 2 * max_concurrency * part_size (plus the part being filled)
+        self.slots = threading.Semaphore(2 * max_concurrency)
+        self.buffer = bytearray()
+        self.futures = []
+        self.bytes_out = 0
+        self.aborted = False
+        response = s3_client.create_multipart_upload(Bucket=bucket, Key=key, Metadata=metadata or {})
+        self.upload_id = response["UploadId"]
+
+    def write(self, data):
+        self.buffer += data
+        self.bytes_out += len(data)
+        while len(self.buffer) >= self.part_size:
+            self._submit(bytes(self.buffer[: self.part_size]))
+            del self.buffer[: self.part_size]
+        return len(data)
+
+    def _submit(self, body):
+        self.slots.acquire()
+        part_number = len(self.futures) + 1
+        self.futures.append(self.executor.submit(self._upload_part, part_number, body))
+
+    def _upload_part(self, part_number, body):
+        try:
+            response = self.s3_client.upload_part(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self.upload_id,
+                PartNumber=part_number,
+                Body=body,
+            )
+            return {"PartNumber": part_number, "ETag": response["ETag"]}
+        finally:
+            self.slots.release()
+
+    def close(self):
+        if self.buffer or not self.futures:
+            self._submit(bytes(self.buffer))
+            self.buffer.clear()
+        try:
+            parts = [future.result() for future in self.futures]
+            self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self.upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+        except Exception:
+            self.abort()
+            raise
+        finally:
+            self.executor.shutdown()
+
+    def abort(self):
+        """
+        Abort the upload once, after the parts still being sent are done.
+
+        Parts finishing after the abort would otherwise be left behind in the bucket.
+        """
+        if self.aborted:
+            return
+        self.aborted = True
+        for future in self.futures:
+            future.cancel()
+        self.executor.shutdown(wait=True)
+        self.s3_client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+
+
+def remote_content_hash(s3_client, bucket, key):
+    try:
+        response = s3_client.head_object(Bucket=bucket, Key=key)
+    except Exception:
+        return None
+    return response.get("Metadata", {}).get(CONTENT_HASH_METADATA_KEY)
+
+
+def package_and_upload(
+    model_path,
+    s3_client,
+    bucket,
+    key,
+    compresslevel=None,
+    max_workers=None,
+    max_concurrency=4,
+    state_path=None,
+    force=False,
+    shared_files=(),
+):
+    """
+    Stream `model_path` as a tar.gz straight into s3://bucket/key, unless it is unchanged.
+
+    The model's content hash is stored as object metadata; when the object in S3 carries
+    the same hash the upload is skipped.
+
+    Args:
+        model_path (string): The model folder, e.g. models/sd_depth.
+        s3_client: A boto3 S3 client or a stand-in with the same multipart methods.
+        bucket (string): The S3 bucket name.
+        key (string): The S3 key of the tarball.
+        compresslevel (int): gzip level, 0 stores only. None picks 0 for weight-heavy models and 1 otherwise.
+        max_workers (int): Compression threads, defaults to the number of CPUs.
+        max_concurrency (int): Parts uploaded at the same time.
+        state_path (string): Optional JSON file caching file digests between runs.
+        force (bool): Upload even if the content hash is unchanged.
+        shared_files (list): Shared Python files, see `shared_module_files`.
+
+    Returns:
+        dict: The S3 URI, whether it was uploaded, bytes read and written, and the elapsed seconds.
+    """
+    model_path = Path(model_path)
+    start_time = time.perf_counter()
+    extra_files = shared_module_files(model_path, shared_files)
+    content_hash = model_content_hash(model_path, state_path, extra_files)
+    result = {"s3_uri": f"s3://{bucket}/{key}", "content_hash": content_hash, "uploaded": False}
+
+    if not force and remote_content_hash(s3_client, bucket, key) == content_hash:
+        result["elapsed_seconds"] = time.perf_counter() - start_time
+        return result
+
+    if compresslevel is None:
+        compresslevel = choose_compresslevel(model_path)
+
+    upload = MultipartUploadWriter(
+        s3_client, bucket, key, metadata={CONTENT_HASH_METADATA_KEY: content_hash}, max_concurrency=max_concurrency
+    )
+    stream = ParallelGzipWriter(upload, compresslevel=compresslevel, max_workers=max_workers)
+    try:
+        # same layout as `tar -C models -czf <name>.tar.gz <name>`
+        with tarfile.open(fileobj=stream, mode="w|") as tar:
+            tar.add(
+                model_path,
+                arcname=model_path.name,
+                filter=lambda info: None if is_excluded(info.name) else info,
+            )
+            for name, path in sorted(extra_files.items()):
+                tar.add(path, arcname=f"{model_path.name}/{name}")
+        stream.close()
+    except Exception:
+        stream.shutdown()
+        # a no-op when closing the upload already aborted it
+        upload.abort()
+        raise
+
+    result.update(
+        uploaded=True,
+        bytes_in=stream.bytes_in,
+        bytes_out=upload.bytes_out,
+        elapsed_seconds=time.perf_counter() - start_time,
+    )
+    return result
+
+
+def package_and_upload_models(model_root_path, s3_client, bucket, prefix, max_concurrent_models=2, **kwargs):
+    """
+    Upload every model folder (a folder with a config.pbtxt) below `model_root_path` as
+    `<prefix>/<model>.tar.gz`.
+
+    Returns:
+        dict: Maps the model name to the `package_and_upload` result.
+    """
+    model_root_path = Path(model_root_path)
+    state_path = kwargs.pop("state_path", model_root_path / ".package_state.json")
+    model_paths = sorted(p for p in model_root_path.iterdir() if is_model_folder(p))
+    shared_files = kwargs.pop("shared_files", sorted(model_root_path.glob("*.py")))
+
+    # one digest cache per model, concurrent uploads would otherwise overwrite each other's state
+    with ThreadPoolExecutor(max_workers=max_concurrent_models) as executor:
+        futures = {
+            model_path.name: executor.submit(
+                package_and_upload,
+                model_path,
+                s3_client,
+                bucket,
+                f"{prefix}/{model_path.name}.tar.gz",
+                state_path=Path(state_path).with_suffix(f".{model_path.name}.json"),
+                shared_files=shared_files,
+                **kwargs,
+            )
+            for model_path in model_paths
+        }
+        return {name: future.result() for name, future in futures.items()}
+
+
+class LocalS3:
+    """Minimal S3 stand-in writing objects below a local folder, for testing and benchmarks."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.uploads = {}
+        self.lock = threading.Lock()
+
+    def _path(self, bucket, key):
+        return self.root / bucket / key
+
+    def create_multipart_upload(self, Bucket, Key, Metadata=None):
+        with self.lock:
+            upload_id = str(len(self.uploads) + 1)
+            self.uploads[upload_id] = {"parts": {}, "metadata": Metadata or {}}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        part_path = self._path(Bucket, f"{Key}.{UploadId}.part{PartNumber}")
+        part_path.parent.mkdir(parents=True, exist_ok=True)
+        part_path.write_bytes(Body)
+        etag = hashlib.md5(Body).hexdigest()
+        with self.lock:
+            self.uploads[UploadId]["parts"][PartNumber] = (part_path, etag)
+        return {"ETag": etag}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        upload = self.uploads.pop(UploadId)
+        path = self._path(Bucket, Key)
+        with open(path, "wb") as f:
+            for part in MultipartUpload["Parts"]:
+                part_path, etag = upload["parts"][part["PartNumber"]]
+                f.write(part_path.read_bytes())
+                part_path.unlink()
+        path.with_name(path.name + ".metadata.json").write_text(json.dumps(upload["metadata"]))
+        return {}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        with self.lock:
+            if UploadId not in self.uploads:
+                # S3 answers NoSuchUpload for an upload that was completed or aborted
+                raise FileNotFoundError(f"NoSuchUpload: {UploadId}")
+            upload = self.uploads.pop(UploadId)
+        for part_path, _ in upload["parts"].values():
+            part_path.unlink(missing_ok=True)
+        return {}
+
+    def head_object(self, Bucket, Key):
+        path = self._path(Bucket, Key)
+        if not path.exists():
+            raise FileNotFoundError(f"s3://{Bucket}/{Key}")
+        metadata = json.loads(path.with_name(path.name + ".metadata.json").read_text())
+        return {"ContentLength": path.stat().st_size, "Metadata": metadata}
+
+
+def benchmark(model_root_path, target_path=None, **kwargs):
+    """
+    Package the model repository into a local S3 stand-in and report the throughput per model.
+
+    Returns:
+        dict: Maps the model name to its result, including `mb_per_second` of input read.
+    """
+    with tempfile.TemporaryDirectory() as tmp_path:
+        s3_client = LocalS3(target_path or tmp_path)
+        (s3_client.root / "bucket").mkdir(parents=True, exist_ok=True)
+        results = package_and_upload_models(
+            model_root_path, s3_client, "bucket", "models", state_path=Path(tmp_path) / "state.json", **kwargs
+        )
+    for result in results.values():
+        if result["uploaded"]:
+            result["mb_per_second"] = result["bytes_in"] / 2**20 / result["elapsed_seconds"]
+    return results
@@ -0,0 +1,192 @@
+"""
+Pipeline lifecycle shared by the diffusion models: lazy loading, idle unloading and
+device placement.
+
+This file lives next to the model folders and is added to the version folder of every
+model when the repository is packaged (see `model_packager.package_and_upload_models`),
+so each model.py imports it as a sibling module.
+"""
+import gc
+import json
+import sys
+import threading
+import time
+
+
+def get_parameter(model_config, key, default):
+    parameters = model_config.get("parameters", {})
+    if key in parameters:
+        return parameters[key]["string_value"]
+    return default
+
+
+def resolve_device(device):
+    if device == "auto":
+        import torch
+
+        return "cuda" if torch.cuda.is_available() else "cpu"
+    return device
+
+
+def component_bytes(component):
+    if hasattr(component, "parameters"):
+        return sum(p.numel() * p.element_size() for p in component.parameters())
+    return 0
+
+
+def pipeline_memory_bytes(*pipes):
+    """Bytes of the weights of the pipelines, components shared between them are counted once."""
+    components = {id(c): c for pipe in pipes for c in pipe.components.values()}
+    return sum(component_bytes(c) for c in components.values())
+
+
+def cuda_memory_allocated():
+    """Allocated CUDA memory in bytes, None without CUDA."""
+    # nothing can be allocated on the GPU before torch has been imported
+    torch = sys.modules.get("torch")
+    if torch is None or not torch.cuda.is_available():
+        return None
+    return torch.cuda.memory_allocated()
+
+
+def reset_peak_memory():
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.reset_peak_memory_stats()
+
+
+def peak_memory_mb():
+    """Peak allocated CUDA memory since `reset_peak_memory` in MiB, None without CUDA."""
+    torch = sys.modules.get("torch")
+    if torch is None or not torch.cuda.is_available():
+        return None
+    return round(torch.cuda.max_memory_allocated() / 2**20, 1)
+
+
+def free_device_memory():
+    gc.collect()
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+class PipelineModel:
+    """
+    Base of the diffusion TritonPythonModels.
+
+    Model parameters (config.pbtxt):
+        DEVICE: cuda (default), cuda:N, cpu, auto or offload (model CPU offload onto cuda).
+        LAZY_LOAD: "true" defers loading the weights until the first request, which then
+            takes the load time too and can exceed the endpoint invocation timeout.
+        IDLE_TIMEOUT_S: frees the pipeline after this many idle seconds, 0 keeps it loaded.
+
+    Subclasses implement `load_pipeline(device)` and `execute_request(pipe, request)`.
+    `load_pipeline` is the only place that touches the checkpoint, so the load/unload
+    logic can be run against a small dummy pipeline.
+    """
+
+    # named in the log messages
+    pipeline_name = "pipeline"
+
+    def initialize(self, args):
+
+        self.model_dir = args['model_repository']
+        self.model_ver = args['model_version']
+        model_config = json.loads(args['model_config'])
+
+        self.device = resolve_device(get_parameter(model_config, "DEVICE", "cuda"))
+        self.lazy_load = get_parameter(model_config, "LAZY_LOAD", "false").lower() == "true"
+        self.idle_timeout = float(get_parameter(model_config, "IDLE_TIMEOUT_S", "0"))
+
+        self.pipe = None
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+        if not self.lazy_load:
+            with self.lock:
+                self.get_pipeline()
+
+        if self.idle_timeout > 0:
+            self.idle_thread = threading.Thread(target=self.unload_when_idle, daemon=True)
+            self.idle_thread.start()
+
+
+    def log(self, message):
+
+        import triton_python_backend_utils as pb_utils
+
+        pb_utils.Logger.log_info(message)
+
+
+    def load_pipeline(self, device):
+        """Return the pipeline (or a tuple of pipelines) loaded on the device."""
+
+        raise NotImplementedError
+
+
+    def execute_request(self, pipe, request):
+        """Return the InferenceResponse of one request."""
+
+        raise NotImplementedError
+
+
+    def get_pipeline(self):
+        """Return the loaded pipeline, loading it first if needed. Call with `self.lock` held."""
+
+        if self.pipe is None:
+            start_time = time.perf_counter()
+            self.pipe = self.load_pipeline(self.device)
+            load_time = time.perf_counter() - start_time
+
+            pipes = self.pipe if isinstance(self.pipe, tuple) else (self.pipe,)
+            message = (
+                f"Loaded {self.pipeline_name} on {self.device} in {load_time:.1f}s, "
+                f"weights: {pipeline_memory_bytes(*pipes) / 2**20:.0f} MiB"
+            )
+            allocated = cuda_memory_allocated()
+            if allocated is not None:
+                message += f", GPU memory allocated: {allocated / 2**20:.0f} MiB"
+            self.log(message)
+
+        self.last_used = time.monotonic()
+        return self.pipe
+
+
+    def unload_pipeline(self, reason=None):
+        """Free the pipeline and its device memory. Call with `self.lock` held."""
+
+        if self.pipe is None:
+            return
+        self.pipe = None
+        free_device_memory()
+        self.log(f"Unloaded {self.pipeline_name} {reason or f'after {self.idle_timeout:.0f}s idle'}")
+
+
+    def unload_when_idle(self):
+
+        while not self.stop_event.wait(min(self.idle_timeout, 10)):
+            with self.lock:
+                if self.pipe is not None and time.monotonic() - self.last_used > self.idle_timeout:
+                    self.unload_pipeline()
+
+
+    def execute(self, requests):
+
+        responses = []
+        with self.lock:
+            pipe = self.get_pipeline()
+            for request in requests:
+                responses.append(self.execute_request(pipe, request))
+            self.last_used = time.monotonic()
+
+        return responses
+
+
+    def finalize(self):
+
+        self.stop_event.set()
+        # Triton unloads models under memory pressure on a multi-model endpoint, the
+        # memory has to be returned to the device rather than wait for garbage collection
+        with self.lock:
+            self.unload_pipeline("on finalize")
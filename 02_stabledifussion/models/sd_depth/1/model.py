@@ -1,10 +1,12 @@
 import json
+import time
 import numpy as np
 import torch
 import triton_python_backend_utils as pb_utils
 
 from diffusers import StableDiffusionDepth2ImgPipeline
 from diffusers import DDIMScheduler
+from diffusion_lifecycle import PipelineModel, peak_memory_mb, reset_peak_memory
 
 from io import BytesIO
 import base64
@@ -26,46 +28,59 @@ def encode_images(images):
     return encoded_images
 
 
-class TritonPythonModel:
+class TritonPythonModel(PipelineModel):
+    """
+    Lazy loading, idle unloading and the DEVICE, LAZY_LOAD and IDLE_TIMEOUT_S parameters
+    come from diffusion_lifecycle.PipelineModel.
+    """
 
-    def initialize(self, args):
+    def load_pipeline(self, device):
+
+        on_gpu = device.startswith("cuda") or device == "offload"
+        pipe = StableDiffusionDepth2ImgPipeline.from_pretrained(f'{self.model_dir}/{self.model_ver}/checkpoint',
+                                                            torch_dtype=torch.float16 if on_gpu else torch.float32)
+        if device == "offload":
+            pipe.enable_model_cpu_offload()
+        else:
+            pipe = pipe.to(device)
+
+        pipe.scheduler = DDIMScheduler.from_config(pipe.scheduler.config)
+        if on_gpu:
+            pipe.unet.enable_xformers_memory_efficient_attention()
+        return pipe
+
+
+    def execute_request(self, pipe, request):
+
+        prompt = pb_utils.get_input_tensor_by_name(request, "prompt").as_numpy().item().decode("utf-8")
+        negative_prompt = pb_utils.get_input_tensor_by_name(request, "negative_prompt")
+        image = pb_utils.get_input_tensor_by_name(request, "image").as_numpy().item().decode("utf-8")
+        gen_args = pb_utils.get_input_tensor_by_name(request, "gen_args")
         
-        self.model_dir = args['model_repository']
-        self.model_ver = args['model_version']
-    
-    
-        device='cuda'
-        self.pipe = StableDiffusionDepth2ImgPipeline.from_pretrained(f'{self.model_dir}/{self.model_ver}/checkpoint',
-                                                            torch_dtype=torch.float16).to(device)
+        image=decode_image(image)
         
-        self.pipe.scheduler = DDIMScheduler.from_config(self.pipe.scheduler.config)
-        self.pipe.unet.enable_xformers_memory_efficient_attention()
-            
-
-    def execute(self, requests):
+        input_args = dict(prompt=prompt, image=image)
+        
+        if negative_prompt:
+            input_args["negative_prompt"] = negative_prompt.as_numpy().item().decode("utf-8")
         
-        logger = pb_utils.Logger
-        responses = []
-        for request in requests:
-            prompt = pb_utils.get_input_tensor_by_name(request, "prompt").as_numpy().item().decode("utf-8")
-            negative_prompt = pb_utils.get_input_tensor_by_name(request, "negative_prompt")
-            image = pb_utils.get_input_tensor_by_name(request, "image").as_numpy().item().decode("utf-8")
-            gen_args = pb_utils.get_input_tensor_by_name(request, "gen_args")
-            
-            image=decode_image(image)
-            
-            input_args = dict(prompt=prompt, image=image)
-            
-            if negative_prompt:
-                input_args["negative_prompt"] = negative_prompt.as_numpy().item().decode("utf-8")
-            
-            if gen_args:
-                gen_args = json.loads(gen_args.as_numpy().item().decode("utf-8"))
-                input_args.update(gen_args)            
-            
-            images = self.pipe(**input_args).images
-            encoded_images = encode_images(images)
-            
-            responses.append(pb_utils.InferenceResponse([pb_utils.Tensor("generated_image", np.array(encoded_images).astype(object))]))
+        if gen_args:
+            gen_args = json.loads(gen_args.as_numpy().item().decode("utf-8"))
+            input_args.update(gen_args)            
         
-        return responses
+        reset_peak_memory()
+        start_time = time.perf_counter()
+        images = pipe(**input_args).images
+        encoded_images = encode_images(images)
+
+        # compared with sd_depth_upscale by endpoint_client.compare_depth_upscale
+        stats = dict(
+            total_ms=round((time.perf_counter() - start_time) * 1000, 1),
+            peak_memory_mb=peak_memory_mb(),
+        )
+
+        return pb_utils.InferenceResponse([
+            pb_utils.Tensor("generated_image", np.array(encoded_images).astype(object)),
+            pb_utils.Tensor("stats", np.array([json.dumps(stats)]).astype(object)),
+        ])
+
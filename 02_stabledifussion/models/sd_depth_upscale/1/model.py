@@ -0,0 +1,177 @@
+import json
+import time
+import numpy as np
+import torch
+import triton_python_backend_utils as pb_utils
+
+from diffusers import StableDiffusionDepth2ImgPipeline
+from diffusers import StableDiffusionUpscalePipeline
+from diffusers import DDIMScheduler
+from diffusion_lifecycle import PipelineModel, component_bytes, peak_memory_mb, reset_peak_memory
+
+from io import BytesIO
+from pathlib import Path
+import base64
+from PIL import Image
+
+# components the upscaler may borrow from the depth pipeline when both checkpoints ship identical copies
+SHAREABLE_COMPONENTS = ["text_encoder", "tokenizer", "vae"]
+
+
+def decode_image(img):
+    buff = BytesIO(base64.b64decode(img.encode("utf8")))
+    image = Image.open(buff)
+    return image
+
+def encode_images(images):
+    encoded_images = []
+    for image in images:
+        buffer = BytesIO()
+        image.save(buffer, format="JPEG")
+        img_str = base64.b64encode(buffer.getvalue())
+        encoded_images.append(img_str.decode("utf8"))
+
+    return encoded_images
+
+
+def is_same_component(checkpoint_a, checkpoint_b, component):
+    """
+    Check whether two diffusers checkpoints ship the same component.
+
+    The component configs must be equal and every file in the component folder
+    must exist in both checkpoints with the same size.
+    """
+    dir_a = Path(checkpoint_a) / component
+    dir_b = Path(checkpoint_b) / component
+    if not dir_a.is_dir() or not dir_b.is_dir():
+        return False
+
+    files_a = {p.relative_to(dir_a): p.stat().st_size for p in dir_a.rglob("*") if p.is_file()}
+    files_b = {p.relative_to(dir_b): p.stat().st_size for p in dir_b.rglob("*") if p.is_file()}
+    if files_a != files_b:
+        return False
+
+    for config_name in files_a:
+        if config_name.suffix == ".json":
+            if json.loads((dir_a / config_name).read_text()) != json.loads((dir_b / config_name).read_text()):
+                return False
+    return True
+
+
+class TritonPythonModel(PipelineModel):
+    """
+    Runs depth2img followed by the x4 upscaler in a single request.
+
+    The depth2img output is handed to the upscaler as a tensor on the GPU, so the
+    intermediate image is never JPEG/base64 encoded. Components that both checkpoints
+    ship identically (usually the text encoder and tokenizer) are loaded once.
+    Expects `checkpoint/depth` and `checkpoint/upscale` under the model version folder.
+
+    Lazy loading, idle unloading and the DEVICE, LAZY_LOAD and IDLE_TIMEOUT_S parameters
+    come from diffusion_lifecycle.PipelineModel.
+    """
+
+    pipeline_name = "depth+upscale pipelines"
+    shared_components = []
+
+    def load_pipeline(self, device):
+        """Return the (depth, upscale) pipelines."""
+
+        checkpoint_dir = Path(f'{self.model_dir}/{self.model_ver}/checkpoint')
+        depth_checkpoint = checkpoint_dir / "depth"
+        upscale_checkpoint = checkpoint_dir / "upscale"
+
+        on_gpu = device.startswith("cuda") or device == "offload"
+        torch_dtype = torch.float16 if on_gpu else torch.float32
+        depth_pipe = StableDiffusionDepth2ImgPipeline.from_pretrained(depth_checkpoint,
+                                                            torch_dtype=torch_dtype)
+
+        shared = {}
+        for component in SHAREABLE_COMPONENTS:
+            if is_same_component(depth_checkpoint, upscale_checkpoint, component):
+                shared[component] = getattr(depth_pipe, component)
+
+        upscale_pipe = StableDiffusionUpscalePipeline.from_pretrained(upscale_checkpoint,
+                                                            torch_dtype=torch_dtype,
+                                                            **shared)
+
+        for pipe in (depth_pipe, upscale_pipe):
+            if device == "offload":
+                pipe.enable_model_cpu_offload()
+            else:
+                pipe.to(device)
+            pipe.scheduler = DDIMScheduler.from_config(pipe.scheduler.config)
+            if on_gpu:
+                pipe.unet.enable_xformers_memory_efficient_attention()
+
+        self.shared_components = sorted(shared)
+        saved_bytes = sum(component_bytes(c) for c in shared.values())
+        self.log(
+            f"Shared components: {self.shared_components or 'none'}, "
+            f"memory saved by sharing: {saved_bytes / 2**20:.0f} MiB"
+        )
+        return depth_pipe, upscale_pipe
+
+
+    def execute_request(self, pipe, request):
+
+        depth_pipe, upscale_pipe = pipe
+
+        prompt = pb_utils.get_input_tensor_by_name(request, "prompt").as_numpy().item().decode("utf-8")
+        negative_prompt = pb_utils.get_input_tensor_by_name(request, "negative_prompt")
+        image = pb_utils.get_input_tensor_by_name(request, "image").as_numpy().item().decode("utf-8")
+        upscale_prompt = pb_utils.get_input_tensor_by_name(request, "upscale_prompt")
+        gen_args = pb_utils.get_input_tensor_by_name(request, "gen_args")
+        upscale_gen_args = pb_utils.get_input_tensor_by_name(request, "upscale_gen_args")
+
+        image=decode_image(image)
+
+        depth_args = dict(prompt=prompt, image=image, output_type="pt")
+        upscale_args = dict(prompt=prompt)
+
+        if negative_prompt:
+            negative_prompt = negative_prompt.as_numpy().item().decode("utf-8")
+            depth_args["negative_prompt"] = negative_prompt
+            upscale_args["negative_prompt"] = negative_prompt
+
+        if upscale_prompt:
+            upscale_args["prompt"] = upscale_prompt.as_numpy().item().decode("utf-8")
+
+        if gen_args:
+            depth_args.update(json.loads(gen_args.as_numpy().item().decode("utf-8")))
+
+        if upscale_gen_args:
+            upscale_args.update(json.loads(upscale_gen_args.as_numpy().item().decode("utf-8")))
+
+        on_gpu = torch.cuda.is_available() and self.device != "cpu"
+        reset_peak_memory()
+        start_time = time.perf_counter()
+
+        # depth2img returns images in [0, 1], the upscaler takes tensors in [-1, 1]
+        low_res_images = depth_pipe(**depth_args).images
+        if on_gpu:
+            torch.cuda.synchronize()
+        depth_time = time.perf_counter()
+
+        upscale_args["image"] = low_res_images * 2.0 - 1.0
+        images = upscale_pipe(**upscale_args).images
+        upscale_time = time.perf_counter()
+
+        encoded_images = encode_images(images)
+        end_time = time.perf_counter()
+
+        stats = dict(
+            depth_ms=round((depth_time - start_time) * 1000, 1),
+            upscale_ms=round((upscale_time - depth_time) * 1000, 1),
+            encode_ms=round((end_time - upscale_time) * 1000, 1),
+            total_ms=round((end_time - start_time) * 1000, 1),
+            peak_memory_mb=peak_memory_mb(),
+            shared_components=self.shared_components,
+        )
+        self.log(f"sd_depth_upscale request stats: {json.dumps(stats)}")
+
+        return pb_utils.InferenceResponse([
+            pb_utils.Tensor("generated_image", np.array(encoded_images).astype(object)),
+            pb_utils.Tensor("stats", np.array([json.dumps(stats)]).astype(object)),
+        ])
+
@@ -1,12 +1,138 @@
 import triton_python_backend_utils as pb_utils
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
 import numpy as np
+import fcntl
+import hashlib
+import json
+import os
 import shutil
+import subprocess
+import time
+
+# ioctl request number for FICLONE (copy-on-write clone on btrfs/xfs)
+FICLONE = 0x40049409
+CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def get_parameter(model_config, key, default):
+    parameters = model_config.get("parameters", {})
+    if key in parameters:
+        return parameters[key]["string_value"]
+    return default
+
+
+@contextmanager
+def file_lock(lock_path):
+    """Exclusive lock shared by every process initializing against the same target folder"""
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_expected_checksum(pack_path):
+    """Checksum stored next to the pack as `<pack>.sha256` (sha256sum output format), if any"""
+    checksum_path = pack_path.with_name(pack_path.name + ".sha256")
+    if checksum_path.exists():
+        return checksum_path.read_text().split()[0]
+    return None
+
+
+def read_stamp(stamp_path):
+    try:
+        return json.loads(stamp_path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def write_stamp(stamp_path, stamp):
+    tmp_path = stamp_path.with_name(stamp_path.name + ".partial")
+    tmp_path.write_text(json.dumps(stamp))
+    os.replace(tmp_path, stamp_path)
+
+
+def reflink(source, target):
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+def link_or_copy(source, target):
+    """
+    Place `source` at `target` using the cheapest method the filesystem supports:
+    a hard link, then a reflink, then a plain copy. Returns the method used.
+    """
+    tmp_path = target.with_name(target.name + ".partial")
+    tmp_path.unlink(missing_ok=True)
+    try:
+        os.link(source, tmp_path)
+        method = "hardlink"
+    except OSError:
+        try:
+            reflink(source, tmp_path)
+            method = "reflink"
+        except OSError:
+            tmp_path.unlink(missing_ok=True)
+            shutil.copyfile(source, tmp_path)
+            method = "copy"
+
+    # rename() is a no-op when both names are hard links to the same file
+    if target.exists() and os.path.samefile(tmp_path, target):
+        tmp_path.unlink()
+    else:
+        os.replace(tmp_path, target)
+    return method
+
+
+def extract_env(pack_path, env_path):
+    """Unpack a conda-pack archive into `env_path`, using pigz for parallel decompression when available"""
+    tmp_path = env_path.with_name(env_path.name + ".partial")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tmp_path.mkdir(parents=True)
+
+    if shutil.which("pigz"):
+        subprocess.run(["tar", "-I", "pigz", "-xf", str(pack_path), "-C", str(tmp_path)], check=True)
+    else:
+        subprocess.run(["tar", "-xzf", str(pack_path), "-C", str(tmp_path)], check=True)
+
+    shutil.rmtree(env_path, ignore_errors=True)
+    os.replace(tmp_path, env_path)
+
+    # conda-unpack rewrites the prefixes for the final location, so it has to run after the move
+    conda_unpack = env_path / "bin" / "conda-unpack"
+    if conda_unpack.exists():
+        subprocess.run([str(env_path / "bin" / "python"), str(conda_unpack)], check=True)
 
 
 class TritonPythonModel:
     """Your Python model must use the same class name. Every Python model
     that is created must have "TritonPythonModel" as the class name.
+
+    Stages the shared conda-pack environment for the diffusion models.
+
+    Model parameters (config.pbtxt):
+        CONDA_TARGET_PATH: folder the environment is staged into, /tmp/conda by default.
+        EXTRACT_ENV: "true" also unpacks the environment once into CONDA_TARGET_PATH/sd_env,
+            so the models can point EXECUTION_ENV_PATH at the folder instead of each
+            unpacking the archive. Off by default: the models only use the folder when their
+            EXECUTION_ENV_PATH is changed to it, which needs a Python backend that accepts
+            an extracted environment folder (not assumed of the 23.03 image). The archive
+            is always staged, so the default EXECUTION_ENV_PATH keeps working.
+
+    The archive is verified against `sd_env.tar.gz.sha256` when it is shipped next to it.
+    Work already done by a previous initialize is detected through stamp files and skipped.
     """
 
     @staticmethod
@@ -16,22 +142,101 @@ class TritonPythonModel:
         return auto_complete_model_config
 
     def initialize(self, args):
-  
+
+        model_config = json.loads(args['model_config'])
+        logger = pb_utils.Logger
+
         self.conda_pack_path = Path(args['model_repository']) / "sd_env.tar.gz"
-        self.conda_target_path = Path("/tmp/conda")
-        
+        self.conda_target_path = Path(get_parameter(model_config, "CONDA_TARGET_PATH", "/tmp/conda"))
+        self.extract_env = get_parameter(model_config, "EXTRACT_ENV", "false").lower() == "true"
+
         self.conda_env_path = self.conda_target_path / "sd_env.tar.gz"
-             
-        if not self.conda_env_path.exists():
-            self.conda_env_path.parent.mkdir(parents=True, exist_ok=True)
-            shutil.copy(self.conda_pack_path, self.conda_env_path)
-      
+        self.conda_env_dir = self.conda_target_path / "sd_env"
+
+        start_time = time.perf_counter()
+        with file_lock(self.conda_target_path / ".setup_conda.lock"):
+            actions = self.stage()
+        logger.log_info(f"Conda environment staged in {time.perf_counter() - start_time:.1f}s: {', '.join(actions)}")
+
+    def stage(self):
+        """Stage (and optionally extract) the environment. Must be called with the lock held."""
+
+        actions = []
+        expected_checksum = read_expected_checksum(self.conda_pack_path)
+        source_stat = self.conda_pack_path.stat()
+
+        pack_stamp_path = self.conda_target_path / "sd_env.tar.gz.stamp"
+        pack_stamp = read_stamp(pack_stamp_path)
+        if self.is_staged_pack_current(pack_stamp, source_stat, expected_checksum):
+            actions.append("archive already staged")
+        else:
+            pack_stamp_path.unlink(missing_ok=True)
+            actions.append(f"archive staged by {link_or_copy(self.conda_pack_path, self.conda_env_path)}")
+            pack_stamp = None
+
+        env_stamp_path = self.conda_target_path / "sd_env.stamp"
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            # hash the staged archive while it is being extracted, the extraction is
+            # thrown away again if the archive turns out to be corrupt
+            checksum_future = None
+            if pack_stamp is None:
+                checksum_future = executor.submit(file_sha256, self.conda_env_path)
+
+            extract_future = None
+            if self.extract_env:
+                env_stamp = read_stamp(env_stamp_path)
+                if pack_stamp is not None and env_stamp == {"sha256": pack_stamp["sha256"]} and self.conda_env_dir.is_dir():
+                    actions.append("environment already extracted")
+                else:
+                    env_stamp_path.unlink(missing_ok=True)
+                    extract_future = executor.submit(extract_env, self.conda_env_path, self.conda_env_dir)
+
+            checksum = pack_stamp["sha256"] if pack_stamp is not None else checksum_future.result()
+            if expected_checksum is not None and checksum != expected_checksum:
+                if extract_future is not None:
+                    extract_future.exception()
+                    shutil.rmtree(self.conda_env_dir, ignore_errors=True)
+                self.conda_env_path.unlink(missing_ok=True)
+                raise pb_utils.TritonModelException(
+                    f"{self.conda_pack_path} does not match its stored checksum, expected {expected_checksum} got {checksum}"
+                )
+
+            if pack_stamp is None:
+                staged_stat = self.conda_env_path.stat()
+                write_stamp(pack_stamp_path, {
+                    "sha256": checksum,
+                    "source_size": source_stat.st_size,
+                    "source_mtime_ns": source_stat.st_mtime_ns,
+                    "size": staged_stat.st_size,
+                    "mtime_ns": staged_stat.st_mtime_ns,
+                })
+                actions.append("archive checksum verified" if expected_checksum else "archive checksum recorded")
+
+            if extract_future is not None:
+                extract_future.result()
+                write_stamp(env_stamp_path, {"sha256": checksum})
+                actions.append(f"environment extracted to {self.conda_env_dir}")
+
+        return actions
+
+    def is_staged_pack_current(self, pack_stamp, source_stat, expected_checksum):
+        """The staged archive is current if it is unchanged since it was hashed and matches the source"""
+
+        if pack_stamp is None or not self.conda_env_path.exists():
+            return False
+        staged_stat = self.conda_env_path.stat()
+        if (staged_stat.st_size, staged_stat.st_mtime_ns) != (pack_stamp["size"], pack_stamp["mtime_ns"]):
+            return False
+        if expected_checksum is not None:
+            return pack_stamp["sha256"] == expected_checksum
+        return (source_stat.st_size, source_stat.st_mtime_ns) == (pack_stamp["source_size"], pack_stamp["source_mtime_ns"])
 
     def execute(self, requests):
-        
-        return [pb_utils.InferenceResponse([pb_utils.Tensor("conda_env_path", np.array(self.conda_env_path).astype(object))])]
-    
+
+        conda_env_path = self.conda_env_dir if self.extract_env else self.conda_env_path
+        return [pb_utils.InferenceResponse([pb_utils.Tensor("conda_env_path", np.array(str(conda_env_path)).astype(object))])]
+
 
     def finalize(self):
 
-        print('Cleaning up...')
\ No newline at end of file
+        print('Cleaning up...')
@@ -0,0 +1,268 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Batched inference with the frozen DeepRacer policy graphs (model_N.pb).
+
+Every graph is loaded once into its own tf.Graph and session, images are
+preprocessed once for the whole batch and then fed to every policy.
+`stream_inference` does the same for images arriving from an iterator, such as the
+diffusion outputs of `endpoint_client`, one batch at a time.
+"""
+import glob
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import tensorflow.compat.v1 as tf
+from PIL import Image
+
+# DeepRacer camera observation size, (width, height)
+OBSERVATION_SIZE = (160, 120)
+OBSERVATION_TENSOR = "main_level/agent/main/online/network_0/{sensor}/{sensor}:0"
+POLICY_TENSOR = "main_level/agent/main/online/network_1/ppo_head_0/policy:0"
+
+
+def rgb2gray(rgb):
+    return np.dot(rgb[..., :3], [0.299, 0.587, 0.114])
+
+
+def load_image(image):
+    if isinstance(image, Image.Image):
+        return image
+    if isinstance(image, np.ndarray):
+        return Image.fromarray(image)
+    return Image.open(image)
+
+
+def preprocess_images(images, size=OBSERVATION_SIZE):
+    """
+    Turn images into a batch of policy observations.
+
+    Args:
+        images (list): Image paths, PIL images or RGB arrays.
+        size (tuple): The observation (width, height).
+
+    Returns:
+        np.ndarray: float32 array of shape (images, height, width, 1).
+    """
+    resized = np.stack(
+        [np.asarray(load_image(image).convert("RGB").resize(size, Image.BICUBIC)) for image in images]
+    )
+    return rgb2gray(resized)[..., np.newaxis].astype(np.float32)
+
+
+def get_sensor(model_metadata):
+    return [sensor for sensor in model_metadata["sensor"] if sensor != "LIDAR"][0]
+
+
+class PolicyModel:
+    """A frozen policy graph loaded into its own graph and session."""
+
+    def __init__(self, pb_path, sensor, cpu_only=False):
+        self.pb_path = pb_path
+        self.sensor = sensor
+        self.graph = tf.Graph()
+        with self.graph.as_default():
+            graph_def = tf.GraphDef()
+            with tf.gfile.GFile(pb_path, "rb") as f:
+                graph_def.ParseFromString(f.read())
+            tf.import_graph_def(graph_def, name="")
+
+        config = tf.ConfigProto(allow_soft_placement=True)
+        if cpu_only:
+            config.device_count["GPU"] = 0
+        self.session = tf.Session(graph=self.graph, config=config)
+        self.observation = self.graph.get_tensor_by_name(OBSERVATION_TENSOR.format(sensor=sensor))
+        self.policy = self.graph.get_tensor_by_name(POLICY_TENSOR)
+
+    def predict(self, observations, batch_size=64):
+        """
+        Run the policy on a batch of observations.
+
+        Args:
+            observations (np.ndarray): Array of shape (images, 120, 160, 1) from `preprocess_images`.
+            batch_size (int): The number of observations per session run.
+
+        Returns:
+            np.ndarray: The action probabilities, shape (images, actions).
+        """
+        return np.concatenate(
+            [
+                self.session.run(self.policy, feed_dict={self.observation: observations[i : i + batch_size]})
+                for i in range(0, len(observations), batch_size)
+            ]
+        )
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def iteration_model_paths(model_path, iterations=None):
+    """
+    Find the model_N.pb files of a model, ordered by iteration.
+
+    Args:
+        model_path (string): The model folder containing model_metadata.json and model_N.pb files.
+        iterations (list): Only return these iterations, in this order.
+
+    Returns:
+        dict: Maps the iteration number to the .pb path.
+    """
+    found = {}
+    for pb_path in glob.glob(os.path.join(model_path, "model_*.pb")):
+        match = re.search(r"model_(\d+)\.pb$", pb_path)
+        if match:
+            found[int(match.group(1))] = pb_path
+    if iterations is None:
+        return dict(sorted(found.items()))
+    return {iteration: found[iteration] for iteration in iterations}
+
+
+def load_policies(model_path, iterations=None, sensor=None, cpu_only=False):
+    """
+    Load the policies of a model, one graph per iteration.
+
+    Args:
+        model_path (string): The model folder containing model_metadata.json and model_N.pb files.
+        iterations (list): The iterations to load, all of them by default.
+        sensor (string): The observation sensor, read from model_metadata.json by default.
+        cpu_only (bool): Hide GPUs from the sessions.
+
+    Returns:
+        dict: Maps the iteration number to its PolicyModel.
+    """
+    if sensor is None:
+        with open(os.path.join(model_path, "model_metadata.json"), "r") as f:
+            sensor = get_sensor(json.load(f))
+    return {
+        iteration: PolicyModel(pb_path, sensor, cpu_only=cpu_only)
+        for iteration, pb_path in iteration_model_paths(model_path, iterations).items()
+    }
+
+
+def run_inference(policies, images, batch_size=64):
+    """
+    Run every policy on every image.
+
+    Args:
+        policies (dict): Iteration to PolicyModel, as returned by `load_policies`.
+        images: Image paths, PIL images, RGB arrays, or an observation batch from `preprocess_images`.
+        batch_size (int): The number of observations per session run.
+
+    Returns:
+        np.ndarray: The action probabilities, shape (iterations, images, actions).
+    """
+    observations = images if isinstance(images, np.ndarray) and images.ndim == 4 else preprocess_images(images)
+    return np.stack([policy.predict(observations, batch_size) for policy in policies.values()])
+
+
+def iter_batches(items, batch_size):
+    """Group the items of an iterable into lists of at most `batch_size`."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _name_and_image(item, index):
+    if isinstance(item, tuple) and len(item) == 2:
+        name, image = item
+        return str(name), image
+    return str(item) if isinstance(item, str) else f"image-{index:05d}", item
+
+
+def _prepare_batch(batch, save_path, save_prefix):
+    """Preprocess a batch, saving the images at observation size when asked"""
+    images = [load_image(image) for _, image in batch]
+    if save_path is not None:
+        for (name, _), image in zip(batch, images):
+            file_name = os.path.splitext(os.path.basename(name))[0] + ".png"
+            image.convert("RGB").resize(OBSERVATION_SIZE, Image.BICUBIC).save(os.path.join(save_path, save_prefix + file_name))
+    return preprocess_images(images)
+
+
+def stream_inference(policies, images, batch_size=64, save_path=None, save_prefix=""):
+    """
+    Run every policy on images coming from an iterator, without writing them to disk first.
+
+    Images are taken in batches, every batch is preprocessed once and fed to all policies.
+    The next batch is preprocessed (and optionally saved) while the policies run.
+
+    Args:
+        policies (dict): Iteration to PolicyModel, as returned by `load_policies`.
+        images: An iterable of image paths, PIL images or RGB arrays, or of (name, image)
+            pairs, e.g. `EndpointPipeline.iter_images(files)`.
+        batch_size (int): The number of images preprocessed and fed at once.
+        save_path (string): Also save every image, at observation size, as `<save_path>/<save_prefix><name>.png`.
+
+    Example:
+        >>> generated = pipeline.iter_images(all_files)
+        >>> names, probabilities = stream_inference(policies, generated, save_path="output_images", save_prefix="SD_")
+
+    Returns:
+        tuple: The image names in the order of the results, and the action probabilities,
+            shape (iterations, images, actions).
+    """
+    if save_path is not None:
+        os.makedirs(save_path, exist_ok=True)
+    named = (_name_and_image(item, index) for index, item in enumerate(images))
+    names, results = [], [[] for _ in policies]
+
+    with ThreadPoolExecutor(max_workers=1) as prepare_pool:
+        pending = None
+        for batch in iter_batches(named, batch_size):
+            future = prepare_pool.submit(_prepare_batch, batch, save_path, save_prefix)
+            if pending is not None:
+                _run_batch(policies, *pending, names, results)
+            pending = (batch, future)
+        if pending is not None:
+            _run_batch(policies, *pending, names, results)
+
+    if not names:
+        return names, np.zeros((len(policies), 0, 0), dtype=np.float32)
+    return names, np.stack([np.concatenate(result) for result in results])
+
+
+def _run_batch(policies, batch, future, names, results):
+    observations = future.result()
+    names.extend(name for name, _ in batch)
+    for result, policy in zip(results, policies.values()):
+        result.append(policy.predict(observations, len(observations)))
+
+
+def benchmark(policies, images, batch_size=64, repeats=3):
+    """
+    Compare batched inference against feeding one image per session run.
+
+    Returns:
+        dict: images/second for both modes, counted per (policy, image) pair.
+    """
+    observations = preprocess_images(images)
+    pairs = len(policies) * len(observations)
+    run_inference(policies, observations, batch_size)  # warm up
+
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        run_inference(policies, observations, batch_size)
+    batched = pairs * repeats / (time.perf_counter() - start_time)
+
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        run_inference(policies, observations, batch_size=1)
+    single = pairs * repeats / (time.perf_counter() - start_time)
+
+    return {"batched_images_per_second": batched, "single_images_per_second": single}
@@ -0,0 +1,314 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Replay a reward function over recorded sim-trace steps.
+
+The `params` fields that can be derived from the trace are built once as NumPy
+columns. Reward functions written with array operations are evaluated over all
+steps in one call, any other function is called once per step in a process pool.
+"""
+import builtins
+import importlib
+import inspect
+import multiprocessing
+import os
+import pickle
+import textwrap
+import time
+import types
+
+import numpy as np
+
+from track import Track
+
+# set in every pool worker by _init_worker
+_reward_function = None
+_static_params = None
+
+
+def load_reward_function(path):
+    """
+    Load `reward_function` from a reward_function.py file.
+
+    Returns:
+        tuple: The function and its source code.
+    """
+    with open(path, "r") as f:
+        source = f.read()
+    namespace = {}
+    exec(compile(source, path, "exec"), namespace)
+    return namespace["reward_function"], source
+
+
+def build_params(df, waypoints=None, track_width=None):
+    """
+    Build the reward function `params` as one array per field.
+
+    Args:
+        df (DataFrame): Sim-trace steps from `log_analysis.load_simtrace`.
+        waypoints: Optional `track.Track`, or its waypoints in meters: either the center line (N, 2)
+            or center, inner and outer border points (N, 6).
+        track_width (float): Track width in meters, used when the waypoints carry no borders.
+
+    Returns:
+        tuple: The per-step fields as arrays, and the fields shared by all steps.
+    """
+    x = df["x"].to_numpy(dtype=float) / 100
+    y = df["y"].to_numpy(dtype=float) / 100
+    on_track = df["on_track"].to_numpy(dtype=bool)
+    if "episode_status" in df:
+        is_offtrack = (df["episode_status"] == "off_track").to_numpy()
+    else:
+        is_offtrack = ~on_track
+
+    params = {
+        "all_wheels_on_track": on_track,
+        "x": x,
+        "y": y,
+        "heading": df["yaw"].to_numpy(dtype=float),
+        "steering_angle": df["steer"].to_numpy(dtype=float),
+        "speed": df["throttle"].to_numpy(dtype=float),
+        "progress": df["progress"].to_numpy(dtype=float),
+        "steps": df["steps"].to_numpy(dtype=int),
+        "track_length": df["track_len"].to_numpy(dtype=float),
+        "is_offtrack": is_offtrack,
+        "is_crashed": np.zeros(len(df), dtype=bool),
+        "is_reversed": np.zeros(len(df), dtype=bool),
+    }
+    static_params = {}
+
+    if waypoints is not None:
+        track = waypoints if isinstance(waypoints, Track) else Track("waypoints", waypoints)
+        static_params["waypoints"] = [tuple(point) for point in track.center]
+
+        located = track.locate(x, y, df["closest_waypoint"].to_numpy(dtype=int))
+        params["closest_waypoints"] = np.column_stack([located["prev_waypoint"], located["next_waypoint"]])
+        params["distance_from_center"] = located["distance_from_center"]
+        params["is_left_of_center"] = located["is_left_of_center"]
+        if located["track_width"] is not None:
+            params["track_width"] = located["track_width"]
+
+    if "track_width" not in params and track_width is not None:
+        params["track_width"] = np.full(len(df), float(track_width))
+
+    return params, static_params
+
+
+def _rows(params):
+    keys = list(params)
+    for row in zip(*(params[key].tolist() for key in keys)):
+        yield dict(zip(keys, row))
+
+
+def evaluate_vectorized(reward_function, params, static_params=None):
+    """Call the reward function once with array-valued params, returns the rewards per step."""
+    rewards = reward_function({**(static_params or {}), **params})
+    return np.broadcast_to(np.asarray(rewards, dtype=float), (len(params["x"]),)).copy()
+
+
+def evaluate_sequential(reward_function, params, static_params=None):
+    """Call the reward function once per step in this process."""
+    static_params = static_params or {}
+    return np.array([reward_function({**static_params, **row}) for row in _rows(params)], dtype=float)
+
+
+def _global_names(code):
+    """The global names a function and the functions nested in it refer to."""
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= _global_names(const)
+    return names
+
+
+def _worker_spec(reward_function):
+    """
+    How the pool workers get the reward function.
+
+    - ("reference", pickled): the function can be imported by name from its module.
+    - ("module", source, filename, name): the function was defined in a file, e.g. a
+      reward_function.py loaded by `load_reward_function`; the whole file is executed,
+      so its helpers and constants come along.
+    - ("function", source, name, modules): a function defined in a notebook cell; only
+      its source and the modules it uses are shipped.
+    """
+    module = getattr(reward_function, "__module__", None)
+    qualname = getattr(reward_function, "__qualname__", "")
+    if module not in (None, "__main__") and "<locals>" not in qualname:
+        try:
+            return ("reference", pickle.dumps(reward_function))
+        except (pickle.PicklingError, AttributeError, TypeError):
+            pass
+
+    filename = reward_function.__code__.co_filename
+    if os.path.isfile(filename):
+        with open(filename, "r") as f:
+            return ("module", f.read(), filename, reward_function.__name__)
+
+    modules = {
+        alias: value.__name__
+        for alias, value in reward_function.__globals__.items()
+        if isinstance(value, types.ModuleType) and alias in _global_names(reward_function.__code__)
+    }
+    missing = sorted(
+        name
+        for name in _global_names(reward_function.__code__)
+        if name in reward_function.__globals__ and name not in modules and not hasattr(builtins, name)
+    )
+    if missing:
+        raise ValueError(
+            f"{reward_function.__name__} uses {', '.join(missing)} from the notebook, which the per-step "
+            "workers cannot import. Define them inside the reward function, load the function from a "
+            "file with load_reward_function, or use mode='vectorized' or evaluate_sequential."
+        )
+    return ("function", textwrap.dedent(inspect.getsource(reward_function)), reward_function.__name__, modules)
+
+
+def _rebuild(spec):
+    """The reward function described by a `_worker_spec`."""
+    kind = spec[0]
+    if kind == "reference":
+        return pickle.loads(spec[1])
+    if kind == "module":
+        _, source, filename, name = spec
+        namespace = {"__name__": "reward_function"}
+        exec(compile(source, filename, "exec"), namespace)
+        return namespace[name]
+    _, source, name, modules = spec
+    namespace = {alias: importlib.import_module(module) for alias, module in modules.items()}
+    exec(source, namespace)
+    return namespace[name]
+
+
+def _init_worker(spec, static_params):
+    global _reward_function, _static_params
+    _reward_function = _rebuild(spec)
+    _static_params = static_params
+
+
+def _evaluate_chunk(chunk):
+    return [_reward_function({**_static_params, **row}) for row in _rows(chunk)]
+
+
+def evaluate_per_step(reward_function, params, static_params=None, processes=None, chunk_size=10000):
+    """
+    Call the reward function once per step, spread over a process pool.
+
+    The workers import the function by name when they can, otherwise they execute the
+    file that defines it, or for a notebook function its source with the modules it uses
+    (see `_worker_spec`). The function the workers get is called on the first step here
+    first, so a function that cannot run in the workers fails once with a clear error.
+    """
+    spec = _worker_spec(reward_function)
+    static_params = static_params or {}
+    count = len(params["x"])
+    if count:
+        first_step = next(_rows({key: value[:1] for key, value in params.items()}))
+        try:
+            _rebuild(spec)({**static_params, **first_step})
+        except NameError as e:
+            raise ValueError(
+                f"{reward_function.__name__} cannot run in the per-step workers: {e}. Define the missing "
+                "names inside the reward function or in the file it is loaded from, or use "
+                "mode='vectorized' or evaluate_sequential."
+            ) from e
+    chunks = [
+        {key: value[start : start + chunk_size] for key, value in params.items()}
+        for start in range(0, count, chunk_size)
+    ]
+    with multiprocessing.Pool(
+        processes, initializer=_init_worker, initargs=(spec, static_params)
+    ) as pool:
+        rewards = pool.map(_evaluate_chunk, chunks)
+    return np.array([reward for chunk in rewards for reward in chunk], dtype=float)
+
+
+def supports_vectorized(reward_function, params, static_params=None, sample_size=256):
+    """
+    Check whether the function accepts array-valued params and agrees with per-step calls on a sample.
+    """
+    sample = {key: value[:sample_size] for key, value in params.items()}
+    try:
+        vectorized = evaluate_vectorized(reward_function, sample, static_params)
+    except Exception:
+        return False
+    return np.allclose(vectorized, evaluate_sequential(reward_function, sample, static_params))
+
+
+def replay(df, reward_function, waypoints=None, track_width=None, mode="auto", processes=None):
+    """
+    Evaluate a reward function over every sim-trace step.
+
+    Args:
+        df (DataFrame): Sim-trace steps from `log_analysis.load_simtrace`.
+        reward_function: The reward function, or the path of a reward_function.py file.
+        waypoints: Optional `track.Track` or track waypoints, see `build_params`.
+        track_width (float): Track width in meters when the waypoints carry no borders.
+        mode (string): "vectorized", "per_step", or "auto" to use the vectorized mode when
+            the function supports it.
+        processes (int): Pool size of the per-step mode, all CPUs by default.
+
+    Returns:
+        DataFrame: A copy of `df` with the replayed rewards in a `new_reward` column.
+
+    Example:
+        >>> track = Track.from_params_file(glob.glob(f"{model_path}/training_params_*.yaml")[0])
+        >>> replayed = replay(df, f"{model_path}/reward_function.py", track)
+        >>> total_rewards, sorted_idx = episode_rewards(replayed, "new_reward")
+    """
+    if isinstance(reward_function, str):
+        reward_function, _ = load_reward_function(reward_function)
+    params, static_params = build_params(df, waypoints, track_width)
+
+    if mode == "auto":
+        mode = "vectorized" if supports_vectorized(reward_function, params, static_params) else "per_step"
+    if mode == "vectorized":
+        rewards = evaluate_vectorized(reward_function, params, static_params)
+    else:
+        rewards = evaluate_per_step(reward_function, params, static_params, processes)
+
+    replayed = df.copy()
+    replayed["new_reward"] = rewards
+    return replayed
+
+
+def episode_rewards(df, column="reward"):
+    """
+    Total reward per episode, ordered like `log_analysis.episode_parser`.
+
+    Returns:
+        tuple: Episode number => total reward, and the episodes sorted by total reward, highest first.
+    """
+    total_rewards = df.groupby("episode", sort=True)[column].sum().to_dict()
+    sorted_idx = sorted(total_rewards, key=total_rewards.get, reverse=True)
+    return total_rewards, sorted_idx
+
+
+def benchmark(df, reward_function, waypoints=None, track_width=None, processes=None):
+    """
+    Measure steps/second of the execution modes the reward function supports.
+
+    Returns:
+        dict: steps/second per mode.
+    """
+    if isinstance(reward_function, str):
+        reward_function, _ = load_reward_function(reward_function)
+    params, static_params = build_params(df, waypoints, track_width)
+    count = len(df)
+
+    results = {}
+    start_time = time.perf_counter()
+    evaluate_sequential(reward_function, params, static_params)
+    results["sequential"] = count / (time.perf_counter() - start_time)
+
+    start_time = time.perf_counter()
+    evaluate_per_step(reward_function, params, static_params, processes)
+    results["per_step"] = count / (time.perf_counter() - start_time)
+
+    if supports_vectorized(reward_function, params, static_params):
+        start_time = time.perf_counter()
+        evaluate_vectorized(reward_function, params, static_params)
+        results["vectorized"] = count / (time.perf_counter() - start_time)
+
+    return results
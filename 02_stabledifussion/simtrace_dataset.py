@@ -0,0 +1,287 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+The sim-traces of many models queried as one dataset, without loading them all into memory.
+
+Every `N-iteration.csv` file is a partition keyed by model, phase (training or evaluation),
+run and iteration. The first read of a partition stores its columns as .npy files next to
+the CSV, later reads only map the columns a query needs. Filters on the partition keys
+skip whole files, the other filters are applied per partition. Aggregations are computed
+per partition in a process pool and merged from small partial results, so memory is
+bounded by the largest partition.
+"""
+import glob
+import json
+import os
+import re
+import shutil
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from analysis_cache import file_signature
+from log_analysis import load_simtrace
+
+PARTITION_COLUMNS = ["model", "phase", "run", "iteration"]
+COLUMNS_CACHE_DIR = ".analysis_cache.columns"
+
+OPERATORS = {
+    "==": lambda column, value: column == value,
+    "!=": lambda column, value: column != value,
+    "<": lambda column, value: column < value,
+    "<=": lambda column, value: column <= value,
+    ">": lambda column, value: column > value,
+    ">=": lambda column, value: column >= value,
+    "in": lambda column, value: np.isin(column, list(value)),
+    "not in": lambda column, value: ~np.isin(column, list(value)),
+}
+
+# how the partial aggregates of the same group are merged
+PARTIAL_MERGE = {"count": "sum", "sum": "sum", "sumsq": "sum", "min": "min", "max": "max"}
+
+Partition = namedtuple("Partition", PARTITION_COLUMNS + ["path"])
+
+
+def discover_partitions(root):
+    """
+    Find the sim-trace files of every model under `root`.
+
+    The layout is <root>/<model>/sim-trace/training/training-simtrace/N-iteration.csv and
+    <root>/<model>/sim-trace/evaluation/<run>/evaluation-simtrace/N-iteration.csv. The
+    iteration of file N is N + 1, the numbering used by `log_analysis.convert_to_pandas`.
+    """
+    partitions = []
+    for path in glob.glob(os.path.join(root, "*", "sim-trace", "*", "**", "*-iteration.csv"), recursive=True):
+        relative = os.path.relpath(path, root).split(os.sep)
+        model, phase = relative[0], relative[2]
+        run = relative[3] if phase == "evaluation" and len(relative) > 5 else phase
+        iteration = int(re.match(r"(\d+)", relative[-1]).group(1)) + 1
+        partitions.append(Partition(model, phase, run, iteration, path))
+    return sorted(partitions)
+
+
+def _partition_matches(partition, filters):
+    for column, op, value in filters:
+        if column in PARTITION_COLUMNS and not OPERATORS[op](np.asarray(getattr(partition, column)), value):
+            return False
+    return True
+
+
+def _columns_cache_path(csv_path):
+    folder, name = os.path.split(csv_path)
+    return os.path.join(folder, COLUMNS_CACHE_DIR, os.path.splitext(name)[0])
+
+
+def write_columns(csv_path):
+    """Parse a sim-trace CSV once and store every column as a .npy file next to it."""
+    df = load_simtrace(csv_path)
+    cache_path = _columns_cache_path(csv_path)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    categories = {}
+    for column in df.columns:
+        values = df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            categories[column] = [str(category) for category in values.cat.categories]
+            values = values.cat.codes
+        np.save(os.path.join(tmp_path, f"{column}.npy"), values.to_numpy())
+
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump({"signature": file_signature(csv_path), "rows": len(df), "categories": categories}, f)
+
+    shutil.rmtree(cache_path, ignore_errors=True)
+    os.replace(tmp_path, cache_path)
+
+
+def read_columns(csv_path, columns=None, use_cache=True):
+    """
+    Read some columns of a sim-trace CSV, from its column cache when it is current.
+
+    Returns:
+        DataFrame: The columns in the `log_analysis.load_simtrace` layout.
+    """
+    if not use_cache:
+        return load_simtrace(csv_path, columns=columns)
+
+    cache_path = _columns_cache_path(csv_path)
+    try:
+        with open(os.path.join(cache_path, "meta.json"), "r") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        meta = None
+    if meta is None or tuple(meta["signature"]) != file_signature(csv_path):
+        try:
+            write_columns(csv_path)
+        except OSError as e:
+            print(f"Could not write the column cache of {csv_path}: {e}")
+            return load_simtrace(csv_path, columns=columns)
+        with open(os.path.join(cache_path, "meta.json"), "r") as f:
+            meta = json.load(f)
+
+    if columns is None:
+        columns = [os.path.splitext(name)[0] for name in sorted(os.listdir(cache_path)) if name.endswith(".npy")]
+
+    data = {}
+    for column in columns:
+        values = np.load(os.path.join(cache_path, f"{column}.npy"), mmap_mode="r")
+        if column in meta["categories"]:
+            values = pd.Categorical.from_codes(values, meta["categories"][column])
+        data[column] = values
+    return pd.DataFrame(data)
+
+
+def scan_partition(partition, columns=None, filters=(), use_cache=True):
+    """
+    Read one partition with only the needed columns and the row filters applied.
+
+    Returns:
+        DataFrame: The requested columns, partition columns included.
+    """
+    row_filters = [f for f in filters if f[0] not in PARTITION_COLUMNS]
+    data_columns = None
+    if columns is not None:
+        needed = [c for c in columns if c not in PARTITION_COLUMNS or c == "iteration"]
+        needed += [f[0] for f in row_filters if f[0] not in needed]
+        data_columns = [c for c in needed if c != "iteration"]
+
+    df = read_columns(partition.path, data_columns, use_cache)
+    if row_filters:
+        mask = np.ones(len(df), dtype=bool)
+        for column, op, value in row_filters:
+            mask &= np.asarray(OPERATORS[op](df[column], value))
+        df = df[mask]
+
+    df = df.assign(model=partition.model, phase=partition.phase, run=partition.run, iteration=partition.iteration)
+    return df if columns is None else df[list(columns)]
+
+
+def _partial_aggregate(partition, by, aggregations, filters, use_cache):
+    """Partial aggregates of one partition: count, sum, sum of squares, min and max per group"""
+    value_columns = list(aggregations)
+    df = scan_partition(partition, list(by) + value_columns, filters, use_cache)
+    if df.empty:
+        return None
+    values = df[value_columns].astype(np.float64)
+    parts = {}
+    for column in value_columns:
+        parts[(column, "count")] = values[column].notna()
+        parts[(column, "sum")] = values[column]
+        parts[(column, "sumsq")] = values[column] ** 2
+        parts[(column, "min")] = values[column]
+        parts[(column, "max")] = values[column]
+    frame = pd.DataFrame(parts)
+    grouped = frame.groupby([df[column].astype(object) for column in by], observed=True, sort=False)
+    return grouped.agg({key: PARTIAL_MERGE[key[1]] for key in parts})
+
+
+def _merge(partials):
+    combined = pd.concat(partials)
+    return combined.groupby(level=list(range(combined.index.nlevels)), sort=False).agg(
+        {key: PARTIAL_MERGE[key[1]] for key in combined.columns}
+    )
+
+
+def _finalize(partial, aggregations):
+    result = {}
+    for column, functions in aggregations.items():
+        count = partial[(column, "count")]
+        total = partial[(column, "sum")]
+        for function in functions:
+            if function == "count":
+                value = count
+            elif function == "sum":
+                value = total
+            elif function == "mean":
+                value = total / count
+            elif function == "std":
+                variance = (partial[(column, "sumsq")] - total**2 / count) / (count - 1)
+                value = np.sqrt(variance.clip(lower=0))
+            elif function in ("min", "max"):
+                value = partial[(column, function)]
+            else:
+                raise ValueError(f"Unsupported aggregation {function}, use count, sum, mean, std, min or max")
+            result[f"{column}_{function}"] = value
+    return pd.DataFrame(result).sort_index()
+
+
+class SimTraceDataset:
+    """
+    The sim-traces of every model under a folder, as one partitioned dataset.
+
+    Filters are (column, operator, value) tuples with the operators ==, !=, <, <=, >, >=,
+    in and not in. Filters on model, phase, run or iteration select partitions, the
+    others select rows.
+
+    Example:
+        >>> dataset = SimTraceDataset("deepracer_models")
+        >>> dataset.aggregate(["model", "episode"], {"reward": ["sum"]}, filters=[("phase", "==", "training")])
+    """
+
+    def __init__(self, root, partitions=None, use_cache=True, max_workers=None):
+        self.root = root
+        self.partitions = discover_partitions(root) if partitions is None else partitions
+        self.use_cache = use_cache
+        self.max_workers = max_workers or os.cpu_count()
+
+    def models(self):
+        return sorted({partition.model for partition in self.partitions})
+
+    def select(self, filters):
+        """The partitions that can contain rows matching the filters."""
+        return [partition for partition in self.partitions if _partition_matches(partition, filters)]
+
+    def scan(self, columns=None, filters=()):
+        """Yield one filtered DataFrame per matching partition, holding only `columns`."""
+        for partition in self.select(filters):
+            yield scan_partition(partition, columns, filters, self.use_cache)
+
+    def to_pandas(self, columns=None, filters=()):
+        """Load the matching rows, meant for results small enough to fit in memory."""
+        frames = list(self.scan(columns, filters))
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(frames, ignore_index=True)
+
+    def aggregate(self, by, aggregations, filters=()):
+        """
+        Group-by aggregation over all matching partitions, computed in parallel.
+
+        Args:
+            by (list): Group columns, partition columns included.
+            aggregations (dict): Maps a numeric column to a list of count, sum, mean, std, min or max.
+            filters (list): (column, operator, value) tuples.
+
+        Returns:
+            DataFrame: One row per group, one `<column>_<function>` column per aggregation.
+        """
+        partitions = self.select(filters)
+        # merge every few partitions, so at most a window of partial results is held at once
+        window = 4 * self.max_workers
+        merged = None
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            for start in range(0, len(partitions), window):
+                batch = partitions[start : start + window]
+                partials = executor.map(
+                    _partial_aggregate,
+                    batch,
+                    [by] * len(batch),
+                    [aggregations] * len(batch),
+                    [filters] * len(batch),
+                    [self.use_cache] * len(batch),
+                )
+                partials = [partial for partial in partials if partial is not None]
+                if merged is not None:
+                    partials.append(merged)
+                if partials:
+                    merged = _merge(partials)
+
+        if merged is None:
+            return pd.DataFrame()
+        result = _finalize(merged, aggregations)
+        result.index.names = list(by)
+        return result
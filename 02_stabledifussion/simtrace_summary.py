@@ -0,0 +1,106 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Per-episode and per-iteration training progress tables computed from sim-trace CSV files.
+
+Every CSV is reduced to its episode table in a single grouped pass. The episode tables
+are cached next to the CSV files, so only new or changed iteration files are read again.
+"""
+import os
+
+import pandas as pd
+
+from analysis_cache import cached_per_file
+from log_analysis import load_simtrace, simtrace_files
+
+CACHE_NAME = ".analysis_cache.simtrace_summary.pkl"
+# bump when the episode table changes, so cached tables are recomputed
+SUMMARY_VERSION = "2"
+
+
+def summarize_episodes(df):
+    """
+    Reduce sim-trace steps to one row per episode.
+
+    Args:
+        df (DataFrame): Steps from `log_analysis.load_simtrace`.
+
+    Returns:
+        DataFrame: Indexed by episode, with iteration, steps, total_reward, final_progress,
+            status (the last episode_status), completed, off_track, start_time and lap_time.
+    """
+    df = df.assign(off_track_step=df["episode_status"] == "off_track")
+    episodes = df.groupby("episode", sort=True).agg(
+        iteration=("iteration", "first"),
+        steps=("steps", "max"),
+        total_reward=("reward", "sum"),
+        final_progress=("progress", "last"),
+        status=("episode_status", "last"),
+        off_track=("off_track_step", "sum"),
+        start_time=("timestamp", "first"),
+        end_time=("timestamp", "last"),
+    )
+    episodes["completed"] = episodes["status"] == "lap_complete"
+    episodes["lap_time"] = episodes["end_time"] - episodes["start_time"]
+    return episodes.drop(columns="end_time")
+
+
+def summarize_iterations(episodes):
+    """
+    Reduce an episode table to one row per iteration.
+
+    Returns:
+        DataFrame: Indexed by iteration, with episodes, completion_rate, mean_progress,
+            mean_reward, mean_steps, off_track episodes, mean and best lap time of the
+            completed laps.
+    """
+    episodes = episodes.assign(
+        completed_lap_time=episodes["lap_time"].where(episodes["completed"]),
+        off_track_episode=episodes["off_track"] > 0,
+    )
+    return episodes.groupby("iteration", sort=True).agg(
+        episodes=("steps", "size"),
+        completion_rate=("completed", "mean"),
+        mean_progress=("final_progress", "mean"),
+        mean_reward=("total_reward", "mean"),
+        mean_steps=("steps", "mean"),
+        off_track=("off_track_episode", "sum"),
+        mean_lap_time=("completed_lap_time", "mean"),
+        best_lap_time=("completed_lap_time", "min"),
+    )
+
+
+def _summarize_file(fname):
+    return summarize_episodes(load_simtrace(fname))
+
+
+def load_summaries(simtrace_path, use_cache=True):
+    """
+    Episode and iteration tables of a sim-trace folder.
+
+    Args:
+        simtrace_path (string): A folder of `N-iteration.csv` files, e.g.
+            deepracer_models/<model>/sim-trace/training/training-simtrace.
+        use_cache (bool): Reuse and update the episode tables cached in the folder.
+
+    Returns:
+        tuple: The episode table and the iteration table.
+
+    Example:
+        >>> episodes, iterations = load_summaries(f"{model_path}/sim-trace/training/training-simtrace")
+        >>> iterations[["completion_rate", "mean_progress", "best_lap_time"]].plot(subplots=True)
+    """
+    fnames = simtrace_files(simtrace_path)
+    if not fnames:
+        raise FileNotFoundError(f"No *-iteration.csv files in {simtrace_path}")
+
+    if use_cache:
+        tables = cached_per_file(
+            fnames, os.path.join(simtrace_path, CACHE_NAME), _summarize_file, key=SUMMARY_VERSION
+        ).values()
+    else:
+        tables = [_summarize_file(fname) for fname in fnames]
+
+    episodes = pd.concat(tables).sort_index()
+    return episodes, summarize_iterations(episodes)
@@ -0,0 +1,8 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import sys
+from pathlib import Path
+
+# the notebook modules are imported from the notebook folder, as the notebook does
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,45 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import pickle
+
+import pytest
+
+from analysis_cache import CACHE_VERSION, cached_per_file, load_cache, save_cache
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        b"",
+        b"not a pickle",
+        pickle.dumps(["a", "list"]),
+        pickle.dumps({"version": CACHE_VERSION + 1, "entries": {}}),
+        pickle.dumps({"version": CACHE_VERSION, "entries": "not a dict"}),
+        # a pickled reference to a class that cannot be imported
+        b"\x80\x04\x95\x1c\x00\x00\x00\x00\x00\x00\x00\x8c\x0emissing_module\x94\x8c\x05Thing\x94\x93\x94.",
+    ],
+)
+def test_unreadable_cache_is_a_miss(tmp_path, content):
+    cache_path = tmp_path / "cache.pkl"
+    cache_path.write_bytes(content)
+
+    assert load_cache(cache_path) == {}
+
+
+def test_unchanged_files_are_not_recomputed(tmp_path):
+    source = tmp_path / "0-iteration.csv"
+    source.write_text("x\n1\n")
+    cache_path = tmp_path / "cache.pkl"
+    calls = []
+
+    def compute(path):
+        calls.append(path)
+        return len(calls)
+
+    assert cached_per_file([str(source)], cache_path, compute) == {str(source): 1}
+    assert cached_per_file([str(source)], cache_path, compute) == {str(source): 1}
+    assert len(calls) == 1
+
+    save_cache(cache_path, [])
+    assert cached_per_file([str(source)], cache_path, compute) == {str(source): 2}
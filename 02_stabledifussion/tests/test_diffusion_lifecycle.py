@@ -0,0 +1,131 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# the models import the shared module as a sibling, as in their packaged version folder
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "models"))
+
+from diffusion_lifecycle import PipelineModel
+
+
+class DummyPipeline:
+    components = {}
+
+    def __call__(self, request):
+        return f"generated {request}"
+
+
+class DummyModel(PipelineModel):
+    """PipelineModel with a dummy pipeline, recording loads and log messages."""
+
+    def __init__(self, request_time_s=0.0):
+        self.loads = 0
+        self.messages = []
+        self.request_time_s = request_time_s
+
+    def log(self, message):
+        self.messages.append(message)
+
+    def load_pipeline(self, device):
+        self.loads += 1
+        return DummyPipeline()
+
+    def execute_request(self, pipe, request):
+        time.sleep(self.request_time_s)
+        return pipe(request)
+
+
+def initialized(model, **parameters):
+    config = {"parameters": {key: {"string_value": value} for key, value in parameters.items()}}
+    model.initialize({"model_repository": "/models/dummy", "model_version": "1", "model_config": json.dumps(config)})
+    return model
+
+
+def wait_until(condition, timeout_s=5.0):
+    deadline = time.monotonic() + timeout_s
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def models():
+    created = []
+    yield created
+    for model in created:
+        model.finalize()
+
+
+def test_eager_load(models):
+    model = initialized(DummyModel(), DEVICE="cpu", LAZY_LOAD="false")
+    models.append(model)
+    assert model.loads == 1 and model.pipe is not None
+    assert model.execute(["a"]) == ["generated a"]
+    assert model.loads == 1
+    assert model.messages[0].startswith("Loaded pipeline on cpu")
+
+
+def test_lazy_load_on_first_request(models):
+    model = initialized(DummyModel(), DEVICE="cpu", LAZY_LOAD="true")
+    models.append(model)
+    assert model.loads == 0 and model.pipe is None
+
+    assert model.execute(["a", "b"]) == ["generated a", "generated b"]
+    assert model.execute(["c"]) == ["generated c"]
+    assert model.loads == 1
+
+
+def test_unload_when_idle_and_reload(models):
+    model = initialized(DummyModel(), DEVICE="cpu", LAZY_LOAD="true", IDLE_TIMEOUT_S="0.1")
+    models.append(model)
+    model.execute(["a"])
+    assert model.pipe is not None
+
+    assert wait_until(lambda: any(message.startswith("Unloaded pipeline") for message in model.messages))
+    assert model.pipe is None
+
+    assert model.execute(["b"]) == ["generated b"]
+    assert model.loads == 2
+
+
+def test_no_unload_during_a_long_request(models):
+    model = initialized(DummyModel(request_time_s=0.5), DEVICE="cpu", LAZY_LOAD="true", IDLE_TIMEOUT_S="0.1")
+    models.append(model)
+    model.execute(["a"])
+    # the idle time counts from the end of the request
+    assert model.pipe is not None
+    assert model.loads == 1
+
+
+def test_no_idle_thread_without_timeout(models):
+    model = initialized(DummyModel(), DEVICE="cpu", LAZY_LOAD="false", IDLE_TIMEOUT_S="0")
+    models.append(model)
+    assert not hasattr(model, "idle_thread")
+
+
+def test_finalize_stops_the_idle_thread():
+    model = initialized(DummyModel(), DEVICE="cpu", LAZY_LOAD="false", IDLE_TIMEOUT_S="0.1")
+    model.finalize()
+    model.idle_thread.join(timeout=1)
+    assert not model.idle_thread.is_alive()
+    assert model.pipe is None
+
+
+def test_finalize_frees_the_device_memory(monkeypatch):
+    import diffusion_lifecycle
+
+    freed = []
+    monkeypatch.setattr(diffusion_lifecycle, "free_device_memory", lambda: freed.append(True))
+    model = initialized(DummyModel(), DEVICE="cpu", LAZY_LOAD="false")
+    model.finalize()
+    assert model.pipe is None
+    assert freed == [True]
+    assert model.messages[-1] == "Unloaded pipeline on finalize"
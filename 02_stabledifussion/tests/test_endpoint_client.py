@@ -0,0 +1,124 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import glob
+import json
+import os
+import threading
+import time
+
+from endpoint_client import (
+    COMBINED_TARGET_MODEL,
+    EndpointPipeline,
+    HttpInvoker,
+    build_combined_payload,
+    compare_depth_upscale,
+    parse_stats,
+    serve_stand_in,
+)
+
+SAMPLE_IMAGES = sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "sample_images", "*.png")))
+
+
+def test_combined_payload_carries_both_stages():
+    inputs = {item["name"]: item["data"][0] for item in json.loads(build_combined_payload("image"))["inputs"]}
+
+    assert inputs["image"] == "image"
+    assert set(inputs) == {"prompt", "image", "gen_args", "upscale_prompt"}
+    assert inputs["prompt"] != inputs["upscale_prompt"]
+
+
+def test_parse_stats_by_name():
+    body = json.dumps(
+        {
+            "outputs": [
+                {"name": "stats", "data": [json.dumps({"total_ms": 1.0, "peak_memory_mb": 2.0})]},
+                {"name": "generated_image", "data": ["image"]},
+            ]
+        }
+    ).encode("utf8")
+
+    assert parse_stats(body) == {"total_ms": 1.0, "peak_memory_mb": 2.0}
+    assert parse_stats(json.dumps({"outputs": [{"name": "generated_image", "data": ["image"]}]}).encode("utf8")) is None
+
+
+def test_compare_depth_upscale_times_both_paths(capsys):
+    server = serve_stand_in(latency_s=0.01)
+    try:
+        invoker = HttpInvoker(server.url)
+        calls = []
+
+        def counting_invoker(target_model, body):
+            calls.append(target_model)
+            return invoker(target_model, body)
+
+        results = compare_depth_upscale(counting_invoker, SAMPLE_IMAGES[:2])
+    finally:
+        server.shutdown()
+
+    assert set(results) == {"two-hop", "combined"}
+    for result in results.values():
+        assert list(result["latency_s"]) == SAMPLE_IMAGES[:2]
+        # the stand-in reports no stats
+        assert result["peak_memory_mb"] is None
+    # one untimed request per path, then every image through both
+    assert calls.count(COMBINED_TARGET_MODEL) == 3
+    assert calls.count("sd_depth.tar.gz") == calls.count("sd_upscale.tar.gz") == 3
+    assert "peak GPU memory MiB" in capsys.readouterr().out
+
+
+class CountingPipeline(EndpointPipeline):
+    """EndpointPipeline recording the most images encoded but not yet yielded."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = threading.Lock()
+        self.encoded = 0
+        self.yielded = 0
+        self.most_pending = 0
+
+    def encode(self, path):
+        with self.lock:
+            self.encoded += 1
+            self.most_pending = max(self.most_pending, self.encoded - self.yielded)
+        return super().encode(path)
+
+
+def test_iter_images_encodes_a_bounded_window():
+    server = serve_stand_in(latency_s=0.02, max_concurrency=2)
+    try:
+        pipeline = CountingPipeline(HttpInvoker(server.url), max_in_flight=2, encode_workers=1)
+        files = SAMPLE_IMAGES * 5
+        count = 0
+        for _ in pipeline.iter_images(files):
+            with pipeline.lock:
+                pipeline.yielded += 1
+            count += 1
+    finally:
+        server.shutdown()
+
+    assert count == len(files)
+    assert pipeline.encoded == len(files)
+    # max_in_flight + encode_workers images between encoding and yielding, plus the one being yielded
+    assert pipeline.most_pending <= 2 + 1 + 1
+
+
+def test_stopping_early_does_not_wait_for_running_requests():
+    pipeline = CountingPipeline(None, max_in_flight=4, encode_workers=2)
+    first_image = pipeline.encode(SAMPLE_IMAGES[0])
+
+    def invoker(target_model, body):
+        image = next(item["data"][0] for item in json.loads(body)["inputs"] if item["name"] == "image")
+        # the first image is answered at once, the others are still running when it is yielded
+        if image != first_image:
+            time.sleep(1.0)
+        return json.dumps({"outputs": [{"name": "generated_image", "data": [image]}]}).encode("utf8")
+
+    pipeline.invoker = invoker
+    images = pipeline.iter_images(SAMPLE_IMAGES[:1] + SAMPLE_IMAGES[1:] * 5)
+    next(images)
+    start_time = time.perf_counter()
+    images.close()
+    assert time.perf_counter() - start_time < 0.5
+    # the first window, and the image submitted when the first one was done
+    assert pipeline.encoded <= 1 + 4 + 2 + 1
@@ -0,0 +1,81 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+The compact DataFrame of convert_to_pandas must hold the same values as the legacy one.
+
+Callers checked for the on_track (str -> bool) and timestamp (str -> float) change:
+reward_replay (on_track.to_numpy(dtype=bool)), lap_analysis (timestamp.to_numpy(dtype=np.float64)
+and first/last per episode), simtrace_summary (timestamp first/last), simtrace_dataset
+(load_simtrace), the episode times in log_analysis (float(timestamp)) and live_tail, which
+parses its own rows.
+"""
+import glob
+import os
+
+import numpy as np
+import pytest
+
+from log_analysis import convert_to_pandas, load_data, load_simtrace
+
+MODELS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, "deepracer_models")
+
+# the evaluation logs of the bundled models hold the SIM_TRACE_LOG lines
+LOG_FILES = sorted(glob.glob(os.path.join(MODELS_PATH, "*", "logs", "evaluation", "*.log")))
+SIMTRACE_PATHS = sorted(
+    {os.path.dirname(fname) for fname in glob.glob(os.path.join(MODELS_PATH, "**", "*-iteration.csv"), recursive=True)}
+)
+
+BOOL_COLUMNS = ["done", "on_track"]
+
+
+def assert_same_values(legacy, compact):
+    assert list(compact.columns) == list(legacy.columns)
+    assert len(compact) == len(legacy)
+    for column in compact.columns:
+        if column in BOOL_COLUMNS:
+            reference = legacy[column].map(lambda value: value == "True" if isinstance(value, str) else bool(value))
+            assert compact[column].dtype == bool
+            np.testing.assert_array_equal(compact[column].to_numpy(), reference.to_numpy(dtype=bool), err_msg=column)
+        elif compact[column].dtype == "category":
+            np.testing.assert_array_equal(compact[column].astype(str), legacy[column].astype(str), err_msg=column)
+        else:
+            # float32 keeps about 7 significant digits, timestamps stay float64
+            np.testing.assert_allclose(
+                compact[column].to_numpy(dtype=np.float64),
+                legacy[column].astype(np.float64).to_numpy(),
+                rtol=1e-6,
+                atol=1e-4,
+                err_msg=column,
+            )
+
+
+@pytest.mark.parametrize("fname", LOG_FILES, ids=os.path.basename)
+def test_convert_to_pandas_compact_matches_legacy(fname):
+    data = load_data(fname)
+    assert len(data) > 2
+
+    legacy = convert_to_pandas(data, compact=False)
+    compact = convert_to_pandas(data, compact=True)
+
+    assert len(compact) == len(data) - 2
+    assert_same_values(legacy, compact)
+    # the legacy layout is unchanged
+    assert legacy["on_track"].isin(["True", "False"]).all()
+    assert legacy["done"].isin([0, 1]).all()
+
+
+@pytest.mark.parametrize("simtrace_path", SIMTRACE_PATHS, ids=os.path.basename)
+def test_load_simtrace_compact_matches_legacy(simtrace_path):
+    legacy = load_simtrace(simtrace_path, compact=False)
+    compact = load_simtrace(simtrace_path, compact=True)
+
+    assert len(compact) > 0
+    assert_same_values(legacy, compact)
+
+
+def test_convert_to_pandas_without_rows():
+    compact = convert_to_pandas(["dummy", "dummy"])
+
+    assert len(compact) == 0
+    assert compact["on_track"].dtype == bool
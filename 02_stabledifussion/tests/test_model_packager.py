@@ -0,0 +1,151 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import tarfile
+
+import pytest
+
+from model_packager import LocalS3, MultipartUploadWriter, package_and_upload, package_and_upload_models
+
+
+class FailingS3(LocalS3):
+    """LocalS3 failing the upload of one part and counting the aborts."""
+
+    def __init__(self, root, fail_part=None):
+        super().__init__(root)
+        self.fail_part = fail_part
+        self.aborts = 0
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        if PartNumber == self.fail_part:
+            raise ConnectionError(f"part {PartNumber} failed")
+        return super().upload_part(Bucket, Key, UploadId, PartNumber, Body)
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.aborts += 1
+        return super().abort_multipart_upload(Bucket, Key, UploadId)
+
+
+@pytest.fixture
+def model_path(tmp_path):
+    model = tmp_path / "models" / "sd_test"
+    (model / "1").mkdir(parents=True)
+    (model / "config.pbtxt").write_text('name: "sd_test"\n')
+    (model / "1" / "model.py").write_text("print('model')\n" * 1000)
+    return model
+
+
+def stored_files(s3_root):
+    return sorted(path.name for path in s3_root.rglob("*") if path.is_file())
+
+
+def test_round_trip(tmp_path, model_path):
+    s3_client = LocalS3(tmp_path / "s3")
+    (s3_client.root / "bucket").mkdir(parents=True)
+
+    result = package_and_upload(model_path, s3_client, "bucket", "sd_test.tar.gz")
+    assert result["uploaded"]
+    with tarfile.open(s3_client.root / "bucket" / "sd_test.tar.gz", "r:gz") as tar:
+        assert tar.extractfile("sd_test/1/model.py").read() == (model_path / "1" / "model.py").read_bytes()
+
+    # unchanged content is not uploaded again
+    assert not package_and_upload(model_path, s3_client, "bucket", "sd_test.tar.gz")["uploaded"]
+
+
+def test_shared_module_is_packaged_with_the_models_importing_it(tmp_path, model_path):
+    shared_file = model_path.parent / "shared_helpers.py"
+    shared_file.write_text("VALUE = 1\n")
+    (model_path / "1" / "model.py").write_text("from shared_helpers import VALUE\n")
+    other_model = model_path.parent / "other"
+    (other_model / "1").mkdir(parents=True)
+    (other_model / "1" / "model.py").write_text("print('other')\n")
+    (other_model / "config.pbtxt").write_text('name: "other"\n')
+
+    s3_client = LocalS3(tmp_path / "s3")
+    (s3_client.root / "bucket").mkdir(parents=True)
+    results = package_and_upload_models(model_path.parent, s3_client, "bucket", "models", state_path=tmp_path / "state.json")
+    with tarfile.open(s3_client.root / "bucket" / "models" / "sd_test.tar.gz", "r:gz") as tar:
+        assert tar.extractfile("sd_test/1/shared_helpers.py").read() == b"VALUE = 1\n"
+    with tarfile.open(s3_client.root / "bucket" / "models" / "other.tar.gz", "r:gz") as tar:
+        assert "other/1/shared_helpers.py" not in tar.getnames()
+
+    # a change of the shared file changes the content hash of the models using it
+    shared_file.write_text("VALUE = 2\n")
+    again = package_and_upload_models(model_path.parent, s3_client, "bucket", "models", state_path=tmp_path / "state.json")
+    assert again["sd_test"]["uploaded"] and not again["other"]["uploaded"]
+    assert again["sd_test"]["content_hash"] != results["sd_test"]["content_hash"]
+
+
+def test_bytecode_and_folders_without_config_are_not_packaged(tmp_path, model_path):
+    state_path = tmp_path / "state.json"
+    s3_client = LocalS3(tmp_path / "s3")
+    (s3_client.root / "bucket").mkdir(parents=True)
+    (model_path.parent / "__pycache__").mkdir()
+    (model_path.parent / "__pycache__" / "shared_helpers.cpython-311.pyc").write_bytes(b"bytecode")
+
+    first = package_and_upload_models(model_path.parent, s3_client, "bucket", "models", state_path=state_path)
+    assert list(first) == ["sd_test"]
+
+    # compiling the model or saving it from a notebook does not change its content
+    (model_path / "1" / "__pycache__").mkdir()
+    (model_path / "1" / "__pycache__" / "model.cpython-311.pyc").write_bytes(b"bytecode")
+    (model_path / "1" / "stale.pyc").write_bytes(b"bytecode")
+    (model_path / ".ipynb_checkpoints").mkdir()
+    (model_path / ".ipynb_checkpoints" / "config-checkpoint.pbtxt").write_text("autosave\n")
+
+    second = package_and_upload_models(model_path.parent, s3_client, "bucket", "models", state_path=state_path)
+    assert second["sd_test"]["content_hash"] == first["sd_test"]["content_hash"]
+    assert not second["sd_test"]["uploaded"]
+
+    result = package_and_upload(model_path, s3_client, "bucket", "forced.tar.gz", force=True)
+    with tarfile.open(s3_client.root / "bucket" / "forced.tar.gz", "r:gz") as tar:
+        assert sorted(tar.getnames()) == ["sd_test", "sd_test/1", "sd_test/1/model.py", "sd_test/config.pbtxt"]
+    assert result["content_hash"] == first["sd_test"]["content_hash"]
+
+
+def test_failed_part_aborts_once_and_raises_the_original_error(tmp_path):
+    s3_client = FailingS3(tmp_path / "s3", fail_part=2)
+    (s3_client.root / "bucket").mkdir(parents=True)
+    upload = MultipartUploadWriter(s3_client, "bucket", "model.tar.gz", part_size=1024, max_concurrency=2)
+    upload.write(b"x" * 10 * 1024)
+
+    with pytest.raises(ConnectionError):
+        upload.close()
+    upload.abort()
+
+    assert s3_client.aborts == 1
+    assert stored_files(s3_client.root) == []
+
+
+def test_failed_upload_while_packaging_aborts_once(tmp_path, model_path):
+    s3_client = FailingS3(tmp_path / "s3", fail_part=1)
+    (s3_client.root / "bucket").mkdir(parents=True)
+
+    # closing the upload aborts it, package_and_upload must not abort it again
+    with pytest.raises(ConnectionError):
+        package_and_upload(model_path, s3_client, "bucket", "sd_test.tar.gz")
+
+    assert s3_client.aborts == 1
+    assert stored_files(s3_client.root) == []
+
+
+def test_failed_packaging_aborts_once(tmp_path, model_path, monkeypatch):
+    s3_client = FailingS3(tmp_path / "s3")
+    (s3_client.root / "bucket").mkdir(parents=True)
+
+    def failing_add(self, *args, **kwargs):
+        self.fileobj.write(b"y" * 2048)
+        raise OSError("disk read failed")
+
+    monkeypatch.setattr(tarfile.TarFile, "add", failing_add)
+    with pytest.raises(OSError, match="disk read failed"):
+        package_and_upload(model_path, s3_client, "bucket", "sd_test.tar.gz", compresslevel=0)
+
+    assert s3_client.aborts == 1
+    assert stored_files(s3_client.root) == []
+
+
+def test_abort_of_unknown_upload_raises(tmp_path):
+    s3_client = LocalS3(tmp_path / "s3")
+    with pytest.raises(FileNotFoundError, match="NoSuchUpload"):
+        s3_client.abort_multipart_upload(Bucket="bucket", Key="key", UploadId="missing")
@@ -0,0 +1,14 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from pathlib import Path
+
+import pytest
+
+NOTEBOOK_COPY = Path(__file__).resolve().parents[1] / "profiling.py"
+EVALUATOR_COPY = Path(__file__).resolve().parents[2] / "01_model_evaluator_using_agents" / "utils" / "profiling.py"
+
+
+@pytest.mark.skipif(not EVALUATOR_COPY.exists(), reason="the model evaluator folder is not next to this one")
+def test_profiling_copies_match():
+    assert NOTEBOOK_COPY.read_text() == EVALUATOR_COPY.read_text()
@@ -0,0 +1,66 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import textwrap
+
+import numpy as np
+import pytest
+
+from reward_replay import evaluate_per_step, evaluate_sequential, load_reward_function
+
+REWARD_FILE = textwrap.dedent(
+    """
+    import math
+
+    SPEED_WEIGHT = 2.0
+
+
+    def speed_bonus(speed):
+        return SPEED_WEIGHT * math.sqrt(speed)
+
+
+    def reward_function(params):
+        if not params["all_wheels_on_track"]:
+            return 1e-3
+        return speed_bonus(params["speed"])
+    """
+)
+
+PARAMS = {
+    "x": np.arange(50, dtype=float),
+    "speed": np.linspace(0.5, 4.0, 50),
+    "all_wheels_on_track": np.arange(50) % 7 != 0,
+}
+
+SPEED_WEIGHT = 2.0
+
+
+def _speed_bonus(speed):
+    return SPEED_WEIGHT * speed
+
+
+def importable_reward_function(params):
+    return _speed_bonus(params["speed"])
+
+
+def test_reward_file_helpers_reach_the_workers(tmp_path):
+    path = tmp_path / "reward_function.py"
+    path.write_text(REWARD_FILE)
+    reward_function, _ = load_reward_function(str(path))
+
+    rewards = evaluate_per_step(reward_function, PARAMS, processes=2, chunk_size=10)
+    np.testing.assert_allclose(rewards, evaluate_sequential(reward_function, PARAMS))
+
+
+def test_importable_function_is_sent_by_reference():
+    rewards = evaluate_per_step(importable_reward_function, PARAMS, processes=2, chunk_size=10)
+    np.testing.assert_allclose(rewards, 2.0 * PARAMS["speed"])
+
+
+def test_notebook_function_with_helpers_fails_up_front():
+    # a function defined in a notebook cell has no source file the workers could execute
+    namespace = {}
+    exec(compile(REWARD_FILE, "<ipython-input-1>", "exec"), namespace)
+
+    with pytest.raises(ValueError, match="speed_bonus"):
+        evaluate_per_step(namespace["reward_function"], PARAMS, processes=2)
@@ -0,0 +1,42 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import glob
+import os
+
+import numpy as np
+import pytest
+
+from track import Track, read_world_name
+
+MODELS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, "deepracer_models")
+
+
+def square_track(size=10.0, width=1.0, points=40):
+    """Waypoints of a square loop, center line with inner and outer borders."""
+    t = np.linspace(0, 4, points, endpoint=False)
+    side = np.floor(t).astype(int)
+    offset = (t - side) * size
+    corners = np.array([[0, 0], [size, 0], [size, size], [0, size]], dtype=float)
+    directions = np.array([[1, 0], [0, 1], [-1, 0], [0, -1]], dtype=float)
+    center = corners[side] + directions[side] * offset[:, np.newaxis]
+    # the left of each direction points into the square
+    normals = np.column_stack([-directions[side][:, 1], directions[side][:, 0]])
+    return np.hstack([center, center + normals * width / 2, center - normals * width / 2])
+
+
+def test_load_from_tracks_dir(tmp_path):
+    np.save(tmp_path / "square.npy", square_track())
+    track = Track.load("square", str(tmp_path))
+
+    assert track.length == pytest.approx(40.0)
+    np.testing.assert_allclose(track.widths, 1.0)
+    assert Track.load("square", str(tmp_path)) is track
+
+
+def test_missing_waypoints_name_the_file_and_the_source(tmp_path):
+    params_path = sorted(glob.glob(os.path.join(MODELS_PATH, "*", "training_params_*.yaml")))[0]
+    world_name = read_world_name(params_path)
+
+    with pytest.raises(FileNotFoundError, match=f"{world_name}.npy.*deepracer-race-data"):
+        Track.from_params_file(params_path, str(tmp_path))
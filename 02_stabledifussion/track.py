@@ -0,0 +1,177 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Track geometry loaded once per track from the community `<WORLD_NAME>.npy` waypoint files.
+
+Each .npy file holds one row per waypoint: center x, y, inner border x, y and outer
+border x, y, in meters. Everything derived from the waypoints is computed when the
+track is loaded, so per-step features of a whole sim-trace are a few array operations.
+
+The waypoint files are not shipped with the workshop, see tracks/README.md for where to
+get them. Needs shapely 2 (`shapely.prepare`).
+"""
+import os
+import re
+from functools import lru_cache
+
+import numpy as np
+import shapely
+from shapely.geometry import LineString, Polygon
+
+if not hasattr(shapely, "prepare"):
+    raise ImportError(f"track needs shapely>=2, found {shapely.__version__}: pip install 'shapely>=2'")
+
+DEFAULT_TRACKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tracks")
+TRACKS_SOURCE = "https://github.com/aws-deepracer-community/deepracer-race-data/tree/main/raw_data/tracks/npy"
+
+
+def read_world_name(training_params_path):
+    """Read WORLD_NAME from a training_params_*.yaml or eval_params_*.yaml file."""
+    with open(training_params_path, "r") as f:
+        match = re.search(r'^WORLD_NAME:\s*"?([^"\n]+)"?', f.read(), re.MULTILINE)
+    if match is None:
+        raise ValueError(f"No WORLD_NAME in {training_params_path}")
+    return match.group(1).strip()
+
+
+class Track:
+    """
+    Waypoints of a track and the quantities derived from them.
+
+    Attributes:
+        center, inner, outer (np.ndarray): (N, 2) points in meters. inner and outer are
+            None when the waypoints carry no borders.
+        segment_lengths (np.ndarray): Length of the segment from waypoint i to i + 1.
+        cumulative_distance (np.ndarray): Distance along the center line at every waypoint.
+        length (float): Length of the center line loop.
+        headings (np.ndarray): Direction of every segment in degrees, like the `heading` param.
+        widths (np.ndarray): Track width at every waypoint.
+    """
+
+    def __init__(self, name, waypoints):
+        self.name = name
+        waypoints = np.asarray(waypoints, dtype=float)
+        self.waypoints = waypoints
+        self.center = waypoints[:, 0:2]
+        self.inner = waypoints[:, 2:4] if waypoints.shape[1] >= 6 else None
+        self.outer = waypoints[:, 4:6] if waypoints.shape[1] >= 6 else None
+
+        # segment i runs from waypoint i to i + 1, the last one closes the loop
+        self.segment_vectors = np.roll(self.center, -1, axis=0) - self.center
+        self.segment_lengths = np.linalg.norm(self.segment_vectors, axis=1)
+        self.cumulative_distance = np.concatenate([[0.0], np.cumsum(self.segment_lengths)[:-1]])
+        self.length = float(self.segment_lengths.sum())
+        self.headings = np.degrees(np.arctan2(self.segment_vectors[:, 1], self.segment_vectors[:, 0]))
+
+        if self.inner is not None:
+            self.widths = np.linalg.norm(self.outer - self.inner, axis=1)
+            self.inner_polygon = Polygon(self.inner)
+            self.outer_polygon = Polygon(self.outer)
+            self.road_polygon = self.outer_polygon.difference(self.inner_polygon)
+            for polygon in (self.inner_polygon, self.outer_polygon, self.road_polygon):
+                shapely.prepare(polygon)
+        else:
+            self.widths = None
+            self.inner_polygon = self.outer_polygon = self.road_polygon = None
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def load(cls, world_name, tracks_dir=DEFAULT_TRACKS_DIR):
+        """Load a track from `<tracks_dir>/<world_name>.npy`, memoized per track."""
+        path = os.path.join(tracks_dir, f"{world_name}.npy")
+        if not os.path.isfile(path):
+            raise FileNotFoundError(
+                f"No waypoints for track {world_name}: {path} does not exist. Download {world_name}.npy "
+                f"from {TRACKS_SOURCE} into {tracks_dir}, see tracks/README.md."
+            )
+        return cls(world_name, np.load(path))
+
+    @classmethod
+    def from_params_file(cls, params_path, tracks_dir=DEFAULT_TRACKS_DIR):
+        """Load the track a model was trained or evaluated on, from its *_params_*.yaml file."""
+        return cls.load(read_world_name(params_path), tracks_dir)
+
+    def line_strings(self):
+        """Center line, inner and outer borders as shapely LineStrings, for plotting."""
+        return [LineString(line) for line in (self.center, self.inner, self.outer) if line is not None]
+
+    def closest_waypoints(self, x, y, chunk_size=65536):
+        """Index of the closest waypoint of every point, x and y in meters."""
+        points = np.column_stack([np.ravel(x), np.ravel(y)])
+        closest = np.empty(len(points), dtype=int)
+        for start in range(0, len(points), chunk_size):
+            chunk = points[start : start + chunk_size]
+            distances = ((chunk[:, np.newaxis, :] - self.center[np.newaxis]) ** 2).sum(axis=2)
+            closest[start : start + chunk_size] = distances.argmin(axis=1)
+        return closest
+
+    def locate(self, x, y, closest_waypoint=None):
+        """
+        Project points onto the center line.
+
+        Args:
+            x, y (np.ndarray): Positions in meters.
+            closest_waypoint (np.ndarray): The closest waypoint of every point if already
+                known, e.g. the sim-trace closest_waypoint column.
+
+        Returns:
+            dict: Arrays prev_waypoint, next_waypoint, distance_from_center, is_left_of_center,
+                track_width (None without borders) and progress, the percentage of the lap
+                measured from waypoint 0.
+        """
+        points = np.column_stack([np.ravel(x), np.ravel(y)])
+        count = len(self.center)
+        if closest_waypoint is None:
+            closest_waypoint = self.closest_waypoints(points[:, 0], points[:, 1])
+        closest_waypoint = np.asarray(closest_waypoint, dtype=int) % count
+
+        # the point lies on one of the two segments that meet at its closest waypoint
+        best = None
+        for segment in ((closest_waypoint - 1) % count, closest_waypoint):
+            start = self.center[segment]
+            vector = self.segment_vectors[segment]
+            t = np.einsum("ij,ij->i", points - start, vector) / np.maximum(self.segment_lengths[segment] ** 2, 1e-12)
+            t = np.clip(t, 0, 1)
+            distance = np.linalg.norm(points - (start + t[:, np.newaxis] * vector), axis=1)
+            cross = vector[:, 0] * (points[:, 1] - start[:, 1]) - vector[:, 1] * (points[:, 0] - start[:, 0])
+            candidate = (segment, t, distance, cross > 0)
+            if best is None:
+                best = candidate
+            else:
+                closer = distance < best[2]
+                best = tuple(np.where(closer, new, old) for new, old in zip(candidate, best))
+
+        segment, t, distance, is_left = best
+        along = self.cumulative_distance[segment] + t * self.segment_lengths[segment]
+        return {
+            "prev_waypoint": segment,
+            "next_waypoint": (segment + 1) % count,
+            "distance_from_center": distance,
+            "is_left_of_center": is_left,
+            "track_width": None if self.widths is None else self.widths[segment],
+            "progress": 100 * along / self.length,
+        }
+
+    def on_track(self, x, y):
+        """Whether points (in meters) lie between the borders."""
+        return shapely.contains_xy(self.road_polygon, np.ravel(x), np.ravel(y))
+
+    def features(self, df):
+        """
+        Per-step track features of a sim-trace DataFrame (x and y in centimeters, as from
+        `log_analysis.load_simtrace`).
+
+        Returns:
+            DataFrame: A copy of `df` with distance_from_center, is_left_of_center,
+                track_width and track_progress columns.
+        """
+        closest = df["closest_waypoint"].to_numpy() if "closest_waypoint" in df else None
+        located = self.locate(df["x"].to_numpy() / 100, df["y"].to_numpy() / 100, closest)
+        df = df.copy()
+        df["distance_from_center"] = located["distance_from_center"]
+        df["is_left_of_center"] = located["is_left_of_center"]
+        if located["track_width"] is not None:
+            df["track_width"] = located["track_width"]
+        df["track_progress"] = located["progress"]
+        return df
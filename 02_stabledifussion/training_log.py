@@ -0,0 +1,178 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Policy training and episode statistics from the SageMaker training logs
+(`logs/training/*-sagemaker.log`).
+
+The log is read in large chunks cut at line boundaries, and compiled regexes scan
+every chunk as a whole, so no Python code runs per log line. Parsed tables are cached
+next to the log with `analysis_cache`, like the sim-trace summaries.
+"""
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from analysis_cache import cached_per_file
+from profiling import profiled
+
+CHUNK_SIZE = 16 * 1024 * 1024
+CACHE_NAME = ".analysis_cache.training_log.{log_name}.pkl"
+# bump when the parsed tables change, so cached tables are recomputed
+PARSER_VERSION = "1"
+
+NUMBER = rb"([-+\w.]+)"
+POLICY_TRAINING = re.compile(
+    rb"Policy training> Surrogate loss=" + NUMBER + rb", KL divergence=" + NUMBER + rb", Entropy=" + NUMBER
+    + rb", training epoch=(\d+), learning_rate=" + NUMBER
+)
+EPISODE_TRAINING = re.compile(
+    rb"Training> Name=[^,]*, Worker=(\d+), Episode=(\d+), Total reward=" + NUMBER
+    + rb", Steps=(\d+), Training iteration=(\d+)"
+)
+
+
+def iter_chunks(path, chunk_size=CHUNK_SIZE):
+    """Yield the file in chunks of whole lines."""
+    remainder = b""
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                if remainder:
+                    yield remainder
+                return
+            data = remainder + data
+            cut = data.rfind(b"\n") + 1
+            yield data[:cut]
+            remainder = data[cut:]
+
+
+# regex groups of the two line types and the type of each resulting column
+POLICY_COLUMNS = [
+    ("surrogate_loss", np.float32),
+    ("kl_divergence", np.float32),
+    ("entropy", np.float32),
+    ("epoch", np.int16),
+    ("learning_rate", np.float32),
+]
+EPISODE_COLUMNS = [
+    ("worker", np.int16),
+    ("episode", np.int32),
+    ("total_reward", np.float32),
+    ("cumulative_steps", np.int64),
+    ("iteration", np.int16),
+]
+
+
+def _columns(matches, columns):
+    """Typed column arrays of the regex matches of one chunk"""
+    values = zip(*matches) if matches else [()] * len(columns)
+    return {
+        name: np.array(column, dtype=np.float64 if np.issubdtype(dtype, np.floating) else np.int64).astype(dtype)
+        for (name, dtype), column in zip(columns, values)
+    }
+
+
+def _concat(chunks, columns):
+    return {name: np.concatenate([chunk[name] for chunk in chunks] or [np.array([], dtype)]) for name, dtype in columns}
+
+
+@profiled
+def parse_training_log(path, chunk_size=CHUNK_SIZE):
+    """
+    Parse the policy training and episode lines of a SageMaker training log.
+
+    Episodes and iterations are numbered like the sim-traces: the log's 1-based
+    `Episode=n` is episode n - 1 and `Training iteration=k` is iteration k + 1.
+
+    Args:
+        path (string): The *-sagemaker.log file.
+
+    Returns:
+        tuple: The epoch table (iteration, epoch, surrogate_loss, kl_divergence, entropy,
+            learning_rate) and the episode table (episode, worker, iteration, total_reward,
+            steps, cumulative_steps).
+    """
+    # matches are turned into arrays per chunk, so memory stays at one chunk of Python objects
+    policy_chunks, episode_chunks = [], []
+    for chunk in iter_chunks(path, chunk_size):
+        policy_chunks.append(_columns(POLICY_TRAINING.findall(chunk), POLICY_COLUMNS))
+        episode_chunks.append(_columns(EPISODE_TRAINING.findall(chunk), EPISODE_COLUMNS))
+
+    policy = _concat(policy_chunks, POLICY_COLUMNS)
+    # the epochs restart at 0 for every policy update, one update per iteration
+    epochs = pd.DataFrame(
+        {
+            "iteration": np.cumsum(policy["epoch"] == 0).astype(np.int16),
+            "epoch": policy["epoch"],
+            "surrogate_loss": policy["surrogate_loss"],
+            "kl_divergence": policy["kl_divergence"],
+            "entropy": policy["entropy"],
+            "learning_rate": policy["learning_rate"],
+        }
+    )
+
+    episode = _concat(episode_chunks, EPISODE_COLUMNS)
+    episodes = pd.DataFrame(
+        {
+            "episode": episode["episode"] - 1,
+            "worker": episode["worker"],
+            "iteration": episode["iteration"] + 1,
+            "total_reward": episode["total_reward"],
+            "cumulative_steps": episode["cumulative_steps"],
+        }
+    )
+    # Steps= counts all steps of the worker so far
+    episodes["steps"] = (
+        episodes.groupby("worker")["cumulative_steps"].diff().fillna(episodes["cumulative_steps"])
+    ).astype(np.int32)
+    return epochs, episodes
+
+
+def summarize_training_log(epochs, episodes):
+    """
+    One row per iteration, indexed like `simtrace_summary.summarize_iterations` so the two can be joined.
+
+    Returns:
+        DataFrame: episodes and steps of the iteration, and the mean surrogate loss, KL
+            divergence and entropy plus the learning rate of its policy update.
+    """
+    policy = epochs.groupby("iteration").agg(
+        epochs=("epoch", "size"),
+        surrogate_loss=("surrogate_loss", "mean"),
+        kl_divergence=("kl_divergence", "mean"),
+        entropy=("entropy", "mean"),
+        learning_rate=("learning_rate", "last"),
+    )
+    experience = episodes.groupby("iteration").agg(
+        log_episodes=("episode", "size"),
+        log_steps=("steps", "sum"),
+    )
+    return experience.join(policy, how="outer")
+
+
+def _parse_and_summarize(path):
+    epochs, episodes = parse_training_log(path)
+    return epochs, episodes, summarize_training_log(epochs, episodes)
+
+
+def load_training_log(path, use_cache=True):
+    """
+    Parsed tables of a training log, reusing the cached tables when the log is unchanged.
+
+    Example:
+        >>> log_path = glob.glob(f"{model_path}/logs/training/*-sagemaker.log")[0]
+        >>> epochs, log_episodes, log_iterations = load_training_log(log_path)
+        >>> _, iterations = simtrace_summary.load_summaries(f"{model_path}/sim-trace/training/training-simtrace")
+        >>> iterations.join(log_iterations)
+
+    Returns:
+        tuple: The epoch, episode and iteration tables.
+    """
+    if not use_cache:
+        return _parse_and_summarize(path)
+    cache_path = os.path.join(os.path.dirname(path), CACHE_NAME.format(log_name=os.path.basename(path)))
+    return cached_per_file([path], cache_path, _parse_and_summarize, key=PARSER_VERSION)[path]
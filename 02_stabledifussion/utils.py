@@ -1,26 +1,179 @@
 from huggingface_hub import snapshot_download
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatch
 from pathlib import Path
 from PIL import Image
 from io import BytesIO
 import base64
+import hashlib
+import json
+import os
 import shutil
+import threading
 
-def download_model(model_name, local_model_path):
+# persistent cache shared by every download, files are hard-linked from here into the checkpoint folders
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "deepracer-genai-workshop" / "models"
+DEFAULT_IGNORE_PATTERNS = ["*.ckpt", "*.safetensors"]
+CHUNK_SIZE = 8 * 1024 * 1024
+
+# concurrent downloads share the manifest and may share blobs
+_manifest_lock = threading.Lock()
+_blob_locks = defaultdict(threading.Lock)
+
+
+def download_model(
+    model_name,
+    local_model_path,
+    cache_dir=DEFAULT_CACHE_DIR,
+    revision="fp16",
+    hub=None,
+    ignore_patterns=DEFAULT_IGNORE_PATTERNS,
+):
+    """
+    Download a model snapshot into the persistent cache and hard-link it into `local_model_path`.
+
+    Files already in the cache are not downloaded again, so repeated runs only re-create the links.
+    Interrupted downloads resume from the partial file.
+
+    Args:
+        model_name (string): The Hugging Face repo id, e.g. stabilityai/stable-diffusion-2-depth.
+        local_model_path (string): The checkpoint folder to populate.
+        cache_dir (string): The persistent download cache.
+        revision (string): The repo revision to download.
+        hub (string): Optional local folder laid out as `<hub>/<model_name>/...` used instead of the Hugging Face Hub.
+        ignore_patterns (list): Glob patterns of files to skip.
+
+    Returns:
+        Path: The checkpoint folder.
+    """
     local_model_path = Path(local_model_path)
-    local_model_path.mkdir(exist_ok=True)
-    local_cache_path = Path("./tmp_cache")
-    snapshot_download(
-        repo_id=model_name,
-        local_dir_use_symlinks=False,
-        revision="fp16",
-        cache_dir=local_cache_path,
-        local_dir=local_model_path,
-        ignore_patterns=["*.ckpt", "*.safetensors"],
-    )
-    shutil.rmtree(local_cache_path)
+    local_model_path.mkdir(parents=True, exist_ok=True)
+    cache_dir = Path(cache_dir)
+
+    if hub is None:
+        snapshot_path = Path(
+            snapshot_download(
+                repo_id=model_name,
+                revision=revision,
+                cache_dir=cache_dir,
+                ignore_patterns=ignore_patterns,
+            )
+        )
+        # the Hugging Face cache is content addressed, snapshot files are symlinks into its blobs folder
+        files = {
+            path.relative_to(snapshot_path): Path(os.path.realpath(path))
+            for path in snapshot_path.rglob("*")
+            if path.is_file()
+        }
+    else:
+        files = mirror_local_repo(Path(hub) / model_name, cache_dir, ignore_patterns)
+
+    link_files(files, local_model_path)
 
     return local_model_path
 
+
+def download_models(models_local_path, max_workers=4, **kwargs):
+    """
+    Download several models concurrently with `download_model`.
+
+    Args:
+        models_local_path (dict): Maps the model name to its checkpoint folder.
+        max_workers (int): The number of models to download at the same time.
+
+    Returns:
+        dict: Maps the model name to its checkpoint folder.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            model_name: executor.submit(download_model, model_name, model_local_path, **kwargs)
+            for model_name, model_local_path in models_local_path.items()
+        }
+        return {model_name: future.result() for model_name, future in futures.items()}
+
+
+def mirror_local_repo(repo_path, cache_dir, ignore_patterns=()):
+    """
+    Add the files of a local repo folder to the content-addressed cache.
+
+    Returns:
+        dict: Maps each file's path relative to the repo to its blob in the cache.
+    """
+    blobs_path = cache_dir / "blobs"
+    blobs_path.mkdir(parents=True, exist_ok=True)
+
+    # digests are remembered per (size, mtime) so unchanged files are not hashed again
+    manifest_path = cache_dir / "local_manifest.json"
+    with _manifest_lock:
+        manifest = json.loads(manifest_path.read_text()) if manifest_path.exists() else {}
+
+    files = {}
+    for path in sorted(repo_path.rglob("*")):
+        relative_path = path.relative_to(repo_path)
+        if not path.is_file() or any(fnmatch(relative_path.as_posix(), p) for p in ignore_patterns):
+            continue
+
+        stat = path.stat()
+        entry = manifest.get(str(path))
+        if entry is None or (entry["size"], entry["mtime_ns"]) != (stat.st_size, stat.st_mtime_ns):
+            entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": file_sha256(path)}
+            manifest[str(path)] = entry
+
+        blob_path = blobs_path / entry["sha256"]
+        with _blob_locks[blob_path]:
+            if not blob_path.exists():
+                resumable_copy(path, blob_path, entry["sha256"])
+        files[relative_path] = blob_path
+
+    with _manifest_lock:
+        # merge with entries written by concurrent downloads since we read the manifest
+        if manifest_path.exists():
+            manifest = {**json.loads(manifest_path.read_text()), **manifest}
+        tmp_manifest_path = manifest_path.with_name(f"{manifest_path.name}.{os.getpid()}.tmp")
+        tmp_manifest_path.write_text(json.dumps(manifest))
+        os.replace(tmp_manifest_path, manifest_path)
+
+    return files
+
+
+def resumable_copy(source, target, sha256):
+    """Copy `source` to `target` through a `.incomplete` file that later calls continue from."""
+    incomplete_path = target.with_name(target.name + ".incomplete")
+    offset = incomplete_path.stat().st_size if incomplete_path.exists() else 0
+
+    with open(source, "rb") as src, open(incomplete_path, "ab") as dst:
+        src.seek(offset)
+        shutil.copyfileobj(src, dst, CHUNK_SIZE)
+
+    if file_sha256(incomplete_path) != sha256:
+        incomplete_path.unlink()
+        raise IOError(f"checksum mismatch while copying {source}, partial file removed")
+    os.replace(incomplete_path, target)
+
+
+def link_files(files, local_model_path):
+    """Hard-link cached blobs into `local_model_path`, copying when the cache is on another filesystem."""
+    for relative_path, blob_path in files.items():
+        target = local_model_path / relative_path
+        if target.exists() and os.path.samefile(target, blob_path):
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.unlink(missing_ok=True)
+        try:
+            os.link(blob_path, target)
+        except OSError:
+            shutil.copyfile(blob_path, target)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
 def encode_image(image):
     buffer = BytesIO()
     image.save(buffer, format="JPEG")
@@ -32,4 +185,4 @@ def encode_image(image):
 def decode_image(img):
     buff = BytesIO(base64.b64decode(img.encode("utf8")))
     image = Image.open(buff)
-    return image
\ No newline at end of file
+    return image